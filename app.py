@@ -1,7 +1,29 @@
 import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from datetime import datetime
-from flask import Flask, request, jsonify
+from typing import Dict, Optional
+from flask import Blueprint, Flask, current_app, request, g
+from werkzeug.local import LocalProxy
+from call_context import (build_call_context, call_context, clear_call_context,
+                          mark_call_context_changed, store_call_context)
+from call_recorder import CallRecorder, call_event, pbx_fields
+from config import load_config
 from database_service import DatabaseService
+from customer_cache import CustomerCache
+from hashing_service import PasswordHasher, HashingQueueFull
+from hebrew_text import normalize_hebrew
+from ivr_flow import Flow, FlowStep
+from metrics import MetricsRegistry, QueryTimer, CONTENT_TYPE
+from receipt_numbers import ReceiptNumberAllocator
+from receipt_queue import HttpInvoicingClient, ReceiptIssuer
+from prompts import PromptCatalog
+from rate_limiter import LoginRateLimiter
+from rights_engine import RightsEngine
+from ivr_responses import ResponseCatalog, IVR_RESPONSES
+from session_store import create_session_store
+from statements import StatementGenerator, previous_month
 from validation_service import ValidationService
 
 import logging
@@ -10,90 +32,274 @@ logging.basicConfig(level=logging.INFO)
 
 validator = ValidationService()
 
-app = Flask(__name__)
-app.config["JSON_AS_ASCII"] = False
+bp = Blueprint('ivr', __name__)
 
-db_path = r"pbx_system.db"
 
-db = DatabaseService(db_path)
-call_data = {}
-# שמירת לקוח דוגמא
-db.create_customer("0533154518", "1234", "שלום",
-                   "211979521")
+class Services:
+    """השירותים של תהליך אחד - נוצרים ב-create_app ונשמרים ב-app.extensions['pbx']
 
-@app.route('/login', methods=['GET'])
+    בנייה של שירות לא פותחת חיבורים ולא מריצה threads: מאגר החיבורים ומאגר
+    תהליכי ה-bcrypt נפתחים בשימוש הראשון, ו-threads הרקע עולים בבקשה הראשונה
+    של כל תהליך (כך שגם create_app לפני fork בטוח).
+    """
+
+    def __init__(self, app: Flask, config: Dict):
+        self.config = config
+        # התגובות הקבועות מקודדות פעם אחת בעליית השרת; הודעות שהוקלטו נשלחות כקובץ
+        self.prompts = PromptCatalog(IVR_RESPONSES, config['PROMPT_AUDIO_DIR'])
+        self.responses = ResponseCatalog(app, IVR_RESPONSES, self.prompts,
+                                         render_cache_size=config['RESPONSE_CACHE_SIZE'])
+
+        # מדדים ל-/metrics
+        self.metrics = MetricsRegistry()
+        self.route_latency = self.metrics.histogram(
+            'pbx_request_duration_seconds', 'Webhook latency per route', labels=('route', 'status'))
+        self.query_latency = self.metrics.histogram(
+            'pbx_sql_query_duration_seconds', 'SQL statement execution time', labels=('statement',))
+
+        # bcrypt רץ במאגר תהליכים חסום כדי שהצפנה איטית לא תחסום שיחות אחרות
+        self.hasher = PasswordHasher(workers=config['HASH_WORKERS'], rounds=config['BCRYPT_ROUNDS'],
+                                     max_pending=config['HASH_MAX_PENDING'],
+                                     timeout=config['HASH_TIMEOUT'])
+        # הגבלת ניסיונות סיסמה לכל טלפון, משותפת לשיחות ול-workers (נבדקת לפני bcrypt)
+        self.login_limiter = LoginRateLimiter(
+            config['DB_PATH'], capacity=config['LOGIN_BURST'],
+            refill_every=config['LOGIN_REFILL_SECONDS'], lockout_after=config['LOGIN_LOCKOUT_AFTER'],
+            lockout_seconds=config['LOGIN_LOCKOUT_SECONDS'])
+        self.customer_cache = CustomerCache(max_size=config['CUSTOMER_CACHE_SIZE'],
+                                            ttl=config['CUSTOMER_CACHE_TTL'],
+                                            check_interval=config['CUSTOMER_CACHE_CHECK_INTERVAL'])
+        self.db = DatabaseService(config['DB_PATH'], pooled=True, hasher=self.hasher,
+                                  customer_cache=self.customer_cache,
+                                  query_observer=QueryTimer(self.query_latency),
+                                  initialize=config['DB_AUTO_INIT'],
+                                  single_writer=config['DB_SINGLE_WRITER'],
+                                  writer_max_delay=config['DB_WRITER_MAX_DELAY'])
+        # מספר קבלה רץ לכל לקוח
+        self.receipt_numbers = ReceiptNumberAllocator(self.db, config['RECEIPT_NUMBER_BLOCK'])
+        # הפקת הקבלות מול מערכת החשבוניות רצה ברקע - המתקשר לא ממתין לה
+        self.receipt_issuer = None
+        if config['INVOICING_URL']:
+            self.receipt_issuer = ReceiptIssuer(self.db, HttpInvoicingClient(
+                config['INVOICING_URL'], config['INVOICING_API_KEY']))
+        else:
+            logging.warning("INVOICING_URL is not set - receipts are saved as pending and not issued")
+        # חישוב הזכויות - תוצאה שמורה לכל לקוח ושנת מס
+        self.rights = RightsEngine(self.db)
+        # הדוחות החודשיים מופקים ב-batch; ה-IVR קורא רק את הסיכום השמור
+        self.statements = StatementGenerator(self.db, config['STATEMENTS_DIR'])
+        # מצב השיחות - 'sqlite' משותף לכל ה-workers, 'memory' לתהליך יחיד
+        self.sessions = create_session_store(config['SESSION_BACKEND'], config['DB_PATH'])
+        # היסטוריית השיחות נכתבת ל-calls ב-batches ברקע; שיחה שמצבה פג מסומנת כמסתיימת
+        self.call_recorder = CallRecorder(self.db, batch_size=config['CALL_LOG_BATCH'],
+                                          flush_interval=config['CALL_LOG_INTERVAL'])
+        self.sessions.on_expire(self.call_recorder.end_call)
+
+        self.metrics.gauge('pbx_active_call_sessions', 'Calls with live session state',
+                           self.sessions.active_count)
+        self.metrics.gauge('pbx_customer_cache_hit_rate', 'Customer cache hit rate',
+                           lambda: self.customer_cache.stats()['hit_rate'])
+        self.metrics.gauge('pbx_hashing_rejected', 'Hash requests rejected because the pool was full',
+                           lambda: self.hasher.stats()['rejected'])
+        self.metrics.gauge('pbx_prompts_with_audio', 'Static prompts sent as recorded audio',
+                           lambda: self.prompts.stats()['with_audio'])
+        self.metrics.gauge('pbx_response_cache_hit_rate', 'Dynamic prompt rendering cache hit rate',
+                           lambda: self.responses.stats()['hit_rate'])
+        self.metrics.gauge('pbx_login_throttled', 'Login attempts rejected before hashing',
+                           lambda: self.login_limiter.stats()['throttled'])
+        self.metrics.gauge('pbx_call_log_dropped',
+                           'Call events dropped because the write queue was full',
+                           lambda: self.call_recorder.stats()['dropped'])
+        if self.db.writer is not None:
+            self.metrics.gauge('pbx_db_writes_per_commit', 'Writes grouped into each commit',
+                               lambda: self.db.writer.stats()['writes_per_commit'])
+
+        self._started_pid = None
+        self._start_lock = threading.Lock()
+
+    def start_background(self):
+        """הפעלת threads הרקע פעם אחת לכל תהליך"""
+        if self._started_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._started_pid == os.getpid():
+                return
+            self.call_recorder.start()
+            self.sessions.start_purging(self.config['SESSION_PURGE_INTERVAL'])
+            if self.receipt_issuer is not None:
+                self.receipt_issuer.start()
+            self._started_pid = os.getpid()
+
+
+def create_app(config: Dict = None) -> Flask:
+    """יצירת האפליקציה (gunicorn 'app:create_app()') - הגדרות מהסביבה כברירת מחדל"""
+    config = config or load_config()
+    app = Flask(__name__)
+    app.config["JSON_AS_ASCII"] = False
+    app.config.update(config)
+    app.extensions['pbx'] = Services(app, config)
+    app.register_blueprint(bp)
+    return app
+
+
+def services() -> Services:
+    return current_app.extensions['pbx']
+
+
+def _service(name: str) -> LocalProxy:
+    return LocalProxy(lambda: getattr(services(), name))
+
+
+# השירותים של האפליקציה הנוכחית, לשימוש ב-handlers וב-flows
+db = _service('db')
+responses = _service('responses')
+sessions = _service('sessions')
+rights = _service('rights')
+
+
+@bp.before_app_request
+def start_timer():
+    g.started_at = time.perf_counter()
+    services().start_background()
+
+
+@bp.after_app_request
+def record_latency(response):
+    if 'started_at' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        services().route_latency.observe(time.perf_counter() - g.started_at, route,
+                                         str(response.status_code))
+    return response
+
+
+@bp.after_app_request
+def record_call_event(response):
+    call_id = request.args.get('PBXcallId')
+    if call_id:
+        route = request.url_rule.rule if request.url_rule else request.path
+        services().call_recorder.record(call_id, pbx_fields(request.args),
+                                        call_event(route, request.args, response.status_code))
+    return response
+
+
+@bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return current_app.response_class(services().metrics.render(), content_type=CONTENT_TYPE)
+
+
+def call_session() -> dict:
+    """מצב השיחה הנוכחית לפי PBXcallId - נטען פעם אחת לבקשה ונשמר בסופה"""
+    if 'call_session' not in g:
+        g.call_id = request.args.get('PBXcallId', '')
+        g.call_session = sessions.load(g.call_id)
+    return g.call_session
+
+
+@bp.after_app_request
+def save_call_session(response):
+    if 'call_session' in g:
+        sessions.save(g.call_id, g.call_session)
+    return response
+
+
+def current_customer(phone: str) -> Optional[Dict]:
+    """הלקוח של השיחה מתוך פרטי השיחה שנטענו בהתחברות (None - השיחה לא התחברה)"""
+    context = call_context(call_session(), db, phone)
+    return context['customer'] if context else None
+
+
+@bp.route('/login', methods=['GET'])
 def login():
-    call_id = request.args.get('PBXcallId', '')
-    data = call_data.setdefault(call_id, {})
+    data = call_session()
     tryings = data.setdefault('count', 0)
     logging.info(tryings)
     phone = request.args.get('PBXphone', '')
     customer = db.get_customer_by_phone(phone)
     if not customer:
-        return jsonify({
-                    "type": "simpleMenu",
-                    "name": "no_customer_login",
-                    "times": 1,
-                    "timeout": 5,
-                    "enabledKeys": "",
-                     "setMusic": "no",
-                    "extensionChange": "..",
-                    "files": [{"text": "אינכם רשומים למערכת. הינכם מועברים להרשמה"}]
-                    }
-                    )
+        return responses.response('no_customer_login')
     # קבלת קלט מהמשתמש - הערך האחרון
     items = [_ for _ in request.args.items() if _[0] == "password"]
     if len(items) <= 0:
-        return jsonify({
-                "type": "getDTMF",
-                "name": "password",
-                "max": 10,
-                "min": 4,
-                "timeout": 5,
-                "confirmType": "no",
-                "files":[{"text": "לכניסה למערכת נא הקש את הסיסמה"}]
-                }
-                )
+        return responses.response('login_password')
     key = items[-1][0]
     value = items[-1][1]
 
     # אימות סיסמה
     if key == 'password':
-        if db.verify_password(phone, value):
+        # המונה בשיחה מתאפס בחיוג מחדש - ההגבלה לפי טלפון חוסמת לפני ה-bcrypt
+        limiter = services().login_limiter
+        throttle_key = f"phone:{phone}"
+        if limiter.acquire(throttle_key):
+            return responses.response('error_password')
+        try:
+            verified = db.verify_password(phone, value)
+        except (HashingQueueFull, FuturesTimeoutError):
+            # המערכת עמוסה (תור מלא או המתנה ארוכה מדי) - מבקשים שוב את הסיסמה בלי לספור ניסיון:
+            # האסימון חוזר, כך שמתקשר שמנסה שוב בזמן עומס לא ננעל בלי שהקיש סיסמה שגויה
+            limiter.refund(throttle_key)
+            return responses.response('login_busy')
+        if verified:
+            limiter.reset(throttle_key)
+            # רק אחרי סיסמה נכונה - מתקשר לא מזוהה לא לומד את מצב המנוי.
+            # דגל + מספר YYYYMMDD מהשורה, בלי פענוח תאריכים
+            if not db.is_subscription_active(customer):
+                clear_call_context(data)
+                return responses.response('subscription_expired')
+            # פרטי הלקוח נטענים פעם אחת לשיחה ומשמשים את כל ה-webhooks הבאים
+            store_call_context(data, build_call_context(db, customer))
             # ניתוב לתפריט לקוחות קיימים
-            return jsonify({
-                    "type": "extensionChange",
-                    "extensionIdChange": "1668"
-                }
-                )
+            return responses.response('login_success')
         else:
+            clear_call_context(data)
+            if limiter.record_failure(throttle_key):
+                return responses.response('error_password')
             if tryings > 3:
                 # מספר נסיונות שגויים גדול מ 4 - הודעת שגיאה
-                return jsonify({
-                    "type": "simpleMenu",
-                    "name": "error_password",
-                    "times": 1,
-                    "timeout": 5,
-                    "enabledKeys": "",
-                     "setMusic": "no",
-                    "extensionChange": "",
-                    "files":[{"text": "יותר מדי נסיונות שגויים. נסו שוב מאוחר יותר"}]
-                    }
-                    )
+                return responses.response('error_password')
             # אם לא - העלה את מונה הנסיונות והמשך לניסיון הבא
             data['count'] = data['count'] + 1
-            return jsonify({
-                "type": "getDTMF",
-                "name": "password",
-                "max": 10,
-                "min": 4,
-                "timeout": 5,
-                "confirmType": "no",
-                "files": [{"text": "הסיסמה שגויה. לכניסה למערכת נא הקש את הסיסמה"}]
-                }
-                )        
-
-@app.route('/sign', methods=['GET'])
+            return responses.response('login_wrong_password')
+
+def on_key(key: str, response: str, step: str):
+    """action לתפריט סיום: רק המקש המבוקש ממשיך, כל מקש אחר משמיע את התפריט שוב"""
+    def action(state, value, ctx):
+        if value == key:
+            return response
+        state['step'] = step
+        return step
+    return action
+
+
+def complete_sign(state, value, ctx):
+    """סיום ההרשמה - יצירת הלקוח"""
+    values = state['values']
+    try:
+        db.create_customer(ctx['phone'], values['password'], values['name'], values['tz'])
+    except Exception:
+        logging.exception("sign failed")
+        sign_flow.reset(state)
+        return 'error_sign'
+    # לא משאירים את הסיסמה במצב השיחה
+    sign_flow.reset(state, 'fix_sign')
+    return 'fix_sign'
+
+
+sign_flow = Flow('sign', [
+    FlowStep('name', 'sign_name', next_step='tz'),
+    FlowStep('tz', 'sign_tz', validator=validator.validate_israeli_id,
+             invalid_prompt='sign_tz_invalid', next_step='compeny_name'),
+    FlowStep('compeny_name', 'sign_compeny_name', next_step='open_compeny'),
+    FlowStep('open_compeny', 'sign_open_compeny', validator=validator.validate_business_year,
+             invalid_prompt='sign_open_compeny_invalid', next_step='category'),
+    FlowStep('category', 'sign_category', next_step='password'),
+    FlowStep('password', 'sign_password', validator=validator.validate_password,
+             action=complete_sign),
+    # הפניה להתחברות לקוח
+    FlowStep('fix_sign', 'fix_sign', action=on_key('0', 'sign_to_login', 'fix_sign')),
+], responses)
+
+
+@bp.route('/sign', methods=['GET'])
 def sign():
     """
     הפרטים הנדרשים להרשמה:
@@ -106,169 +312,120 @@ def sign():
     תחום עיסוק
     """
     phone = request.args.get('PBXphone', '')
-    call_id = request.args.get('PBXcallId', '')
-    data = call_data.setdefault(call_id, {})
-    sign_detailes = data.setdefault('sign_detailes', {})
-
-    def fix_sign():
-        password = sign_detailes['password']
-        name = sign_detailes['name']
-        tz = sign_detailes['tz']
-        compeny_name = sign_detailes['compeny_name']
-        open_compeny = sign_detailes['open_compeny']
-        category = sign_detailes['category']
-        if all([password, name, tz, compeny_name, open_compeny, category]):
-            try:
-                db.create_customer(phone, password, name, tz)
-                return jsonify(
-                    {
-                      "type": "simpleMenu",
-                      "name": "fix_sign",
-                      "times": 1,
-                      "timeout": 5,
-                      "enabledKeys": "0",
-                       "setMusic": "no",
-                      "extensionChange": "1664",
-                      "files": [{"text": "ההרשמה הושלמה בהצלחה! הנכם מועברים לתפריט הראשי"}]
-                    }
-                    )
-            except Exception as e:
-                return jsonify(
-                    {
-                      "type": "simpleMenu",
-                      "name": "error_sign",
-                      "times": 1,
-                      "timeout": 5,
-                      "enabledKeys": "",
-                       "setMusic": "no",
-                      "extensionChange": "1663",
-                      "files": [{"text": "שגיאה בתהליך ההרשמה"}]
-                    }
-                    )
-        else:
-            return jsonify(
-                    {
-                      "type": "simpleMenu",
-                      "name": "error_sign",
-                      "times": 1,
-                      "timeout": 5,
-                      "enabledKeys": "",
-                       "setMusic": "no",
-                      "extensionChange": "1663",
-                      "files": [{"text": "שגיאה בתהליך ההרשמה"}]
-                    }
-                    )
-    # קבלת קלט מהמשתמש - הערך האחרון
-    for key in ['password', 'category', 'open_compeny', 'compeny_name', 'tz', 'name']:
-        if key not in request.args.keys():
-            continue
-        logging.info(f"===== the key is {key} =====")
-        value = request.args[key]
-        if key == 'name' and value:
-            sign_detailes['name'] = value
-            return jsonify({
-                    "type": "getDTMF",
-                    "name": "tz",
-                    "max": 9,
-                    "min": 9,
-                    "timeout": 5,
-                    "confirmType": "no",
-                    "files": [{"text": "נא הקש את מספר תעודת הזהות של בעל העסק"}]
-                    }
-                    )
-        elif key == "tz" and value:
-            if validator.validate_israeli_id(value):
-                sign_detailes['tz'] = value
-                return jsonify({
-                    "type": "stt",
-                    "name": "compeny_name",
-                    "max": 4,
-                    "min": 1,
-                    "fileName": f"compeny_name_{phone}",
-                    "files": [{"text": "אמרו בקול ברור את שם העסק"}]
-                    }
-                    )
-            else:
-                return jsonify({
-                    "type": "getDTMF",
-                    "name": "tz",
-                    "max": 9,
-                    "min": 9,
-                    "timeout": 5,
-                    "confirmType": "no",
-                    "files": [{"text": "מספר תעודת הזהות שהוקש אינו תקין. נא הקש את תעודת הזהות של בעל העסק"}]
-                    }
-                    )
-        elif key == "compeny_name" and value:
-            sign_detailes['compeny_name'] = value
-            return jsonify({
-                    "type": "getDTMF",
-                    "name": "open_compeny",
-                    "max": 4,
-                    "min": 4,
-                    "timeout": 5,
-                    "confirmType": "digits",
-                "files": [{"text": "נא הקש בארבע ספרות את שנת פתיחת העסק"}]
-                    }
-                    )
-        elif key == 'open_compeny' and value:
-            if int(datetime.now().year) >= int(value) >= 2000:
-                sign_detailes['open_compeny'] = value
-                return jsonify({
-                    "type": "stt",
-                    "name": "category",
-                    "max": 4,
-                    "min": 2,
-                    "fileName": f"compeny_name_{phone}",
-                    "files": [{"text": "אמרו בקול ברור את תחום העיסוק"}]
-                    }
-                    )
-            else:
-                return jsonify({
-                    "type": "getDTMF",
-                    "name": "open_compeny",
-                    "max": 4,
-                    "min": 4,
-                    "timeout": 5,
-                    "confirmType": "digits",
-                    "files": [{"text": "השנה שנבחרה לא תקינה. נא להקיש בארבע ספרות את שנת פתיחת העסק"}]
-                    }
-                    )
-        elif key == 'category' and value:
-            sign_detailes['category'] = value
-            return jsonify({
-                    "type": "getDTMF",
-                    "name": "password",
-                    "max": 8,
-                    "min": 4,
-                    "timeout": 5,
-                    "confirmType": "digits",
-                    "files": [{"text": "נא בחר סיסמה להתחברות למערכת. הסיסמה צריכה להיות באורך של ארבע עד שמונה ספרות"}]
-                    }
-                    )
-        elif key == 'password' and value:
-            sign_detailes['password'] = value
-            return fix_sign()
-    
-        elif key == 'fix_sign' and value == '0':
-            # הפניה להתחברות לקוח
-            return jsonify({
-                "type": "extensionChange",
-                "extensionIdChange": "1663"
-                }
-                )
-    
-       
-    return jsonify({
-            "type": "stt",
-            "name": "name",
-            "max": 4,
-            "min": 2,
-            "fileName": f"name_{phone}",
-            "files": [{"text": "אמרו בקול ברור את שם בעל העסק"}]
-            }
-            )
-@app.route('/create_recpt', methods=['GET'])
+    return sign_flow.handle(request.args, call_session(), phone=phone)
+
+
+# התאמה מזיהוי דיבור שמצורפת בלי לשאול: ציון פונטי בלבד מוגבל ל-0.9 (similarity),
+# כך שרק כתיב כמעט זהה, ורק כשאין מועמד חזק נוסף
+CONTACT_AUTO_MATCH = 0.93
+CONTACT_CHOICES = 3
+_CHOICE_KEYS = ('אחת', 'שתים', 'שלוש')
+
+
+def require_customer(state, ctx):
+    """כניסה לאשף - שיחה שלא עברה /login לא מקבלת את התפריט"""
+    return None if current_customer(ctx['phone']) else 'no_customer_login'
+
+
+def _use_contact(state, contact_id: Optional[int], label: str):
+    values = state['values']
+    values['contact_id'] = contact_id
+    values['contact_label'] = label
+    values.pop('candidates', None)
+    values.pop('choices', None)
+    state['step'] = 'amout'
+    return 'recpt_amout'
+
+
+def resolve_contact(state, value, ctx):
+    """השם שנאמר -> איש קשר קיים, בחירה מבין מועמדים, או איש קשר חדש (נוצר באישור)"""
+    context = call_context(call_session(), db, ctx['phone'])
+    if not context:
+        return 'no_customer_login'
+    spoken = normalize_hebrew(value)
+    if not spoken:
+        state['step'] = 'contact_name'
+        return 'recpt_contact_name'
+    # שם זהה לאחד מאנשי הקשר הנפוצים - בלי חיפוש במסד
+    for contact in context['contacts']:
+        if normalize_hebrew(contact['name']) == spoken:
+            return _use_contact(state, contact['id'], contact['name'])
+
+    # השם הגיע מזיהוי דיבור - התאמה סלחנית, ובספק המתקשר בוחר
+    matches = db.find_contacts_fuzzy(context['customer']['id'], value, limit=CONTACT_CHOICES)
+    strong = [match for match in matches if match['score'] >= CONTACT_AUTO_MATCH]
+    if len(strong) == 1:
+        return _use_contact(state, strong[0]['id'], strong[0]['name'])
+    if not matches:
+        return _use_contact(state, None, f"{value}, איש קשר חדש")
+
+    state['values']['candidates'] = [{'id': match['id'], 'name': match['name']}
+                                     for match in matches]
+    state['values']['choices'] = ''.join(f"ל{match['name']} הקישו {key}. "
+                                         for match, key in zip(matches, _CHOICE_KEYS))
+    state['step'] = 'choose_contact'
+    return 'recpt_choose_contact'
+
+
+def choose_contact(state, value, ctx):
+    """בחירת איש קשר מהמועמדים (1-3) או איש קשר חדש בשם שנאמר (9)"""
+    values = state['values']
+    candidates = values.get('candidates') or []
+    if value == '9':
+        return _use_contact(state, None, f"{values['contact_name']}, איש קשר חדש")
+    if value.isdigit() and 1 <= int(value) <= len(candidates):
+        candidate = candidates[int(value) - 1]
+        return _use_contact(state, candidate['id'], candidate['name'])
+    state['step'] = 'choose_contact'
+    return 'recpt_choose_contact'
+
+
+def confirm_receipt(state, value, ctx):
+    """אישור (1) או תיקון (2) של פרטי הקבלה"""
+    if value == '1':
+        context = call_context(call_session(), db, ctx['phone'])
+        if not context:
+            return 'no_customer_login'
+        customer = context['customer']
+        values = state['values']
+        contact_id = values.get('contact_id')
+        if contact_id is None:
+            contact_id = db.create_contact(customer['id'], values['contact_name'])
+        # הסכום נשמר באגורות
+        amount = int(round(float(values['amout']) * 100))
+        # הקבלה נכנסת לתור (status = pending) עם המספר הבא של הלקוח, ומופקת ברקע
+        services().receipt_numbers.create_receipt(customer['id'], contact_id, amount,
+                                                  values['detailes'], ctx['call_id'])
+        mark_call_context_changed(call_session())
+        create_recpt_flow.reset(state, 'fix_create_recpt')
+        if services().receipt_issuer is None:
+            # אין מערכת חשבוניות מוגדרת - לא מבטיחים הפקה בדקות הקרובות
+            return 'fix_create_recpt_saved'
+        services().receipt_issuer.notify()
+        return 'fix_create_recpt'
+    if value == '2':
+        create_recpt_flow.reset(state)
+        return 'recpt_restart'
+    state['step'] = 'show_recpt_detailes'
+    return 'show_recpt_detailes'
+
+
+create_recpt_flow = Flow('create_recpt', [
+    FlowStep('contact_name', 'recpt_contact_name', action=resolve_contact,
+             enter=require_customer),
+    FlowStep('choose_contact', 'recpt_choose_contact', action=choose_contact),
+    FlowStep('amout', 'recpt_amout', validator=validator.validate_decimal_amount,
+             invalid_prompt='recpt_amout_invalid',
+             transform=lambda value: value.replace('*', '.'), next_step='detailes'),
+    FlowStep('detailes', 'recpt_detailes', next_step='show_recpt_detailes'),
+    FlowStep('show_recpt_detailes', 'show_recpt_detailes', action=confirm_receipt),
+    # ניתוב לתפריט לקוחות קיימים
+    FlowStep('fix_create_recpt', 'fix_create_recpt',
+             action=on_key('0', 'recpt_to_menu', 'fix_create_recpt')),
+], responses)
+
+
+@bp.route('/create_recpt', methods=['GET'])
 def create_recpt():
     """
     פרטים נדרשים להוצאת קבלה:
@@ -277,116 +434,167 @@ def create_recpt():
     תיאור
     """
     phone = request.args.get('PBXphone', '')
-    contact_name = None
-    amout = None
-    detailes = None
-    key = list(request.args.keys())[-1]
-    value = request.args[key]
-    def send_and_create():
-        return jsonify(
-                    {
-                      "type": "simpleMenu",
-                      "name": "fix_create_recpt",
-                      "times": 1,
-                      "timeout": 5,
-                      "enabledKeys": "0",
-                       "setMusic": "no",
-                      "extensionChange": "",
-                      "files": [{"text": "הקבלה הופקה בהצלחה! לחץ אפס לחזרה לתפריט הראשי"
-                    }]
-                    }
-
-                    )
-    if key == 'contact_name' and value:
-        contact_name = value
-        return jsonify({
-                "type": "getDTMF",
-                "name": "amout",
-                "max": 5,
-                "min": 1,
-                "timeout": 5,
-                "confirmType": "number",
-                "files": [{"text": "נא הקש את סכום הקבלה, לנקודה עשרונית לחץ כוכבית"
-                }]
-        }
-                )
-    elif key == 'amout' and value:
-        amout = eval(value)
-        return jsonify({
-                "type": "stt",
-                "name": "detailes",
-                "max": 4,
-                "min": 1,
-                "fileName": f'detailes {phone}',
-                "files": [{"text": "אמרו את תיאור השירות או המוצר"
-                }]
-        }
-                )
-    elif key == 'detailes' and value:
-        detailes = value
-        return jsonify(
-                    {
-                      "type": "simpleMenu",
-                      "name": "show_recpt_detailes",
-                      "times": 1,
-                      "timeout": 5,
-                      "enabledKeys": "1,2",
-                       "setMusic": "no",
-                      "extensionChange": "",
-                      "files": [{"text": f"ביקשתם להפיק קבלה עבור {contact_name}, בסכום של {amout}. תיאור: {detailes}. לאישור הקישו אחת, לתיקון הקישו שתים"
-                    }]
-                    }
-
-                    )
-    elif key == 'show_recpt_detailes':
-        if value == '1':
-            send_and_create()
-        elif value == '2':
-            return jsonify({
-                    "type": "extensionChange",
-                    "extensionIdChange": "create_recpt"
-                    }
-                    )
-    elif key == 'fix_create_recpt' and value == '0':
-        # ניתוב לתפריט לקוחות קיימים
-        return jsonify({
-                "type": "extensionChange",
-                "extensionIdChange": "1665"
-                }
-                )
-
-@app.route('/cancel_recpt', methods=['GET'])
+    return create_recpt_flow.handle(request.args, call_session(), phone=phone,
+                                    call_id=request.args.get('PBXcallId', ''))
+
+def load_last_receipt(state, ctx):
+    """כניסה לביטול - הצגת הקבלה האחרונה של הלקוח"""
+    customer = current_customer(ctx['phone'])
+    if not customer:
+        return 'no_customer_login'
+    receipt = db.get_last_receipt(customer['id'])
+    if not receipt:
+        state['step'] = 'cancel_recpt_none'
+        return 'cancel_recpt_none'
+    state['values'].update(receipt_id=receipt['id'], contact_name=receipt['contact_name'] or '',
+                           amount="%.2f" % (receipt['amount'] / 100))
+    # קבלה שנשלחה להפקה מבוטלת רק מול מערכת החשבוניות
+    if receipt['status'] not in ('pending', 'failed'):
+        state['step'] = 'cancel_recpt_refused'
+        return 'cancel_recpt_refused'
+    return None
+
+
+def confirm_cancel(state, value, ctx):
+    """ביטול (1) או חזרה לתפריט (2)"""
+    if value == '1':
+        customer = current_customer(ctx['phone'])
+        if not customer:
+            return 'no_customer_login'
+        # הטריגרים על receipts מעדכנים את סיכום הקבלות של איש הקשר
+        if not db.void_receipt(customer['id'], state['values']['receipt_id']):
+            # הקבלה נלקחה להפקה מאז שהוצגה
+            state['step'] = 'cancel_recpt_refused'
+            return 'cancel_recpt_refused'
+        mark_call_context_changed(call_session())
+        cancel_recpt_flow.reset(state, 'cancel_recpt_done')
+        return 'cancel_recpt_done'
+    if value == '2':
+        cancel_recpt_flow.reset(state)
+        return 'recpt_to_menu'
+    state['step'] = 'cancel_recpt_confirm'
+    return 'cancel_recpt_confirm'
+
+
+def back_to_menu(state, value, ctx):
+    cancel_recpt_flow.reset(state)
+    return 'recpt_to_menu'
+
+
+cancel_recpt_flow = Flow('cancel_recpt', [
+    FlowStep('cancel_recpt_confirm', 'cancel_recpt_confirm', action=confirm_cancel,
+             enter=load_last_receipt),
+    FlowStep('cancel_recpt_none', 'cancel_recpt_none', action=back_to_menu),
+    FlowStep('cancel_recpt_refused', 'cancel_recpt_refused', action=back_to_menu),
+    FlowStep('cancel_recpt_done', 'cancel_recpt_done', action=back_to_menu),
+], responses)
+
+
+@bp.route('/cancel_recpt', methods=['GET'])
 def cancel_recpt():
-    pass
+    """ביטול הקבלה האחרונה שהופקה"""
+    phone = request.args.get('PBXphone', '')
+    return cancel_recpt_flow.handle(request.args, call_session(), phone=phone)
 
-@app.route('/add_child', methods=['GET'])
+@bp.route('/add_child', methods=['GET'])
 def add_child():
     pass
 
-@app.route('/edit_child', methods=['GET'])
+@bp.route('/edit_child', methods=['GET'])
 def edit_child():
     pass
 
-@app.route('/get_detailes', methods=['GET'])
+def load_statement(state, ctx):
+    """כניסה לפרטים - סיכום הדוח החודשי האחרון (מופק מראש, בלי חישוב בזמן השיחה)"""
+    customer = current_customer(ctx['phone'])
+    if not customer:
+        return 'no_customer_login'
+    month = previous_month()
+    statement = services().statements.summary(customer['id'], month)
+    if statement is None:
+        state['step'] = 'statement_none'
+        return 'statement_none'
+    top = statement['summary'][0] if statement['summary'] else None
+    year, month_number = month.split('-')
+    state['values'].update(
+        month=f"{int(month_number)}/{year}",
+        receipts_count=statement['receipts_count'],
+        total_amount="%.2f" % (statement['total_amount'] / 100),
+        contacts_count=statement['contacts_count'],
+        top_contact=f"הסכום הגבוה ביותר, {top['total_amount'] / 100:.2f} שקלים, עבור {top['name']}. "
+                    if top and top['name'] else "")
+    return None
+
+
+def details_to_menu(state, value, ctx):
+    details_flow.reset(state)
+    return 'recpt_to_menu'
+
+
+details_flow = Flow('details', [
+    FlowStep('statement_summary', 'statement_summary', action=details_to_menu,
+             enter=load_statement),
+    FlowStep('statement_none', 'statement_none', action=details_to_menu),
+], responses)
+
+
+@bp.route('/get_detailes', methods=['GET'])
 def get_detailes():
-    pass
+    """סיכום הקבלות של החודש הקודם לפי איש קשר"""
+    phone = request.args.get('PBXphone', '')
+    return details_flow.handle(request.args, call_session(), phone=phone)
 
-@app.route('/edit_profile', methods=['GET'])
+@bp.route('/edit_profile', methods=['GET'])
 def edit_profile():
     pass
 
-@app.route('/end_account', methods=['GET'])
+@bp.route('/end_account', methods=['GET'])
 def end_account():
     pass
 
-@app.route('/rights', methods=['GET'])
+def load_rights(state, ctx):
+    """כניסה לזכויות - חישוב (או תוצאה שמורה) לשנת המס הנוכחית"""
+    customer = current_customer(ctx['phone'])
+    if not customer:
+        return 'no_customer_login'
+    result = rights.calculate(customer['id'], datetime.now().year)
+    if result is None:
+        # הלקוח נמחק מאז שפרטי השיחה נטענו
+        clear_call_context(call_session())
+        return 'no_customer_login'
+    state['values'].update(
+        tax_year=result['tax_year'],
+        # טבלאות השנה טרם פורסמו - החישוב לפי השנה האחרונה שפורסמה, ואומרים זאת
+        rules_note=f"טבלאות שנת המס {result['tax_year']} טרם פורסמו, והחישוב לפי טבלאות "
+                   f"{result['rules_year']}. " if result['rules_year'] != result['tax_year'] else "",
+        credit_points=f"{result['credit_points']:g}",
+        credit_points_value=result['credit_points_value'],
+        child_allowance_monthly=result['child_allowance_monthly'],
+        tax_coordination="ייתכן שמגיע לכם החזר מס בשל עבודה במספר מקומות. "
+                         if result['tax_coordination'] else "")
+    return None
+
+
+def rights_to_menu(state, value, ctx):
+    rights_flow.reset(state)
+    return 'recpt_to_menu'
+
+
+rights_flow = Flow('rights', [
+    FlowStep('rights_summary', 'rights_summary', action=rights_to_menu, enter=load_rights),
+], responses)
+
+
+@bp.route('/rights', methods=['GET'])
 def rigths():
-    pass
+    """זכויות והטבות לפי הילדים ומקומות העבודה של הלקוח"""
+    phone = request.args.get('PBXphone', '')
+    return rights_flow.handle(request.args, call_session(), phone=phone)
 
 
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))  # ברירת מחדל 5000 לוקאלית
-    app.run(host="0.0.0.0", port=port)
+    create_app().run(host="0.0.0.0", port=port)
 
 
 
@@ -0,0 +1,476 @@
+# ============================================================================
+# benchmark.py - מדידת ביצועים לנתיבים החמים של DatabaseService ו-ValidationService
+# ============================================================================
+#
+# python benchmark.py --contacts 100000 --output bench.json
+# python benchmark.py --compare old.json new.json
+# python benchmark.py --startup --app-dir /path/to/old/checkout --output old_startup.json
+# python benchmark.py --writes --write-threads 16 --single-writer --output writes.json
+# python benchmark.py --receipt-numbers --processes 4 --number-block 50
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from database_service import DatabaseService
+from hashing_service import PasswordHasher
+from hebrew_text import contact_search_fields
+from receipt_numbers import ReceiptNumberAllocator
+from validation_service import ValidationService
+
+HEBREW_NAMES = ['משה', 'דוד', 'שרה', 'רחל', 'יוסף', 'לאה', 'אברהם', 'מרים', 'יעקב', 'חנה',
+                'כהן', 'לוי', 'מזרחי', 'פרץ', 'ביטון', 'אזולאי', 'פרידמן', 'שפירא']
+COMPANY_WORDS = ['שירותים', 'בניה', 'מחשבים', 'ייעוץ', 'הובלות', 'גינון', 'עיצוב', 'חשמל']
+
+
+def _phone(i: int) -> str:
+    return f"05{i:08d}"
+
+
+def _israeli_id(rng: random.Random) -> str:
+    """ת.ז. תקינה אקראית"""
+    digits = [rng.randint(0, 9) for _ in range(8)]
+    total = 0
+    for i, digit in enumerate(digits):
+        product = digit * (2 if i % 2 == 1 else 1)
+        total += product if product < 10 else product - 9
+    return ''.join(map(str, digits)) + str((10 - total % 10) % 10)
+
+
+def seed_database(db: DatabaseService, customers: int, contacts: int, children: int,
+                  receipts: int, password_hash: str, rng: random.Random):
+    """מילוי מסד בנתונים בהיקף מציאותי (executemany ישיר - ללא bcrypt לכל לקוח)"""
+    with db.get_connection() as conn:
+        conn.executemany('''
+            INSERT INTO customers
+            (phone_number, password, name, tz, subscription_start_date, subscription_end_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', ((_phone(i), password_hash, rng.choice(HEBREW_NAMES), _israeli_id(rng),
+               '2025-01-01', '2027-01-01') for i in range(customers)))
+
+        def contact_row(i):
+            row = (rng.randint(1, customers),
+                   f"{rng.choice(HEBREW_NAMES)} {rng.choice(HEBREW_NAMES)}",
+                   _israeli_id(rng), _phone(customers + i),
+                   f"{rng.choice(COMPANY_WORDS)} {rng.choice(HEBREW_NAMES)}")
+            # עמודות החיפוש מחושבות ב-Python כמו ב-create_contact
+            return row + contact_search_fields(row[1], row[4])
+
+        conn.executemany('''
+            INSERT INTO contacts (customer_id, name, tz, phone_number, company_name,
+                                  search_name, search_company, search_phonetic)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (contact_row(i) for i in range(contacts)))
+
+        current_year = datetime.now().year
+        conn.executemany('''
+            INSERT INTO children (customer_id, name, birth_year) VALUES (?, ?, ?)
+        ''', ((rng.randint(1, customers), rng.choice(HEBREW_NAMES),
+               rng.randint(current_year - 18, current_year)) for _ in range(children)))
+
+        conn.executemany('''
+            INSERT INTO receipts (customer_id, contact_id, amount, description, created_at)
+            SELECT customer_id, id, ?, ?, ? FROM contacts WHERE id = ?
+        ''', ((rng.randint(100, 500000), rng.choice(COMPANY_WORDS),
+               f"{rng.randint(2023, 2026)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00",
+               rng.randint(1, contacts)) for _ in range(receipts)))
+        conn.commit()
+        conn.execute('ANALYZE')
+
+
+def time_operation(fn: Callable[[], object], iterations: int, warmup: int = 3) -> Dict[str, float]:
+    """הרצת פעולה מספר פעמים והחזרת סטטיסטיקות זמן (במיקרו-שניות)"""
+    for _ in range(warmup):
+        fn()
+
+    samples: List[float] = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return _stats(samples)
+
+
+def _stats(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        'iterations': len(samples),
+        'mean_us': statistics.fmean(samples),
+        'p50_us': samples[len(samples) // 2],
+        'p95_us': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'min_us': samples[0],
+        'ops_per_sec': 1e6 / statistics.fmean(samples),
+    }
+
+
+def run_benchmarks(args) -> Dict:
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='pbx_bench_')
+    db_path = os.path.join(workdir, 'bench.db')
+
+    hasher = PasswordHasher(workers=0, rounds=args.bcrypt_rounds)
+    db = DatabaseService(db_path, pooled=args.pooled, hasher=hasher)
+
+    started = time.perf_counter()
+    seed_database(db, args.customers, args.contacts, args.children, args.receipts,
+                  hasher.hash('1234'), rng)
+    seed_seconds = time.perf_counter() - started
+
+    with db.get_connection() as conn:
+        busy_customer = conn.execute('''
+            SELECT customer_id FROM contacts GROUP BY customer_id ORDER BY COUNT(*) DESC LIMIT 1
+        ''').fetchone()[0]
+        busy_contact = conn.execute('''
+            SELECT contact_id FROM receipts GROUP BY contact_id ORDER BY COUNT(*) DESC LIMIT 1
+        ''').fetchone()[0]
+
+    phones = [_phone(rng.randrange(args.customers)) for _ in range(256)]
+    ids = [_israeli_id(rng) for _ in range(256)]
+    counter = iter(range(10 ** 9))
+
+    def pick(values):
+        return values[next(counter) % len(values)]
+
+    n = args.iterations
+    cases = {
+        'get_customer_by_phone': (lambda: db.get_customer_by_phone(pick(phones)), n),
+        'verify_password': (lambda: db.verify_password(pick(phones), '1234'),
+                            max(5, n // 50)),
+        'search_contacts_by_name': (
+            lambda: db.search_contacts_by_name(busy_customer, pick(HEBREW_NAMES)), n),
+        'get_customer_contacts_with_receipts_count': (
+            lambda: db.get_customer_contacts_with_receipts_count(busy_customer), n),
+        'get_receipts_by_contact_detailed': (
+            lambda: db.get_receipts_by_contact_detailed(busy_contact), n),
+        'validate_israeli_id': (lambda: ValidationService.validate_israeli_id(pick(ids)), n * 10),
+    }
+
+    results = {}
+    try:
+        for name, (fn, iterations) in cases.items():
+            if args.only and name not in args.only:
+                continue
+            results[name] = time_operation(fn, iterations)
+            print(f"{name:45s} {results[name]['mean_us']:12.1f} us/op", file=sys.stderr)
+    finally:
+        if db.pool is not None:
+            db.pool.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'pooled': args.pooled,
+            'bcrypt_rounds': args.bcrypt_rounds,
+            'seed_seconds': seed_seconds,
+            'dataset': {
+                'customers': args.customers,
+                'contacts': args.contacts,
+                'children': args.children,
+                'receipts': args.receipts,
+            },
+        },
+        'results': results,
+    }
+
+
+# תהליך חדש: import של app, בניית האפליקציה ובקשה ראשונה - מדפיס את הזמנים בשניות
+_COLD_START = '''
+import sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import app as module
+flask_app = module.create_app() if hasattr(module, 'create_app') else module.app
+ready = time.perf_counter()
+flask_app.test_client().get('/login?PBXphone=0533154518&PBXcallId=bench')
+print(ready - started, time.perf_counter() - started)
+'''
+
+
+def run_startup_benchmark(args) -> Dict:
+    """זמן עלייה של worker על מסד חדש (כל ריצה בתהליך ובתיקייה נפרדים)"""
+    app_dir = os.path.abspath(args.app_dir)
+    ready, first_request, total = [], [], []
+    for run in range(args.startup_runs + 1):
+        workdir = tempfile.mkdtemp(prefix='pbx_startup_')
+        env = dict(os.environ, DB_PATH=os.path.join(workdir, 'pbx_system.db'),
+                   BCRYPT_ROUNDS=str(args.bcrypt_rounds))
+        try:
+            started = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', _COLD_START, app_dir], cwd=workdir,
+                                    env=env, check=True, capture_output=True, text=True).stdout
+            elapsed = time.perf_counter() - started
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        if run == 0:
+            continue  # חימום של מטמון הקבצים וה-bytecode
+        app_ready, served = map(float, output.split()[-2:])
+        ready.append(app_ready * 1e6)
+        first_request.append(served * 1e6)
+        total.append(elapsed * 1e6)
+
+    results = {'app_ready': _stats(ready), 'app_first_request': _stats(first_request),
+               'process_cold_start': _stats(total)}
+    for name, result in results.items():
+        print(f"{name:45s} {result['mean_us'] / 1000:12.1f} ms", file=sys.stderr)
+    return {
+        'meta': {
+            'commit': _git_commit(app_dir),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'bcrypt_rounds': args.bcrypt_rounds,
+            'startup_runs': args.startup_runs,
+        },
+        'results': results,
+    }
+
+
+def run_write_benchmark(args) -> Dict:
+    """כתיבות מקבילות מ-threads רבים (כמו בקשות Flask) - זמן לכתיבה, שגיאות נעילה ו-commits"""
+    workdir = tempfile.mkdtemp(prefix='pbx_writes_')
+    hasher = PasswordHasher(workers=0, rounds=4)
+    db = DatabaseService(os.path.join(workdir, 'bench.db'), pooled=args.pooled, hasher=hasher,
+                         single_writer=args.single_writer)
+    customer_id = db.create_customer(_phone(0), '1234', 'bench', None)
+    contact_id = db.create_contact(customer_id, 'bench')
+
+    samples: List[float] = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker():
+        mine, failed = [], []
+        for i in range(args.writes_per_thread):
+            started = time.perf_counter()
+            try:
+                db.create_receipt_for_contact(customer_id, contact_id, 100 + i)
+            except sqlite3.OperationalError as e:
+                failed.append(str(e))
+                continue
+            mine.append((time.perf_counter() - started) * 1e6)
+        with lock:
+            samples.extend(mine)
+            errors.extend(failed)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.write_threads)]
+    started = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        writer = db.writer.stats() if db.writer is not None else None
+    finally:
+        if db.writer is not None:
+            db.writer.stop()
+        if db.pool is not None:
+            db.pool.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {'create_receipt_for_contact': _stats(samples)}
+    print(f"{'create_receipt_for_contact':45s} {results['create_receipt_for_contact']['mean_us']:12.1f}"
+          f" us/op  {len(samples) / elapsed:8.0f} writes/s  {len(errors)} errors", file=sys.stderr)
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'pooled': args.pooled,
+            'single_writer': args.single_writer,
+            'threads': args.write_threads,
+            'writes_per_thread': args.writes_per_thread,
+            'elapsed_seconds': elapsed,
+            'errors': len(errors),
+            'writer': writer,
+        },
+        'results': results,
+    }
+
+
+def _receipt_number_worker(job) -> Dict:
+    """worker אחד במבחן העומס: threads שיוצרים קבלות ללקוחות אקראיים"""
+    db_path, worker, args = job
+    db = DatabaseService(db_path, pooled=True, initialize=False, single_writer=args.single_writer)
+    allocator = ReceiptNumberAllocator(db, args.number_block)
+    errors = []
+
+    def run(thread):
+        rng = random.Random(args.seed * 10000 + worker * 100 + thread)
+        for _ in range(args.writes_per_thread):
+            try:
+                allocator.create_receipt(rng.randint(1, args.number_customers), None, 100)
+            except sqlite3.Error as e:
+                errors.append(str(e))
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(args.write_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # סיום מסודר של ה-worker - המספרים שנשארו בבלוקים חוזרים לשימוש
+    allocator.release_all()
+    if db.writer is not None:
+        db.writer.stop()
+    return dict(allocator.stats(), errors=errors)
+
+
+def run_receipt_number_benchmark(args) -> Dict:
+    """מבחן עומס למספור הקבלות: כמה תהליכים x threads, ובדיקה שאין כפילויות ופערים"""
+    workdir = tempfile.mkdtemp(prefix='pbx_numbers_')
+    db_path = os.path.join(workdir, 'bench.db')
+    db = DatabaseService(db_path, pooled=True, hasher=PasswordHasher(workers=0, rounds=4))
+    with db.get_connection() as conn:
+        conn.executemany('INSERT INTO customers (phone_number, password) VALUES (?, ?)',
+                         [(_phone(i), '') for i in range(args.number_customers)])
+        conn.commit()
+
+    try:
+        jobs = [(db_path, worker, args) for worker in range(args.processes)]
+        started = time.perf_counter()
+        with multiprocessing.Pool(args.processes) as pool:
+            workers = pool.map(_receipt_number_worker, jobs)
+        elapsed = time.perf_counter() - started
+
+        with db.get_connection() as conn:
+            created = conn.execute('SELECT COUNT(*) FROM receipts').fetchone()[0]
+            duplicates = conn.execute('''
+                SELECT COUNT(*) FROM (
+                    SELECT 1 FROM receipts WHERE receipt_number IS NOT NULL
+                    GROUP BY customer_id, receipt_number HAVING COUNT(*) > 1)
+            ''').fetchone()[0]
+        gaps = db.find_receipt_number_gaps()
+    finally:
+        if db.pool is not None:
+            db.pool.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    errors = [error for worker in workers for error in worker['errors']]
+    result = {
+        'receipts': created,
+        'allocations_per_sec': created / elapsed,
+        'duplicates': duplicates,
+        'gaps': len(gaps),
+        'errors': len(errors),
+        'reservations': sum(worker['reservations'] for worker in workers),
+        'released': sum(worker['released'] for worker in workers),
+    }
+    print(f"{created} receipts in {elapsed:.2f}s ({result['allocations_per_sec']:.0f}/s), "
+          f"{duplicates} duplicates, {len(gaps)} gaps, {len(errors)} errors", file=sys.stderr)
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'processes': args.processes,
+            'threads': args.write_threads,
+            'writes_per_thread': args.writes_per_thread,
+            'customers': args.number_customers,
+            'block_size': args.number_block,
+            'single_writer': args.single_writer,
+            'elapsed_seconds': elapsed,
+            'first_errors': errors[:5],
+        },
+        'results': {'receipt_numbers': result},
+    }
+
+
+def _git_commit(path: str = None) -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL,
+                                       cwd=path or os.path.dirname(os.path.abspath(__file__))
+                                       ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def compare(old_path: str, new_path: str):
+    """השוואת שתי ריצות (זמן ממוצע לפעולה)"""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+
+    print(f"{'benchmark':45s} {'old us':>12s} {'new us':>12s} {'change':>8s}")
+    for name, result in new['results'].items():
+        if name not in old['results']:
+            continue
+        before = old['results'][name]['mean_us']
+        after = result['mean_us']
+        print(f"{name:45s} {before:12.1f} {after:12.1f} {(after - before) / before:+8.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DatabaseService / ValidationService microbenchmarks")
+    parser.add_argument('--customers', type=int, default=2000)
+    parser.add_argument('--contacts', type=int, default=100000)
+    parser.add_argument('--children', type=int, default=5000)
+    parser.add_argument('--receipts', type=int, default=300000)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--pooled', action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', nargs='*', help='run only these benchmarks')
+    parser.add_argument('--output', help='write JSON results to this file (default: stdout)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two result files instead of running')
+    parser.add_argument('--startup', action='store_true',
+                        help='measure app cold start (import, create_app, first request) instead')
+    parser.add_argument('--app-dir', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='checkout whose app.py is started (for --startup)')
+    parser.add_argument('--startup-runs', type=int, default=5)
+    parser.add_argument('--writes', action='store_true',
+                        help='measure concurrent writes from many threads instead')
+    parser.add_argument('--write-threads', type=int, default=16)
+    parser.add_argument('--writes-per-thread', type=int, default=200)
+    parser.add_argument('--single-writer', action=argparse.BooleanOptionalAction, default=False,
+                        help='route writes through DatabaseService single_writer (for --writes)')
+    parser.add_argument('--receipt-numbers', action='store_true',
+                        help='stress the receipt number allocator from several processes instead')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--number-customers', type=int, default=20)
+    parser.add_argument('--number-block', type=int, default=1,
+                        help='numbers reserved per worker and customer (1 - inside the insert)')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.startup:
+        report = run_startup_benchmark(args)
+    elif args.writes:
+        report = run_write_benchmark(args)
+    elif args.receipt_numbers:
+        report = run_receipt_number_benchmark(args)
+    else:
+        report = run_benchmarks(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
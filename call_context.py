@@ -0,0 +1,81 @@
+# ============================================================================
+# call_context.py - פרטי הלקוח לשיחה, נטענים פעם אחת בהתחברות
+# ============================================================================
+
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from database_service import DatabaseService
+
+# המפתחות במצב השיחה (נשמרים יחד עם ה-session, משותפים לכל ה-workers)
+CONTEXT_KEY = 'context'
+# נקבעים רק אחרי סיסמה נכונה ב-/login - בלעדיהם אין לקוח לשיחה
+AUTHENTICATED_KEY = 'authenticated'
+CUSTOMER_ID_KEY = 'customer_id'
+TOP_CONTACTS = 20
+
+# שדות הלקוח שנשמרים בשיחה - בלי hash הסיסמה
+_CUSTOMER_FIELDS = ('id', 'phone_number', 'name', 'tz', 'compny_name', 'open_compeny',
+                    'subscription_start_date', 'subscription_end_date', 'subscription_end_day',
+                    'subscription_active', 'is_active',
+                    'spouse1_workplaces', 'spouse2_workplaces')
+
+
+def build_call_context(db: DatabaseService, customer: Dict,
+                       top_contacts: int = TOP_CONTACTS) -> Dict:
+    """תמונת מצב של הלקוח: פרטים, ילדים פעילים עם גילאים ואנשי הקשר הנפוצים
+
+    מצב המנוי לא נשמר כאן - הוא נבדק ב-/login ובכל טעינה מחדש (call_context).
+    """
+    return {
+        'customer': {field: customer.get(field) for field in _CUSTOMER_FIELDS},
+        'children': db.get_children_ages(customer['id']),
+        'contacts': db.get_top_contacts(customer['id'], top_contacts),
+        'year': datetime.now().year,
+        'loaded_at': time.time(),
+    }
+
+
+def store_call_context(session: Dict, context: Dict):
+    """שמירת פרטי הלקוח אחרי סיסמה נכונה - מסמן את השיחה כמחוברת ללקוח הזה"""
+    session[CONTEXT_KEY] = context
+    session[AUTHENTICATED_KEY] = True
+    session[CUSTOMER_ID_KEY] = context['customer']['id']
+
+
+def clear_call_context(session: Dict):
+    """ניתוק השיחה מהלקוח (סיסמה שגויה, מנוי שפג, לקוח שנמחק)"""
+    for key in (CONTEXT_KEY, AUTHENTICATED_KEY, CUSTOMER_ID_KEY):
+        session.pop(key, None)
+
+
+def call_context(session: Dict, db: DatabaseService, phone: str) -> Optional[Dict]:
+    """פרטי הלקוח של השיחה - מהשיחה, או טעינה מחדש לפי הלקוח שהתחבר אם סומנו כלא עדכניים
+
+    None - השיחה לא עברה /login (אין טעינה לפי הטלפון בלבד), או שהלקוח כבר לא
+    פעיל / המנוי שלו פג מאז ההתחברות.
+    """
+    if not session.get(AUTHENTICATED_KEY):
+        return None
+    context = session.get(CONTEXT_KEY)
+    if (context is not None and not context.get('stale')
+            and context['customer']['phone_number'] == phone
+            and context['year'] == datetime.now().year):
+        return context
+
+    customer = db.get_customer_by_id(session[CUSTOMER_ID_KEY])
+    if (customer is None or customer['phone_number'] != phone
+            or not db.is_subscription_active(customer)):
+        clear_call_context(session)
+        return None
+    context = build_call_context(db, customer)
+    store_call_context(session, context)
+    return context
+
+
+def mark_call_context_changed(session: Dict):
+    """השיחה כתבה נתונים חדשים - הטעינה הבאה תבנה את התמונה מחדש"""
+    context = session.get(CONTEXT_KEY)
+    if context is not None:
+        context['stale'] = True
@@ -0,0 +1,150 @@
+# ============================================================================
+# call_recorder.py - רישום אירועי שיחה לטבלת calls ברקע (write-behind)
+# ============================================================================
+
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from database_service import DatabaseService
+
+# פרמטרים שלא נשמרים בהיסטוריית השיחה
+SENSITIVE_FIELDS = ('password',)
+
+
+def _timestamp(seconds: float) -> str:
+    """זמן בפורמט של CURRENT_TIMESTAMP (UTC)"""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(seconds))
+
+
+class CallRecorder:
+    """תור אירועי שיחה בזיכרון ו-thread שכותב אותם ב-batches
+
+    ה-handler רק מכניס אירוע לתור (בלי גישה למסד). ה-thread כותב כשמצטברים
+    batch_size אירועים או כשעוברות flush_interval שניות מהאירוע הראשון ב-batch,
+    כל batch בטרנזקציה אחת. כשהתור מלא אירועים נזרקים (ונספרים) - השיחה לא ממתינה.
+    """
+
+    def __init__(self, db: DatabaseService, batch_size: int = 200, flush_interval: float = 1.0,
+                 max_pending: int = 10000):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: 'queue.Queue[tuple]' = queue.Queue(max_pending)
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        atexit.register(self.stop)
+
+    def record(self, call_id: str, pbx_data: Dict, event: Dict):
+        """אירוע webhook בשיחה - pbx_data הם פרמטרי המרכזייה האחרונים"""
+        self._put(('event', call_id, pbx_data, event, time.time()))
+
+    def end_call(self, call_id: str, ended_at: float = None):
+        """סימון סיום שיחה (למשל כשמצב השיחה פג תוקף)"""
+        self._put(('end', call_id, None, None, ended_at or time.time()))
+
+    def _put(self, item: tuple):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _write(self, items: List[tuple]):
+        """כתיבת batch - אירועים מקובצים לשורה אחת לכל שיחה"""
+        calls: Dict[str, Dict] = {}
+        endings = []
+        for kind, call_id, pbx_data, event, at in items:
+            if kind == 'end':
+                endings.append((_timestamp(at), call_id))
+                continue
+            call = calls.get(call_id)
+            if call is None:
+                call = calls[call_id] = {'call_id': call_id, 'started_at': _timestamp(at),
+                                         'events': []}
+            call['phone'] = pbx_data.get('PBXphone')
+            call['pbx_data'] = pbx_data
+            call['events'].append(dict(event, at=_timestamp(at)))
+
+        try:
+            self.db.write_call_log(list(calls.values()), endings)
+        except Exception:
+            logging.exception("call log batch failed (%d events)", len(items))
+            with self._lock:
+                self.failed += len(items)
+            return
+        with self._lock:
+            self.written += len(items)
+
+    def _drain(self, limit: int) -> List[tuple]:
+        items = []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def flush(self) -> int:
+        """כתיבה מיידית של כל מה שבתור (בכיבוי, אחרי שה-thread נעצר)"""
+        count = 0
+        while True:
+            items = self._drain(self.batch_size)
+            if not items:
+                return count
+            self._write(items)
+            count += len(items)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='call-recorder', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """עצירת ה-thread וכתיבת האירועים שנשארו בתור"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'pending': self._queue.qsize(), 'written': self.written,
+                    'dropped': self.dropped, 'failed': self.failed}
+
+
+def call_event(route: str, args, status: int) -> Dict:
+    """אירוע מבקשה - פרמטרי ה-PBX נשמרים בנפרד, שדות רגישים מוסתרים"""
+    values = {key: ('***' if key in SENSITIVE_FIELDS else value)
+              for key, value in args.items() if not key.startswith('PBX')}
+    return {'route': route, 'values': values, 'status': status}
+
+
+def pbx_fields(args) -> Dict:
+    return {key: value for key, value in args.items() if key.startswith('PBX')}
@@ -0,0 +1,55 @@
+# ============================================================================
+# config.py - הגדרות האפליקציה ממשתני סביבה
+# ============================================================================
+
+import os
+from typing import Dict, Mapping
+
+_FALSE = ('0', 'false', 'no', 'off', '')
+
+
+def _flag(value: str) -> bool:
+    return value.strip().lower() not in _FALSE
+
+
+def load_config(environ: Mapping[str, str] = None) -> Dict:
+    """הגדרות לפי משתני הסביבה (ברירות המחדל מתאימות להרצה מקומית)"""
+    env = os.environ if environ is None else environ
+    return {
+        'DB_PATH': env.get('DB_PATH', 'pbx_system.db'),
+        # הקמת/מיגרציית המסד בעליית התהליך - gunicorn.conf.py מכבה אחרי שעשה זאת פעם אחת
+        'DB_AUTO_INIT': _flag(env.get('DB_AUTO_INIT', '1')),
+        # כל הכתיבות של ה-worker ב-thread אחד עם group commit (המתנה של עד
+        # DB_WRITER_MAX_DELAY שניות לכתיבות נוספות לאותו commit)
+        'DB_SINGLE_WRITER': _flag(env.get('DB_SINGLE_WRITER', '0')),
+        'DB_WRITER_MAX_DELAY': float(env.get('DB_WRITER_MAX_DELAY', 0.002)),
+        'HASH_WORKERS': int(env.get('HASH_WORKERS', 2)),
+        'BCRYPT_ROUNDS': int(env.get('BCRYPT_ROUNDS', 12)),
+        'HASH_MAX_PENDING': int(env.get('HASH_MAX_PENDING', 16)),
+        # המתנה מרבית ל-bcrypt בבקשה - קצרה מה-timeout של ה-webhook במרכזייה, כך
+        # שהמתקשר מקבל login_busy ולא ניתוק
+        'HASH_TIMEOUT': float(env.get('HASH_TIMEOUT', 3.0)),
+        # ניסיונות התחברות לכל טלפון: רצף, קצב חזרה (שניות לניסיון) ונעילה
+        'LOGIN_BURST': int(env.get('LOGIN_BURST', 5)),
+        'LOGIN_REFILL_SECONDS': float(env.get('LOGIN_REFILL_SECONDS', 60)),
+        'LOGIN_LOCKOUT_AFTER': int(env.get('LOGIN_LOCKOUT_AFTER', 10)),
+        'LOGIN_LOCKOUT_SECONDS': float(env.get('LOGIN_LOCKOUT_SECONDS', 900)),
+        'CUSTOMER_CACHE_SIZE': int(env.get('CUSTOMER_CACHE_SIZE', 50000)),
+        'CUSTOMER_CACHE_TTL': float(env.get('CUSTOMER_CACHE_TTL', 300)),
+        # שינוי בלקוח מ-worker/תהליך אחר נראה לכל היותר אחרי כך הרבה שניות
+        'CUSTOMER_CACHE_CHECK_INTERVAL': float(env.get('CUSTOMER_CACHE_CHECK_INTERVAL', 1.0)),
+        # מספרי קבלה: 1 - מהמונה בטרנזקציית היצירה (בלי פערים); יותר - בלוק לכל worker
+        'RECEIPT_NUMBER_BLOCK': int(env.get('RECEIPT_NUMBER_BLOCK', 1)),
+        # קבצי הדוחות החודשיים (python manage.py statements)
+        'STATEMENTS_DIR': env.get('STATEMENTS_DIR', 'statements'),
+        'INVOICING_URL': env.get('INVOICING_URL', ''),
+        'INVOICING_API_KEY': env.get('INVOICING_API_KEY'),
+        # הקלטות של ההודעות הקבועות (python manage.py prompts) ומטמון הרינדורים הדינמיים
+        'PROMPT_AUDIO_DIR': env.get('PROMPT_AUDIO_DIR', 'prompt_audio'),
+        'RESPONSE_CACHE_SIZE': int(env.get('RESPONSE_CACHE_SIZE', 1024)),
+        'SESSION_BACKEND': env.get('SESSION_BACKEND', 'sqlite'),
+        # ניקוי מצב שיחות שפג תוקפן (וסימון סיום השיחה ב-calls) - שניות בין ניקויים
+        'SESSION_PURGE_INTERVAL': float(env.get('SESSION_PURGE_INTERVAL', 60)),
+        'CALL_LOG_BATCH': int(env.get('CALL_LOG_BATCH', 200)),
+        'CALL_LOG_INTERVAL': float(env.get('CALL_LOG_INTERVAL', 1.0)),
+    }
@@ -0,0 +1,128 @@
+# ============================================================================
+# connection_pool.py - מאגר חיבורים קבועים ל-SQLite
+# ============================================================================
+
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+# הגדרות שמופעלות פעם אחת בפתיחת כל חיבור
+DEFAULT_PRAGMAS: Dict[str, object] = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -8000,  # ~8MB לכל חיבור
+    'temp_store': 'MEMORY',
+}
+
+
+class ConnectionPool:
+    """מאגר חיבורים לכל תהליך (worker) - החיבורים נפתחים פעם אחת ומשמשים שוב
+
+    חיבור נלקח מהמאגר באופן בלעדי לכל בקשה ומוחזר בסיומה, כך שהמאגר מתאים
+    גם לשרת מבוסס threads וגם ל-worker יחיד. אחרי fork החיבורים שעברו בירושה
+    נזרקים ונפתחים מחדש בתהליך הבן.
+    """
+
+    def __init__(self, db_path: str, max_idle: int = 8, cached_statements: int = 256,
+                 health_check_interval: float = 30.0, pragmas: Optional[Dict[str, object]] = None,
+                 factory: type = sqlite3.Connection,
+                 on_open: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.db_path = db_path
+        self.factory = factory
+        # נקרא פעם אחת לכל חיבור חדש (רישום פונקציות, hooks וכו')
+        self.on_open = on_open
+        self.max_idle = max_idle
+        self.cached_statements = cached_statements
+        self.health_check_interval = health_check_interval
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _open(self) -> sqlite3.Connection:
+        """פתיחת חיבור חדש עם ההגדרות המכווננות"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=self.cached_statements, factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        if self.on_open is not None:
+            self.on_open(conn)
+        return conn
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        """בדיקת תקינות חיבור שעמד במאגר זמן רב"""
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _reset_after_fork(self):
+        """זריקת חיבורים שעברו בירושה מתהליך האב"""
+        # לא סוגרים - החיבור שייך לתהליך האב
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def acquire(self) -> sqlite3.Connection:
+        """לקיחת חיבור מהמאגר (או פתיחת חיבור חדש)"""
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+            if now - last_used < self.health_check_interval or self._is_healthy(conn):
+                return conn
+            self._close_quietly(conn)
+        return self._open()
+
+    def release(self, conn: sqlite3.Connection):
+        """החזרת חיבור למאגר"""
+        if self._pid != os.getpid():
+            return
+        try:
+            if conn.in_transaction:
+                # טרנזקציה שלא הסתיימה (חריגה באמצע) - לא משאירים נעילות פתוחות
+                conn.rollback()
+        except sqlite3.Error:
+            self._close_quietly(conn)
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((conn, time.monotonic()))
+                return
+        self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self):
+        """חיבור מהמאגר עם context manager"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """סגירת כל החיבורים הפנויים"""
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,164 @@
+# ============================================================================
+# contact_transfer.py - ייבוא וייצוא אנשי קשר בכמויות (CSV / JSONL)
+# ============================================================================
+
+import csv
+import json
+from typing import Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from database_service import DatabaseService
+from validation_service import (ValidationService, VALID, ID_MESSAGES, NAME_MESSAGES,
+                                EMAIL_MESSAGES)
+
+CONTACT_FIELDS = ('name', 'tz', 'email', 'phone_number', 'company_name', 'address', 'notes')
+
+
+class ImportReport:
+    """סיכום ייבוא - כמה נוספו, וכל שורה שנדחתה עם סיבת הדחייה"""
+
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.errors: List[Tuple[int, str]] = []
+
+    def add_error(self, line: int, message: str):
+        self.errors.append((line, message))
+
+    def write_errors(self, stream: TextIO):
+        """דוח שגיאות לכל שורה בפורמט CSV"""
+        writer = csv.writer(stream)
+        writer.writerow(['line', 'error'])
+        writer.writerows(self.errors)
+
+    def to_dict(self) -> Dict:
+        return {
+            'processed': self.processed,
+            'imported': self.imported,
+            'failed': len(self.errors),
+            'errors': [{'line': line, 'error': message} for line, message in self.errors],
+        }
+
+
+def read_rows(stream: TextIO, fmt: str) -> Iterator[Tuple[int, Dict]]:
+    """קריאה זורמת של שורות (מספר שורה, מילון) מקובץ CSV או JSONL"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_no, None
+                continue
+            yield line_no, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Unknown contacts format: {fmt}")
+
+
+def _strip_fields(row: Dict) -> Dict:
+    contact = {}
+    for field in CONTACT_FIELDS:
+        value = row.get(field)
+        value = str(value).strip() if value is not None else ''
+        contact[field] = value or None
+    return contact
+
+
+def clean_contact_rows(rows: List[Tuple[int, Optional[Dict]]]) -> Tuple[List[Dict], List[Tuple[int, str]]]:
+    """ניקוי ובדיקת קבוצת שורות (מספר שורה, מילון) - כל עמודה נבדקת בקריאה אחת
+
+    מחזיר את אנשי הקשר התקינים ורשימת (מספר שורה, הודעת שגיאה) לשאר.
+    """
+    errors: List[Tuple[int, str]] = []
+    candidates: List[Tuple[int, Dict]] = []
+    for line, row in rows:
+        if row is None:
+            errors.append((line, "שורה לא תקינה"))
+            continue
+        contact = _strip_fields(row)
+        if not contact['name']:
+            errors.append((line, "חסר שם"))
+            continue
+        candidates.append((line, contact))
+
+    # השגיאה הראשונה לכל שורה, לפי סדר הבדיקות: שם, ת.ז, מייל
+    failed: Dict[int, str] = {}
+    checks = (
+        ('name', ValidationService.validate_names, NAME_MESSAGES),
+        ('tz', ValidationService.validate_israeli_ids, ID_MESSAGES),
+        ('email', ValidationService.validate_emails, EMAIL_MESSAGES),
+    )
+    for field, validate, messages in checks:
+        indexes = [i for i, (_, contact) in enumerate(candidates)
+                   if contact[field] and i not in failed]
+        codes = validate([candidates[i][1][field] for i in indexes])
+        for i, code in zip(indexes, codes):
+            if code != VALID:
+                failed[i] = messages[int(code)]
+
+    contacts = []
+    for i, (line, contact) in enumerate(candidates):
+        if i in failed:
+            errors.append((line, failed[i]))
+        else:
+            contacts.append(contact)
+    errors.sort()
+    return contacts, errors
+
+
+def clean_contact_row(row: Optional[Dict]) -> Tuple[Optional[Dict], str]:
+    """ניקוי ובדיקת שורה - (איש קשר, '') או (None, הודעת שגיאה)"""
+    contacts, errors = clean_contact_rows([(0, row)])
+    if errors:
+        return None, errors[0][1]
+    return contacts[0], ''
+
+
+def import_contacts(db: DatabaseService, customer_id: int, stream: TextIO, fmt: str = 'csv',
+                    chunk_size: int = 500,
+                    progress: Callable[[ImportReport], None] = None) -> ImportReport:
+    """ייבוא אנשי קשר - כל chunk נבדק בקבוצה ונכתב בטרנזקציה אחת"""
+    report = ImportReport()
+    chunk: List[Tuple[int, Optional[Dict]]] = []
+
+    def flush():
+        contacts, errors = clean_contact_rows(chunk)
+        for line, message in errors:
+            report.add_error(line, message)
+        report.imported += db.bulk_create_contacts(customer_id, contacts)
+        chunk.clear()
+        if progress is not None:
+            progress(report)
+
+    for line, row in read_rows(stream, fmt):
+        report.processed += 1
+        chunk.append((line, row))
+        if len(chunk) >= chunk_size:
+            flush()
+
+    if chunk:
+        flush()
+    return report
+
+
+def export_contacts(db: DatabaseService, customer_id: int, stream: TextIO, fmt: str = 'csv') -> int:
+    """ייצוא זורם של אנשי הקשר של לקוח - מחזיר את מספר השורות שנכתבו"""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=CONTACT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for contact in db.iter_customer_contacts(customer_id):
+            writer.writerow(contact)
+            count += 1
+    elif fmt == 'jsonl':
+        for contact in db.iter_customer_contacts(customer_id):
+            stream.write(json.dumps({field: contact[field] for field in CONTACT_FIELDS},
+                                    ensure_ascii=False) + '\n')
+            count += 1
+    else:
+        raise ValueError(f"Unknown contacts format: {fmt}")
+    return count
@@ -0,0 +1,105 @@
+# ============================================================================
+# customer_cache.py - מטמון לקוחות לפי מספר טלפון
+# ============================================================================
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ttl_cache import TTLCache
+
+# סימון ללקוח שאינו רשום (negative caching)
+_NOT_REGISTERED = object()
+
+
+class CustomerCache:
+    """מטמון LRU לשורות לקוחות לפי טלפון, כולל מטמון שלילי למתקשרים לא רשומים
+
+    כל process מחזיק מטמון משלו, ולכן כתיבה ב-worker אחר (או ב-manage.py) לא
+    מבטלת אותו ישירות. טריגרים על customers רושמים כל טלפון שהשתנה ביומן משותף
+    ב-SQLite (customer_changes), ו-sync קורא אותו לכל היותר פעם ב-check_interval
+    שניות ומסיר רק את הטלפונים האלה - שורה שהשתנתה (או הרשמה של מתקשר שנשמר
+    כלא רשום) בתהליך אחר מוגשת מהמטמון לכל היותר check_interval שניות.
+    ttl ו-negative_ttl הם רק חסם עליון נוסף.
+    """
+
+    def __init__(self, max_size: int = 50000, ttl: float = 300, negative_ttl: float = 30,
+                 check_interval: float = 1.0):
+        self.negative_ttl = negative_ttl
+        self.check_interval = check_interval
+        self._cache = TTLCache(max_size, ttl, refresh_on_get=False)
+        self._lock = threading.Lock()
+        self._generation = None
+        self._checked_at = float('-inf')
+        self.negative_hits = 0
+        self.invalidations = 0
+        self.resets = 0
+
+    def sync(self, read_changes: Callable[[Optional[int]], Tuple[int, Optional[List[str]]]]
+             ) -> Optional[int]:
+        """הסרת הטלפונים שהשתנו מאז הבדיקה הקודמת (לכל היותר פעם ב-check_interval)
+
+        read_changes(since) -> (הדור האחרון, טלפונים או None לריקון מלא).
+        מחזיר את הדור שהמטמון מסונכרן אליו - להעברה ל-put.
+        """
+        now = time.monotonic()
+        with self._lock:
+            since = self._generation
+            if now - self._checked_at < self.check_interval:
+                return since
+            self._checked_at = now
+        generation, phones = read_changes(since)
+        with self._lock:
+            if self._generation != since:
+                # sync אחר הקדים אותנו
+                return self._generation
+            if phones is None:
+                if since is not None:
+                    self.resets += 1
+                self._cache.clear()
+            else:
+                for phone_number in phones:
+                    self._cache.pop(phone_number)
+                self.invalidations += len(phones)
+            self._generation = generation
+            return generation
+
+    def get(self, phone_number: str) -> Tuple[bool, Optional[Dict]]:
+        """(נמצא במטמון, שורת הלקוח או None ללקוח לא רשום)"""
+        value = self._cache.get(phone_number)
+        if value is None:
+            return False, None
+        if value is _NOT_REGISTERED:
+            with self._lock:
+                self.negative_hits += 1
+            return True, None
+        return True, dict(value)
+
+    def put(self, phone_number: str, customer: Optional[Dict], generation: Optional[int]):
+        """שמירת שורת לקוח (None - לקוח לא רשום, עם תוקף קצר יותר)
+
+        generation - מה ש-sync החזיר לפני השליפה מהמסד. אם המטמון סונכרן מאז, ייתכן
+        שהשינוי שהשליפה פספסה כבר הוסר ממנו - השורה לא נשמרת.
+        """
+        with self._lock:
+            if generation is None or generation != self._generation:
+                return
+            if customer is None:
+                self._cache.set(phone_number, _NOT_REGISTERED, ttl=self.negative_ttl)
+            else:
+                self._cache.set(phone_number, dict(customer))
+
+    def invalidate(self, phone_number: str):
+        """הסרת הלקוח מהמטמון אחרי שינוי בתהליך הזה"""
+        self._cache.pop(phone_number)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """סטטיסטיקות פגיעה לצורך קביעת גודל המטמון"""
+        stats = self._cache.stats()
+        stats['negative_hits'] = self.negative_hits
+        stats['invalidations'] = self.invalidations
+        stats['resets'] = self.resets
+        return stats
@@ -4,29 +4,124 @@
 # ============================================================================
 
 import sqlite3
-from typing import Optional, Dict, List
+import time
+from typing import Callable, Iterator, Optional, Dict, List, Tuple
 from contextlib import contextmanager
-import bcrypt
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import json
+from connection_pool import ConnectionPool
+from db_writer import SingleWriter
+from hashing_service import PasswordHasher
+from customer_cache import CustomerCache
+from migrations import apply_migrations
+from hebrew_text import contact_search_fields, normalize_hebrew, phonetic_key, phonetic_keys, similarity
+
+class TracedCursor(sqlite3.Cursor):
+    """cursor שמדווח את זמן הרצת כל פקודה ל-query_observer של החיבור"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._observe(sql, started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._observe(sql, started)
+
+    def _observe(self, sql: str, started: float):
+        # ה-pool מריץ PRAGMA לפני ש-_prepare_connection מחבר את ה-observer
+        observer = self.connection.query_observer
+        if observer is not None:
+            observer(sql, time.perf_counter() - started)
+
+
+class TracedConnection(sqlite3.Connection):
+    """חיבור שכל ה-cursors שלו (כולל conn.execute) מודדים זמנים"""
+
+    query_observer: Callable[[str, float], None] = None
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute של sqlite3 יוצר cursor רגיל ולא עובר דרך cursor() - מפנים ידנית
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
 
 class DatabaseService:
     """שירות גישה למסד נתונים"""
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, pooled: bool = False,
+                 hasher: Optional[PasswordHasher] = None,
+                 customer_cache: Optional[CustomerCache] = None,
+                 query_observer: Optional[Callable[[str, float], None]] = None,
+                 initialize: bool = True, single_writer: bool = False,
+                 writer_max_batch: int = 128, writer_max_delay: float = 0.0):
         self.db_path = db_path
-        self.init_database()
+        # trace hook - נקרא עם (sql, שניות) לכל פקודה שרצה
+        self.query_observer = query_observer
+        # מטמון read-through ל-get_customer_by_phone (None - ללא מטמון)
+        self.customer_cache = customer_cache
+        # ללא hasher - bcrypt רץ ישירות ב-thread הקורא
+        self.hasher = hasher or PasswordHasher(workers=0)
+        # במצב pooled החיבורים נשמרים פתוחים (WAL) ומשמשים שוב בין בקשות
+        self.pool = ConnectionPool(db_path, factory=self._connection_factory(),
+                                   on_open=self._prepare_connection) if pooled else None
+        # במצב single_writer כל הכתיבות של התהליך עוברות ב-thread אחד עם group commit
+        # (כמה כתיבות מקבילות - טרנזקציה ו-fsync אחד), והקריאות ממשיכות בחיבורים הרגילים
+        self.writer = SingleWriter(
+            ConnectionPool(db_path, max_idle=1, factory=self._connection_factory(),
+                           on_open=self._prepare_connection),
+            max_batch=writer_max_batch, max_delay=writer_max_delay) if single_writer else None
+        # initialize=False - המסד כבר הוקם (למשל ב-on_starting של gunicorn לפני ה-fork)
+        if initialize:
+            self.init_database()
 
     @contextmanager
     def get_connection(self):
         """חיבור למסד נתונים עם context manager"""
-        conn = sqlite3.connect(self.db_path)
+        if self.pool is not None:
+            with self.pool.connection() as conn:
+                yield conn
+            return
+
+        conn = sqlite3.connect(self.db_path, factory=self._connection_factory())
         conn.row_factory = sqlite3.Row
+        self._prepare_connection(conn)
         try:
             yield conn
         finally:
             conn.close()
 
+    def _execute_write(self, write: Callable[[sqlite3.Connection], object]):
+        """הרצת כתיבה write(conn) (בלי commit) והחזרת הערך שלה אחרי ה-commit"""
+        if self.writer is not None:
+            return self.writer.execute(write)
+        with self.get_connection() as conn:
+            result = write(conn)
+            conn.commit()
+            return result
+
+    def _connection_factory(self) -> type:
+        return TracedConnection if self.query_observer is not None else sqlite3.Connection
+
+    def _prepare_connection(self, conn: sqlite3.Connection):
+        """הגדרות לכל חיבור חדש"""
+        if self.query_observer is not None:
+            conn.query_observer = self.query_observer
+        # משמשות רק את מיגרציה 3 (מילוי ראשוני של contacts_fts); ה-triggers הנוכחיים
+        # קוראים את עמודות החיפוש שנכתבות עם איש הקשר
+        conn.create_function('he_normalize', 1, normalize_hebrew, deterministic=True)
+        conn.create_function('he_phonetic', 1, phonetic_keys, deterministic=True)
+
     def init_database(self):
         """אתחול טבלאות"""
         with self.get_connection() as conn:
@@ -137,36 +232,83 @@ class DatabaseService:
 
             conn.commit()
 
+            # אינדקסים ושינויי סכמה - לפי גרסה (PRAGMA user_version)
+            apply_migrations(conn)
+
     # פונקציות לקוחות
     def get_customer_by_phone(self, phone_number: str) -> Optional[Dict]:
         """קבלת לקוח לפי טלפון"""
+        if self.customer_cache is not None:
+            # הדור שהמטמון מסונכרן אליו לפני השליפה - put נזרק אם הוא התקדם בינתיים
+            generation = self.customer_cache.sync(self.get_customer_changes)
+            found, customer = self.customer_cache.get(phone_number)
+            if found:
+                return customer
+
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM customers WHERE phone_number = ?', (phone_number,))
             row = cursor.fetchone()
-            return dict(row) if row else None
+            customer = dict(row) if row else None
 
-    def verify_password(self, phone_number: str, password: str) -> bool:
-        """אימות סיסמה"""
+        if self.customer_cache is not None:
+            self.customer_cache.put(phone_number, customer, generation)
+        return customer
+
+    def get_customer_by_id(self, customer_id: int) -> Optional[Dict]:
+        """קבלת לקוח לפי מזהה (טעינה מחדש של פרטי שיחה מחוברת - בלי מטמון)"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT password FROM customers WHERE phone_number = ?', (phone_number,))
+            cursor.execute('SELECT * FROM customers WHERE id = ?', (customer_id,))
             row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def get_customer_changes(self, since: Optional[int]) -> Tuple[int, Optional[List[str]]]:
+        """(הדור האחרון, הטלפונים שהשתנו אחרי since) מיומן customer_changes (מיגרציה 9)
 
-            if not row:
-                return False
+        None במקום הרשימה - אי אפשר לדעת מה השתנה (since None, או שהיומן כבר קוצץ אחריו).
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT (SELECT MIN(generation) FROM customer_changes),
+                       (SELECT MAX(generation) FROM customer_changes)
+            ''')
+            oldest, latest = cursor.fetchone()
+            latest = latest or 0
+            if since is None or latest < since:
+                return latest, None
+            if latest == since:
+                return latest, []
+            if oldest > since + 1:
+                return latest, None
+            cursor.execute('''
+                SELECT DISTINCT phone_number FROM customer_changes
+                WHERE generation > ? AND generation <= ?
+            ''', (since, latest))
+            return latest, [row[0] for row in cursor.fetchall()]
 
-            stored_hash = row['password']
-            return bcrypt.checkpw(password.encode(), stored_hash.encode())
+    def _invalidate_customer(self, phone_number: str):
+        """יש לקרוא לזה בכל מסלול שמשנה שורת לקוח"""
+        if self.customer_cache is not None:
+            self.customer_cache.invalidate(phone_number)
+
+    def verify_password(self, phone_number: str, password: str) -> bool:
+        """אימות סיסמה"""
+        customer = self.get_customer_by_phone(phone_number)
+        if not customer:
+            return False
+
+        return self.hasher.check(password, customer['password'])
 
     def create_customer(self, phone_number: str, password: str, name: str, tz: str) -> int:
         """יצירת לקוח חדש"""
-        hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+        hashed = self.hasher.hash(password)
 
-        with self.get_connection() as conn:
+        def write(conn):
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO customers 
+                INSERT INTO customers
                 (phone_number, password, name, tz, subscription_start_date, subscription_end_date)
                 VALUES (?, ?, ?, ?, ?, ?)
             ''', (
@@ -174,30 +316,137 @@ class DatabaseService:
                 datetime.now().strftime('%Y-%m-%d'),
                 (datetime.now() + timedelta(days=365)).strftime('%Y-%m-%d')
             ))
-            conn.commit()
             return cursor.lastrowid
 
+        customer_id = self._execute_write(write)
+        self._invalidate_customer(phone_number)
+        return customer_id
+
+    @staticmethod
+    def day_number(day: date = None) -> int:
+        """תאריך כמספר YYYYMMDD (הפורמט של subscription_end_day)"""
+        day = day or datetime.now().date()
+        return day.year * 10000 + day.month * 100 + day.day
+
     def is_subscription_active(self, customer: Dict) -> bool:
-        """בדיקת תוקף מנוי"""
-        if not customer or not customer.get('subscription_end_date'):
+        """בדיקת תוקף מנוי - הדגל שה-sweep מתחזק, ותאריך הסיום כמספר (מנוי שפג מאז ה-sweep האחרון)"""
+        if (not customer or not customer.get('subscription_active')
+                or not customer.get('subscription_end_day')):
             return False
-        end_date = datetime.strptime(customer['subscription_end_date'], '%Y-%m-%d').date()
-        return end_date >= datetime.now().date()
+        return customer['subscription_end_day'] >= self.day_number()
+
+    def expire_subscriptions(self, today: int = None, batch_size: int = 500) -> int:
+        """סימון מנויים שפגו (subscription_active = 0) ותזכורת 'expired' לכל לקוח - כל batch
+        בטרנזקציה קצרה. חשבונות סגורים (is_active = 0) לא נכללים"""
+        today = today or self.day_number()
+        expired = 0
+        while True:
+            def write(conn):
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE customers SET subscription_active = 0
+                    WHERE id IN (SELECT id FROM customers
+                                 WHERE subscription_active = 1 AND subscription_end_day < ?
+                                   AND is_active = 1
+                                 LIMIT ?)
+                    RETURNING id, phone_number, subscription_end_day
+                ''', (today, batch_size))
+                rows = [dict(row) for row in cursor.fetchall()]
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO subscription_reminders (customer_id, end_day, kind)
+                    VALUES (?, ?, 'expired')
+                ''', [(row['id'], row['subscription_end_day']) for row in rows])
+                return rows
+
+            rows = self._execute_write(write)
+            for row in rows:
+                self._invalidate_customer(row['phone_number'])
+            expired += len(rows)
+            if len(rows) < batch_size:
+                return expired
+
+    def queue_renewal_reminders(self, today: int, until: int, batch_size: int = 500) -> int:
+        """תזכורת 'expiring' ללקוחות פעילים שהמנוי שלהם מסתיים בין today ל-until (כולל)"""
+        queued = 0
+        while True:
+            def write(conn):
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO subscription_reminders (customer_id, end_day, kind)
+                    SELECT cu.id, cu.subscription_end_day, 'expiring'
+                    FROM customers cu
+                    WHERE cu.subscription_active = 1 AND cu.subscription_end_day BETWEEN ? AND ?
+                      AND cu.is_active = 1
+                      AND NOT EXISTS (SELECT 1 FROM subscription_reminders sr
+                                      WHERE sr.customer_id = cu.id
+                                        AND sr.end_day = cu.subscription_end_day
+                                        AND sr.kind = 'expiring')
+                    LIMIT ?
+                ''', (today, until, batch_size))
+                return cursor.rowcount
+
+            count = self._execute_write(write)
+            queued += count
+            if count < batch_size:
+                return queued
+
+    def get_pending_reminders(self, limit: int = 100) -> List[Dict]:
+        """תזכורות שטרם נשלחו, עם פרטי הלקוח"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT sr.customer_id, sr.end_day, sr.kind, sr.created_at,
+                       cu.name, cu.phone_number, cu.subscription_end_date
+                FROM subscription_reminders sr
+                JOIN customers cu ON cu.id = sr.customer_id
+                WHERE sr.sent_at IS NULL
+                ORDER BY sr.created_at
+                LIMIT ?
+            ''', (limit,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def mark_reminders_sent(self, reminders: List[Tuple[int, int, str]]) -> int:
+        """סימון תזכורות (customer_id, end_day, kind) כנשלחו"""
+        def write(conn):
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE subscription_reminders SET sent_at = CURRENT_TIMESTAMP
+                WHERE customer_id = ? AND end_day = ? AND kind = ?
+            ''', reminders)
+            return cursor.rowcount
+        return self._execute_write(write)
 
     # פונקציות אנשי קשר
     def create_contact(self, customer_id: int, name: str, tz: str = None,
                       email: str = None, phone_number: str = None,
                       company_name: str = None, address: str = None, notes: str = None) -> int:
         """יצירת איש קשר חדש"""
-        with self.get_connection() as conn:
+        def write(conn):
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO contacts 
-                (customer_id, name, tz, email, phone_number, company_name, address, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (customer_id, name, tz, email, phone_number, company_name, address, notes))
-            conn.commit()
+                (customer_id, name, tz, email, phone_number, company_name, address, notes,
+                 search_name, search_company, search_phonetic)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (customer_id, name, tz, email, phone_number, company_name, address, notes,
+                  *contact_search_fields(name, company_name)))
             return cursor.lastrowid
+        return self._execute_write(write)
+
+    def bulk_create_contacts(self, customer_id: int, contacts: List[Dict]) -> int:
+        """יצירת אנשי קשר רבים בטרנזקציה אחת (executemany)"""
+        def write(conn):
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO contacts
+                (customer_id, name, tz, email, phone_number, company_name, address, notes,
+                 search_name, search_company, search_phonetic)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(customer_id, c['name'], c.get('tz'), c.get('email'), c.get('phone_number'),
+                   c.get('company_name'), c.get('address'), c.get('notes'),
+                   *contact_search_fields(c['name'], c.get('company_name'))) for c in contacts])
+            return cursor.rowcount
+        return self._execute_write(write)
 
     def get_customer_contacts(self, customer_id: int) -> List[Dict]:
         """שליפת כל אנשי הקשר של לקוח מסוים"""
@@ -219,14 +468,52 @@ class DatabaseService:
             row = cursor.fetchone()
             return dict(row) if row else None
 
-    def get_contact_by_name(self, name: str) -> Optional[Dict]:
-        """קבלת איש קשר לפי ID"""
+    def get_contact_by_name(self, name: str, customer_id: int = None) -> Optional[Dict]:
+        """קבלת איש קשר לפי שם מדויק (של לקוח מסוים אם customer_id ניתן)"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM contacts WHERE name = ? AND is_active = 1', (name,))
+            if customer_id is None:
+                cursor.execute('SELECT * FROM contacts WHERE name = ? AND is_active = 1', (name,))
+            else:
+                cursor.execute('''
+                    SELECT * FROM contacts WHERE customer_id = ? AND name = ? AND is_active = 1
+                ''', (customer_id, name))
             row = cursor.fetchone()
             return dict(row) if row else None
 
+    def find_contacts_fuzzy(self, customer_id: int, spoken_name: str, limit: int = 5,
+                            min_score: float = 0.6) -> List[Dict]:
+        """חיפוש סלחני לשם שהגיע מזיהוי דיבור - מחזיר התאמות מדורגות עם 'score'
+
+        מועמדים נשלפים מאינדקס ה-FTS לפי תחילית של כל מילה או של המפתח הפונטי
+        שלה, ומדורגים לפי דמיון אורתוגרפי ופונטי לשם השמור.
+        """
+        words = normalize_hebrew(spoken_name).split()
+        if not words:
+            return []
+
+        terms = [f'{{name company_name}} : "{word}"*' for word in words]
+        terms += [f'phonetic : "{phonetic_key(word)[:2]}"*' for word in words]
+        query = f'owner : "c{int(customer_id)}" AND ({" OR ".join(terms)})'
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT c.* FROM contacts_fts f
+                JOIN contacts c ON c.id = f.rowid
+                WHERE contacts_fts MATCH ? AND c.is_active = 1
+                ORDER BY f.rank
+                LIMIT 200
+            ''', (query,))
+            candidates = [dict(row) for row in cursor.fetchall()]
+
+        for contact in candidates:
+            contact['score'] = max(similarity(spoken_name, contact['name']),
+                                   similarity(spoken_name, contact['company_name'] or ''))
+        matches = [c for c in candidates if c['score'] >= min_score]
+        matches.sort(key=lambda c: c['score'], reverse=True)
+        return matches[:limit]
+
     def get_receipts_by_contact(self, contact_id: int) -> List[Dict]:
         """חיפוש קבלות לפי איש קשר מסוים"""
         with self.get_connection() as conn:
@@ -244,14 +531,14 @@ class DatabaseService:
     # פונקציות ילדים
     def create_child(self, customer_id: int, name: str, birth_year: int) -> int:
         """יצירת רשומת ילד חדשה"""
-        with self.get_connection() as conn:
+        def write(conn):
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO children (customer_id, name, birth_year)
                 VALUES (?, ?, ?)
             ''', (customer_id, name, birth_year))
-            conn.commit()
             return cursor.lastrowid
+        return self._execute_write(write)
 
     def get_customer_children(self, customer_id: int) -> List[Dict]:
         """שליפת כל הילדים של לקוח מסוים"""
@@ -292,22 +579,31 @@ class DatabaseService:
 
         updates['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-        set_clause = ', '.join([f"{k} = ?" for k in updates.keys()])
-        values = list(updates.values()) + [contact_id]
-
-        with self.get_connection() as conn:
+        def write(conn):
             cursor = conn.cursor()
-            cursor.execute(f'UPDATE contacts SET {set_clause} WHERE id = ?', values)
-            conn.commit()
+            fields = dict(updates)
+            if 'name' in fields or 'company_name' in fields:
+                # עמודות החיפוש תלויות בשני השדות - השדה שלא השתנה נקרא מהשורה
+                cursor.execute('SELECT name, company_name FROM contacts WHERE id = ?', (contact_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    return False
+                fields['search_name'], fields['search_company'], fields['search_phonetic'] = \
+                    contact_search_fields(fields.get('name', row['name']),
+                                          fields.get('company_name', row['company_name']))
+            set_clause = ', '.join([f"{k} = ?" for k in fields.keys()])
+            cursor.execute(f'UPDATE contacts SET {set_clause} WHERE id = ?',
+                           list(fields.values()) + [contact_id])
             return cursor.rowcount > 0
+        return self._execute_write(write)
 
     def deactivate_contact(self, contact_id: int) -> bool:
         """השבתת איש קשר (מחיקה רכה)"""
-        with self.get_connection() as conn:
+        def write(conn):
             cursor = conn.cursor()
             cursor.execute('UPDATE contacts SET is_active = 0 WHERE id = ?', (contact_id,))
-            conn.commit()
             return cursor.rowcount > 0
+        return self._execute_write(write)
 
     def update_child(self, child_id: int, name: str = None, birth_year: int = None) -> bool:
         """עדכון פרטי ילד"""
@@ -323,19 +619,19 @@ class DatabaseService:
         set_clause = ', '.join([f"{k} = ?" for k in updates.keys()])
         values = list(updates.values()) + [child_id]
 
-        with self.get_connection() as conn:
+        def write(conn):
             cursor = conn.cursor()
             cursor.execute(f'UPDATE children SET {set_clause} WHERE id = ?', values)
-            conn.commit()
             return cursor.rowcount > 0
+        return self._execute_write(write)
 
     def deactivate_child(self, child_id: int) -> bool:
         """השבתת ילד (מחיקה רכה)"""
-        with self.get_connection() as conn:
+        def write(conn):
             cursor = conn.cursor()
             cursor.execute('UPDATE children SET is_active = 0 WHERE id = ?', (child_id,))
-            conn.commit()
             return cursor.rowcount > 0
+        return self._execute_write(write)
 
 
 # הוספת הפונקציות החסרות ל-DatabaseService
@@ -348,28 +644,33 @@ class DatabaseService:
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT c.*, 
-                       COUNT(r.id) as receipts_count,
-                       COALESCE(SUM(r.amount), 0) as total_amount
+                SELECT c.*,
+                       COALESCE(s.receipts_count, 0) as receipts_count,
+                       COALESCE(s.total_amount, 0) as total_amount
                 FROM contacts c
-                LEFT JOIN receipts r ON c.id = r.contact_id
-                WHERE c.customer_id = ? AND c.is_active = 1 
-                GROUP BY c.id
+                LEFT JOIN contact_receipt_summary s ON s.contact_id = c.id
+                WHERE c.customer_id = ? AND c.is_active = 1
                 ORDER BY c.name
             ''', (customer_id,))
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
 
     def search_contacts_by_name(self, customer_id: int, search_term: str) -> List[Dict]:
-        """חיפוש אנשי קשר לפי שם"""
+        """חיפוש אנשי קשר לפי שם (תחילית של כל מילה בשם או בשם החברה)"""
+        words = normalize_hebrew(search_term).split()
+        if not words:
+            return self.get_customer_contacts(customer_id)
+
+        query = f'owner : "c{int(customer_id)}" AND ' + ' AND '.join(
+            f'{{name company_name}} : "{word}"*' for word in words)
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT * FROM contacts 
-                WHERE customer_id = ? AND is_active = 1 
-                AND (name LIKE ? OR company_name LIKE ?)
-                ORDER BY name
-            ''', (customer_id, f'%{search_term}%', f'%{search_term}%'))
+                SELECT c.* FROM contacts_fts f
+                JOIN contacts c ON c.id = f.rowid
+                WHERE contacts_fts MATCH ? AND c.is_active = 1
+                ORDER BY c.name
+            ''', (query,))
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
 
@@ -379,28 +680,208 @@ class DatabaseService:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT c.*,
-                       COUNT(r.id) as total_receipts,
-                       COALESCE(SUM(r.amount), 0) as total_amount,
-                       MAX(r.created_at) as last_receipt_date
+                       COALESCE(s.receipts_count, 0) as total_receipts,
+                       COALESCE(s.total_amount, 0) as total_amount,
+                       s.last_receipt_at as last_receipt_date
                 FROM contacts c
-                LEFT JOIN receipts r ON c.id = r.contact_id
+                LEFT JOIN contact_receipt_summary s ON s.contact_id = c.id
                 WHERE c.id = ? AND c.is_active = 1
-                GROUP BY c.id
             ''', (contact_id,))
             row = cursor.fetchone()
             return dict(row) if row else None
 
-    def create_receipt_for_contact(self, customer_id: int, contact_id: int, amount: int,
-                                 description: str = None, call_id: str = None) -> int:
-        """יצירת קבלה חדשה לאיש קשר"""
+    def get_top_contacts(self, customer_id: int, limit: int = 20) -> List[Dict]:
+        """אנשי הקשר שהלקוח מוציא להם הכי הרבה קבלות (לפי טבלת הסיכום)"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO receipts (customer_id, contact_id, call_id, amount, description)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (customer_id, contact_id, call_id, amount, description))
-            conn.commit()
+                SELECT c.id, c.name, c.company_name,
+                       COALESCE(s.receipts_count, 0) as receipts_count,
+                       s.last_receipt_at
+                FROM contacts c
+                LEFT JOIN contact_receipt_summary s ON s.contact_id = c.id
+                WHERE c.customer_id = ? AND c.is_active = 1
+                ORDER BY receipts_count DESC, s.last_receipt_at DESC, c.id
+                LIMIT ?
+            ''', (customer_id, limit))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def create_receipt_for_contact(self, customer_id: int, contact_id: int, amount: int,
+                                 description: str = None, call_id: str = None,
+                                 receipt_number: int = None) -> int:
+        """יצירת קבלה חדשה לאיש קשר
+
+        בלי receipt_number המספר הבא של הלקוח נלקח באותה טרנזקציה (אין פערים).
+        """
+        def write(conn):
+            cursor = conn.cursor()
+            number = receipt_number
+            if number is None:
+                number = self._take_receipt_numbers(cursor, customer_id, 1)[0]
+            cursor.execute('''
+                INSERT INTO receipts
+                    (customer_id, contact_id, call_id, amount, description, receipt_number)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (customer_id, contact_id, call_id, amount, description, number))
             return cursor.lastrowid
+        return self._execute_write(write)
+
+    # מספור קבלות לכל לקוח
+    @staticmethod
+    def _take_receipt_numbers(cursor: sqlite3.Cursor, customer_id: int,
+                              count: int) -> Tuple[int, int]:
+        """(ראשון, אחרון) - קודם הטווח הנמוך ביותר ששוחרר, אחרת קידום אטומי של המונה"""
+        cursor.execute('''
+            DELETE FROM receipt_number_ranges
+            WHERE customer_id = ? AND first_number = (
+                SELECT MIN(first_number) FROM receipt_number_ranges WHERE customer_id = ?)
+            RETURNING first_number, last_number
+        ''', (customer_id, customer_id))
+        row = cursor.fetchone()
+        if row is not None:
+            first, last = row[0], row[1]
+            if last - first + 1 > count:
+                cursor.execute('''
+                    INSERT INTO receipt_number_ranges (customer_id, first_number, last_number)
+                    VALUES (?, ?, ?)
+                ''', (customer_id, first + count, last))
+                last = first + count - 1
+            return first, last
+
+        cursor.execute('''
+            INSERT INTO receipt_sequences (customer_id, next_number) VALUES (?, ? + 1)
+            ON CONFLICT (customer_id) DO UPDATE SET next_number = next_number + excluded.next_number - 1
+            RETURNING next_number
+        ''', (customer_id, count))
+        next_number = cursor.fetchone()[0]
+        return next_number - count, next_number - 1
+
+    def reserve_receipt_numbers(self, customer_id: int, count: int) -> Tuple[int, int]:
+        """שמירת בלוק מספרים ל-worker - (ראשון, אחרון); ייתכן בלוק קטן מ-count (טווח ששוחרר)"""
+        def write(conn):
+            return self._take_receipt_numbers(conn.cursor(), customer_id, count)
+        return self._execute_write(write)
+
+    def release_receipt_numbers(self, ranges: List[Tuple[int, int, int]]) -> int:
+        """החזרת מספרים שלא נוצלו (customer_id, ראשון, אחרון) - יוקצו שוב לפני מספרים חדשים"""
+        def write(conn):
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT OR IGNORE INTO receipt_number_ranges (customer_id, first_number, last_number)
+                VALUES (?, ?, ?)
+            ''', ranges)
+            return cursor.rowcount
+        return self._execute_write(write)
+
+    def find_receipt_number_gaps(self) -> List[Dict]:
+        """מספרים שהוקצו ולא שימשו לקבלה ולא שוחררו (worker שקרס, או בלוק של worker פעיל)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                WITH taken AS (
+                    SELECT customer_id, receipt_number as first_number, receipt_number as last_number
+                    FROM receipts WHERE receipt_number IS NOT NULL
+                    UNION ALL
+                    SELECT customer_id, first_number, last_number FROM receipt_number_ranges
+                ),
+                ordered AS (
+                    SELECT customer_id, first_number,
+                           MAX(last_number) OVER (
+                               PARTITION BY customer_id ORDER BY first_number
+                               ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) as prev_last
+                    FROM taken
+                )
+                SELECT customer_id, prev_last + 1 as first_number, first_number - 1 as last_number
+                FROM ordered
+                WHERE first_number > prev_last + 1
+                UNION ALL
+                SELECT s.customer_id, COALESCE(MAX(t.last_number), s.first_number - 1) + 1,
+                       s.next_number - 1
+                FROM receipt_sequences s
+                LEFT JOIN taken t ON t.customer_id = s.customer_id AND t.first_number >= s.first_number
+                GROUP BY s.customer_id
+                HAVING COALESCE(MAX(t.last_number), s.first_number - 1) + 1 <= s.next_number - 1
+                ORDER BY 1, 2
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_last_receipt(self, customer_id: int) -> Optional[Dict]:
+        """הקבלה האחרונה (שלא בוטלה) של לקוח, עם שם איש הקשר"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT r.*, c.name as contact_name
+                FROM receipts r
+                LEFT JOIN contacts c ON r.contact_id = c.id
+                WHERE r.customer_id = ? AND r.status != 'void'
+                ORDER BY r.created_at DESC, r.id DESC
+                LIMIT 1
+            ''', (customer_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def void_receipt(self, customer_id: int, receipt_id: int) -> bool:
+        """ביטול מקומי של קבלה שלא הופקה (pending / failed)
+
+        קבלה שבהפקה או שכבר הופקה במערכת החשבוניות לא מבוטלת כאן - ביטול שלה
+        מחייב מסמך ביטול שם, אחרת הספרים והמסמך שהופק לא תואמים.
+        """
+        def write(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE receipts SET status = 'void', claimed_at = NULL
+                WHERE id = ? AND customer_id = ? AND status IN ('pending', 'failed')
+            ''', (receipt_id, customer_id))
+            return cursor.rowcount > 0
+        return self._execute_write(write)
+
+    def verify_receipt_summaries(self, rebuild: bool = False) -> List[Dict]:
+        """השוואת טבלת הסיכום לחישוב מלא מ-receipts - מחזיר את השורות שסטו
+
+        עם rebuild=True הטבלה נבנית מחדש (בטרנזקציה אחת) אם נמצאה סטייה.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                WITH actual AS (
+                    SELECT contact_id, COUNT(*) as receipts_count,
+                           SUM(amount) as total_amount, MAX(created_at) as last_receipt_at
+                    FROM receipts
+                    WHERE contact_id IS NOT NULL AND status IS NOT 'void'
+                    GROUP BY contact_id
+                ),
+                keys AS (
+                    SELECT contact_id FROM actual
+                    UNION SELECT contact_id FROM contact_receipt_summary
+                )
+                SELECT k.contact_id,
+                       s.receipts_count as summary_count, COALESCE(a.receipts_count, 0) as actual_count,
+                       s.total_amount as summary_amount, COALESCE(a.total_amount, 0) as actual_amount,
+                       s.last_receipt_at as summary_last, a.last_receipt_at as actual_last
+                FROM keys k
+                LEFT JOIN actual a ON a.contact_id = k.contact_id
+                LEFT JOIN contact_receipt_summary s ON s.contact_id = k.contact_id
+                WHERE COALESCE(s.receipts_count, 0) != COALESCE(a.receipts_count, 0)
+                   OR COALESCE(s.total_amount, 0) != COALESCE(a.total_amount, 0)
+                   OR s.last_receipt_at IS NOT a.last_receipt_at
+                ORDER BY k.contact_id
+            ''')
+            drift = [dict(row) for row in cursor.fetchall()]
+
+        if drift and rebuild:
+            def write(conn):
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM contact_receipt_summary')
+                cursor.execute('''
+                    INSERT INTO contact_receipt_summary
+                        (contact_id, receipts_count, total_amount, last_receipt_at)
+                    SELECT contact_id, COUNT(*), SUM(amount), MAX(created_at)
+                    FROM receipts
+                    WHERE contact_id IS NOT NULL AND status IS NOT 'void'
+                    GROUP BY contact_id
+                ''')
+            self._execute_write(write)
+        return drift
 
     def get_receipts_by_contact_detailed(self, contact_id: int, limit: int = 10) -> List[Dict]:
         """החזרת קבלות מפורטות של איש קשר מסוים עם פרטי הקשר"""
@@ -425,6 +906,354 @@ class DatabaseService:
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
 
+    # דפדוף לפי keyset ומעבר עצל - עלות קבועה לכל עמוד, בלי קשר לגודל ההיסטוריה
+    # cursor הוא רשימה [מפתח מיון, id] של השורה האחרונה בעמוד הקודם (ניתן לשמירה ב-session)
+    def _fetch_page(self, sql: str, params: tuple, limit: int,
+                    key: Tuple[str, str]) -> Tuple[List[Dict], Optional[List]]:
+        """הרצת שאילתת עמוד עם limit + 1 שורות כדי לדעת אם יש עמוד נוסף"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params + (limit + 1,))
+            rows = [dict(row) for row in cursor.fetchall()]
+
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, [rows[-1][key[0]], rows[-1][key[1]]]
+
+    @staticmethod
+    def _iter_pages(fetch_page: Callable, batch_size: int) -> Iterator[Dict]:
+        after = None
+        while True:
+            rows, after = fetch_page(batch_size, after)
+            yield from rows
+            if after is None:
+                return
+
+    def get_customer_contacts_page(self, customer_id: int, limit: int = 5,
+                                   after: Optional[List] = None) -> Tuple[List[Dict], Optional[List]]:
+        """עמוד של אנשי קשר לפי (name, id) - מחזיר (שורות, cursor לעמוד הבא או None)"""
+        after_clause = 'AND (name, id) > (?, ?)' if after else ''
+        return self._fetch_page(f'''
+            SELECT * FROM contacts
+            WHERE customer_id = ? AND is_active = 1 {after_clause}
+            ORDER BY name, id
+            LIMIT ?
+        ''', (customer_id, *(after or ())), limit, ('name', 'id'))
+
+    def get_customer_children_page(self, customer_id: int, limit: int = 5,
+                                   after: Optional[List] = None) -> Tuple[List[Dict], Optional[List]]:
+        """עמוד של ילדים לפי (birth_year, id) בסדר יורד"""
+        after_clause = 'AND (birth_year, id) < (?, ?)' if after else ''
+        return self._fetch_page(f'''
+            SELECT * FROM children
+            WHERE customer_id = ? AND is_active = 1 {after_clause}
+            ORDER BY birth_year DESC, id DESC
+            LIMIT ?
+        ''', (customer_id, *(after or ())), limit, ('birth_year', 'id'))
+
+    def get_receipts_by_contact_page(self, contact_id: int, limit: int = 5,
+                                     after: Optional[List] = None) -> Tuple[List[Dict], Optional[List]]:
+        """עמוד של קבלות לאיש קשר לפי (created_at, id) מהחדשה לישנה"""
+        after_clause = 'AND (r.created_at, r.id) < (?, ?)' if after else ''
+        return self._fetch_page(f'''
+            SELECT r.*, c.name as contact_name, c.company_name
+            FROM receipts r
+            JOIN contacts c ON r.contact_id = c.id
+            WHERE r.contact_id = ? {after_clause}
+            ORDER BY r.created_at DESC, r.id DESC
+            LIMIT ?
+        ''', (contact_id, *(after or ())), limit, ('created_at', 'id'))
+
+    def get_customer_contacts_with_receipts_count_page(
+            self, customer_id: int, limit: int = 5,
+            after: Optional[List] = None) -> Tuple[List[Dict], Optional[List]]:
+        """עמוד של אנשי קשר עם מספר וסכום הקבלות (מטבלת הסיכום)"""
+        after_clause = 'AND (c.name, c.id) > (?, ?)' if after else ''
+        return self._fetch_page(f'''
+            SELECT c.*,
+                   COALESCE(s.receipts_count, 0) as receipts_count,
+                   COALESCE(s.total_amount, 0) as total_amount
+            FROM contacts c
+            LEFT JOIN contact_receipt_summary s ON s.contact_id = c.id
+            WHERE c.customer_id = ? AND c.is_active = 1 {after_clause}
+            ORDER BY c.name, c.id
+            LIMIT ?
+        ''', (customer_id, *(after or ())), limit, ('name', 'id'))
+
+    def iter_customer_contacts(self, customer_id: int, batch_size: int = 500) -> Iterator[Dict]:
+        """מעבר עצל על אנשי הקשר של לקוח בזיכרון קבוע (ללא טרנזקציית קריאה ארוכה)"""
+        return self._iter_pages(
+            lambda limit, after: self.get_customer_contacts_page(customer_id, limit, after),
+            batch_size)
+
+    def iter_customer_children(self, customer_id: int, batch_size: int = 500) -> Iterator[Dict]:
+        """מעבר עצל על הילדים של לקוח"""
+        return self._iter_pages(
+            lambda limit, after: self.get_customer_children_page(customer_id, limit, after),
+            batch_size)
+
+    def iter_receipts_by_contact(self, contact_id: int, batch_size: int = 500) -> Iterator[Dict]:
+        """מעבר עצל על הקבלות של איש קשר"""
+        return self._iter_pages(
+            lambda limit, after: self.get_receipts_by_contact_page(contact_id, limit, after),
+            batch_size)
+
+    def iter_customer_contacts_with_receipts_count(self, customer_id: int,
+                                                   batch_size: int = 500) -> Iterator[Dict]:
+        """מעבר עצל על אנשי הקשר של לקוח עם סיכום הקבלות"""
+        return self._iter_pages(
+            lambda limit, after: self.get_customer_contacts_with_receipts_count_page(
+                customer_id, limit, after),
+            batch_size)
+
+    # תור הפקת קבלות
+    def claim_pending_receipts(self, limit: int, lease_seconds: int = 600) -> List[Dict]:
+        """סימון קבלות ממתינות כ-processing והחזרתן עם פרטי איש הקשר והלקוח
+
+        קבלה שנתקעה ב-processing יותר מ-lease_seconds (worker שקרס) נלקחת שוב.
+        """
+        def write(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE receipts
+                SET status = 'processing', claimed_at = CURRENT_TIMESTAMP
+                WHERE id IN (
+                    SELECT id FROM receipts
+                    WHERE status = 'pending'
+                      AND (next_attempt_at IS NULL OR next_attempt_at <= CURRENT_TIMESTAMP)
+                    UNION ALL
+                    SELECT id FROM receipts
+                    WHERE status = 'processing' AND claimed_at <= datetime('now', ?)
+                    ORDER BY id
+                    LIMIT ?
+                )
+                RETURNING id
+            ''', (f'-{int(lease_seconds)} seconds', limit))
+            return [row['id'] for row in cursor.fetchall()]
+
+        ids = self._execute_write(write)
+        if not ids:
+            return []
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ', '.join('?' * len(ids))
+            cursor.execute(f'''
+                SELECT r.*,
+                       c.name as contact_name, c.tz as contact_tz, c.email as contact_email,
+                       c.company_name, c.address as contact_address,
+                       cu.name as customer_name, cu.tz as customer_tz,
+                       cu.phone_number as customer_phone
+                FROM receipts r
+                LEFT JOIN contacts c ON r.contact_id = c.id
+                LEFT JOIN customers cu ON r.customer_id = cu.id
+                WHERE r.id IN ({placeholders})
+                ORDER BY r.id
+            ''', ids)
+            return [dict(row) for row in cursor.fetchall()]
+
+    def mark_receipts_issued(self, results: List[Dict]) -> int:
+        """שמירת תוצאות הפקה מוצלחות (receipt_id, doc_id, doc_num, response)
+
+        רק קבלה שעדיין ב-processing - המסמך הופק גם אם הקבלה נלקחה שוב אחרי שה-lease פג.
+        """
+        def write(conn):
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE receipts
+                SET status = 'issued', icount_doc_id = ?, icount_doc_num = ?,
+                    icount_response = ?, attempts = attempts + 1,
+                    last_error = NULL, claimed_at = NULL
+                WHERE id = ? AND status = 'processing'
+            ''', [(r.get('doc_id'), r.get('doc_num'),
+                   json.dumps(r.get('response'), ensure_ascii=False), r['receipt_id'])
+                  for r in results])
+            return cursor.rowcount
+        return self._execute_write(write)
+
+    def mark_receipts_failed(self, failures: List[Dict]) -> int:
+        """רישום כישלון הפקה (receipt_id, claimed_at, error, retry_in) - ללא retry_in הקבלה
+        נכשלת סופית. worker שה-lease שלו פג (הקבלה נלקחה שוב או טופלה) לא דורס אותה.
+        """
+        def write(conn):
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE receipts
+                SET status = CASE WHEN ? IS NULL THEN 'failed' ELSE 'pending' END,
+                    next_attempt_at = datetime('now', ?),
+                    attempts = attempts + 1, last_error = ?, claimed_at = NULL
+                WHERE id = ? AND status = 'processing' AND claimed_at = ?
+            ''', [(f.get('retry_in'), f"+{int(f.get('retry_in') or 0)} seconds",
+                   f.get('error'), f['receipt_id'], f['claimed_at']) for f in failures])
+            return cursor.rowcount
+        return self._execute_write(write)
+
+    def write_call_log(self, calls: List[Dict], endings: List[Tuple[str, str]]) -> int:
+        """כתיבת batch של אירועי שיחה בטרנזקציה אחת
+
+        calls - לכל שיחה: call_id, phone, pbx_data, events (נוספים לסוף call_data), started_at
+        endings - (ended_at, call_id) לשיחות שהסתיימו
+        """
+        def write(conn):
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO calls (call_id, customer_id, phone_number, pbx_data, call_data, started_at)
+                VALUES (?, (SELECT id FROM customers WHERE phone_number = ?), ?, ?, ?, ?)
+                ON CONFLICT (call_id) DO UPDATE SET
+                    customer_id = COALESCE(calls.customer_id, excluded.customer_id),
+                    phone_number = COALESCE(excluded.phone_number, calls.phone_number),
+                    pbx_data = excluded.pbx_data,
+                    -- שרשור מערכי JSON בלי לפענח את ההיסטוריה הקיימת
+                    call_data = CASE
+                        WHEN calls.call_data IS NULL OR calls.call_data = '[]' THEN excluded.call_data
+                        ELSE substr(calls.call_data, 1, length(calls.call_data) - 1)
+                             || ',' || substr(excluded.call_data, 2)
+                    END
+            ''', [(c['call_id'], c.get('phone'), c.get('phone'),
+                   json.dumps(c.get('pbx_data'), ensure_ascii=False),
+                   json.dumps(c['events'], ensure_ascii=False), c['started_at'])
+                  for c in calls])
+            cursor.executemany('''
+                UPDATE calls SET ended_at = ? WHERE call_id = ? AND ended_at IS NULL
+            ''', endings)
+            return len(calls) + len(endings)
+        return self._execute_write(write)
+
+    # זכויות - נתוני החישוב ותוצאות שמורות (customer_rights נמחקת בטריגרים כשהנתונים משתנים)
+    _RIGHTS_INPUTS_SQL = '''
+        SELECT cu.id, cu.spouse1_workplaces, cu.spouse2_workplaces,
+               (SELECT json_group_array(json_array(ch.name, ch.birth_year))
+                FROM (SELECT name, birth_year FROM children
+                      WHERE customer_id = cu.id AND is_active = 1
+                      ORDER BY birth_year, name) ch) as children
+        FROM customers cu
+    '''
+
+    @staticmethod
+    def _rights_inputs(row: Dict) -> Dict:
+        row['children'] = [{'name': name, 'birth_year': birth_year}
+                           for name, birth_year in json.loads(row['children'])]
+        return row
+
+    def get_rights_inputs(self, customer_id: int) -> Optional[Dict]:
+        """נתוני הלקוח לחישוב זכויות - מקומות עבודה וילדים פעילים"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._RIGHTS_INPUTS_SQL + 'WHERE cu.id = ?', (customer_id,))
+            row = cursor.fetchone()
+            return self._rights_inputs(dict(row)) if row else None
+
+    def iter_rights_inputs(self, batch_size: int = 500) -> Iterator[Dict]:
+        """נתוני החישוב של כל הלקוחות הפעילים, לפי id"""
+        def fetch_page(limit, after):
+            rows, after = self._fetch_page(
+                self._RIGHTS_INPUTS_SQL + f'''
+                WHERE cu.is_active = 1 {'AND cu.id > ?' if after else ''}
+                ORDER BY cu.id
+                LIMIT ?
+            ''', tuple(after[1:]) if after else (), limit, ('id', 'id'))
+            return [self._rights_inputs(row) for row in rows], after
+
+        return self._iter_pages(fetch_page, batch_size)
+
+    def get_customer_rights(self, customer_id: int, tax_year: int) -> Optional[Dict]:
+        """תוצאת חישוב שמורה (result כ-JSON ו-rules_version)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM customer_rights WHERE customer_id = ? AND tax_year = ?
+            ''', (customer_id, tax_year))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
+    def save_customer_rights(self, rows: List[Tuple[int, int, str, str]]) -> int:
+        """שמירת תוצאות (customer_id, tax_year, rules_version, result JSON)"""
+        def write(conn):
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO customer_rights (customer_id, tax_year, rules_version, result)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (customer_id, tax_year) DO UPDATE SET
+                    rules_version = excluded.rules_version, result = excluded.result,
+                    computed_at = CURRENT_TIMESTAMP
+            ''', rows)
+            return cursor.rowcount
+        return self._execute_write(write)
+
+    # דוחות חודשיים - הקבלות של כל לקוח מקובצות לפי איש קשר בשאילתה אחת לכל עמוד לקוחות
+    _STATEMENT_INPUTS_SQL = '''
+        SELECT cu.id, cu.name, cu.phone_number, cu.compny_name,
+               ms.content_hash,
+               (SELECT json_group_array(json_array(g.contact_name, g.receipts_count,
+                                                   g.total_amount, json(g.receipts)))
+                FROM (SELECT c.name as contact_name, COUNT(*) as receipts_count,
+                             SUM(r.amount) as total_amount,
+                             json_group_array(json_array(r.receipt_number, DATE(r.created_at),
+                                                         r.amount, r.description)) as receipts
+                      FROM receipts r
+                      LEFT JOIN contacts c ON c.id = r.contact_id
+                      WHERE r.customer_id = cu.id AND r.created_at >= ? AND r.created_at < ?
+                        AND r.status IS NOT 'void'
+                      GROUP BY r.contact_id
+                      ORDER BY total_amount DESC) g) as contacts
+        FROM customers cu
+        LEFT JOIN monthly_statements ms ON ms.customer_id = cu.id AND ms.month = ?
+    '''
+
+    def iter_statement_inputs(self, month: str, batch_size: int = 200) -> Iterator[Dict]:
+        """לכל לקוח פעיל: פרטים, hash הדוח הקיים, וקבלות החודש (YYYY-MM) לפי איש קשר"""
+        start = datetime.strptime(month, '%Y-%m')
+        end = (start + timedelta(days=32)).replace(day=1)
+        bounds = (start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'), month)
+
+        def fetch_page(limit, after):
+            rows, after = self._fetch_page(
+                self._STATEMENT_INPUTS_SQL + f'''
+                WHERE cu.is_active = 1 {'AND cu.id > ?' if after else ''}
+                ORDER BY cu.id
+                LIMIT ?
+            ''', bounds + (tuple(after[1:]) if after else ()), limit, ('id', 'id'))
+            for row in rows:
+                row['contacts'] = [
+                    {'name': name, 'receipts_count': count, 'total_amount': total,
+                     'receipts': [{'number': number, 'date': date, 'amount': amount,
+                                   'description': description}
+                                  for number, date, amount, description in receipts]}
+                    for name, count, total, receipts in json.loads(row['contacts'])]
+            return rows, after
+
+        return self._iter_pages(fetch_page, batch_size)
+
+    def save_monthly_statements(self, rows: List[Tuple]) -> int:
+        """שמירת (customer_id, month, receipts_count, total_amount, contacts_count, summary,
+        file_path, content_hash)"""
+        def write(conn):
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO monthly_statements
+                    (customer_id, month, receipts_count, total_amount, contacts_count, summary,
+                     file_path, content_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (customer_id, month) DO UPDATE SET
+                    receipts_count = excluded.receipts_count, total_amount = excluded.total_amount,
+                    contacts_count = excluded.contacts_count, summary = excluded.summary,
+                    file_path = excluded.file_path, content_hash = excluded.content_hash,
+                    generated_at = CURRENT_TIMESTAMP
+            ''', rows)
+            return cursor.rowcount
+        return self._execute_write(write)
+
+    def get_monthly_statement(self, customer_id: int, month: str) -> Optional[Dict]:
+        """סיכום הדוח החודשי השמור (summary כ-JSON)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM monthly_statements WHERE customer_id = ? AND month = ?
+            ''', (customer_id, month))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+
     # פונקציה לעדכון הקובץ הקיים
     def backup_contact(self, contact_id: int) -> Optional[Dict]:
         """גיבוי נתוני איש קשר לפני עדכון"""
@@ -0,0 +1,188 @@
+# ============================================================================
+# db_writer.py - כותב יחיד ל-SQLite עם group commit
+# ============================================================================
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from connection_pool import ConnectionPool
+
+_STOP = object()
+
+
+class SingleWriter:
+    """thread אחד שמבצע את כל הכתיבות של התהליך על חיבור קבוע
+
+    כל כתיבה היא פונקציה fn(conn) שמריצה פקודות בלי commit ומחזירה ערך (למשל
+    lastrowid). הכתיבות שהצטברו בתור בזמן ה-commit הקודם נאספות ל-batch אחד:
+    טרנזקציה אחת ו-fsync אחד לכל ה-batch, כל כתיבה ב-SAVEPOINT משלה כך שכישלון
+    של אחת לא מבטל את האחרות. התוצאה (או החריגה) חוזרת לקורא דרך Future רק אחרי
+    ה-commit.
+
+    max_batch - מספר כתיבות מרבי בטרנזקציה
+    max_delay - המתנה לכתיבות נוספות אחרי הראשונה (0 - בלי המתנה, רק מה שכבר בתור)
+
+    fn שבעצמה שולחת כתיבה (למשל קוראת ל-_execute_write) רצה מה-thread של הכותב -
+    הכתיבה הפנימית מבוצעת מיד באותה טרנזקציה (SAVEPOINT מקונן) במקום לחכות בתור
+    ל-thread שממתין לה.
+    """
+
+    def __init__(self, pool: ConnectionPool, max_batch: int = 128, max_delay: float = 0.0):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._lock = threading.Lock()
+        # הפעלה/עצירה של ה-thread והכנסה לתור - כתיבה לא נתקעת בתור של thread שיוצא
+        self._lifecycle = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._conn = None
+        self._pid = None
+        self.writes = 0
+        self.commits = 0
+        self.failed = 0
+
+    def submit(self, fn: Callable[[Any], Any]) -> Future:
+        """הכנסת כתיבה לתור - ה-Future מחזיר את ערך fn אחרי ה-commit"""
+        future = Future()
+        if threading.current_thread() is self._thread:
+            try:
+                future.set_result(self._write_nested(fn))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        with self._lifecycle:
+            self._ensure_started()
+            self._queue.put((fn, future))
+        return future
+
+    def execute(self, fn: Callable[[Any], Any], timeout: float = 30.0) -> Any:
+        return self.submit(fn).result(timeout)
+
+    def _ensure_started(self):
+        """(תחת _lifecycle) הפעלת ה-thread אם לא רץ בתהליך הזה"""
+        # אחרי fork ה-thread לא קיים בתהליך הבן - מפעילים אותו מחדש
+        if self._pid == os.getpid() and self._running and self._thread.is_alive():
+            return
+        if self._pid != os.getpid():
+            self._queue = queue.Queue()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+
+    def _write_nested(self, fn: Callable[[Any], Any]) -> Any:
+        """כתיבה מתוך כתיבה - בטרנזקציה הפתוחה של ה-batch, ב-SAVEPOINT משלה"""
+        conn = self._conn
+        conn.execute('SAVEPOINT nested')
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute('ROLLBACK TO nested')
+            conn.execute('RELEASE nested')
+            raise
+        conn.execute('RELEASE nested')
+        return result
+
+    def _drain(self) -> list:
+        items = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return items
+            if item is not _STOP:
+                items.append(item)
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch and batch[-1] is not _STOP:
+            try:
+                remaining = deadline - time.monotonic()
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = self.pool.acquire()
+        conn.isolation_level = None  # הטרנזקציות מנוהלות כאן במפורש
+        self._conn = conn
+        try:
+            while True:
+                batch = self._next_batch()
+                stopping = batch[-1] is _STOP
+                if stopping:
+                    batch.pop()
+                if batch:
+                    self._write_batch(conn, batch)
+                if stopping:
+                    with self._lifecycle:
+                        # כתיבות שנכנסו לתור אחרי בקשת העצירה נכתבות לפני היציאה
+                        leftover = self._drain()
+                        if leftover:
+                            self._write_batch(conn, leftover)
+                        self._running = False
+                    return
+        finally:
+            self._conn = None
+            conn.isolation_level = ''
+            self.pool.release(conn)
+
+    def _write_batch(self, conn, batch: list):
+        results = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for fn, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute('SAVEPOINT write')
+                try:
+                    results.append((future, fn(conn), None))
+                    conn.execute('RELEASE write')
+                except BaseException as e:
+                    conn.execute('ROLLBACK TO write')
+                    conn.execute('RELEASE write')
+                    results.append((future, None, e))
+            conn.execute('COMMIT')
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            with self._lock:
+                self.failed += len(batch)
+            for fn, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        with self._lock:
+            self.writes += len(results)
+            self.commits += 1
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def stop(self, timeout: float = 10.0):
+        """סיום הכתיבות שבתור ועצירת ה-thread"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'writes': self.writes,
+                'commits': self.commits,
+                'failed': self.failed,
+                'writes_per_commit': self.writes / self.commits if self.commits else 0.0,
+                'pending': self._queue.qsize(),
+            }
@@ -0,0 +1,21 @@
+# ============================================================================
+# gunicorn.conf.py - הרצה עם כמה workers
+# ============================================================================
+#
+# gunicorn -c gunicorn.conf.py 'app:create_app()'
+
+import os
+
+from config import load_config
+from database_service import DatabaseService
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+
+
+def on_starting(server):
+    """הקמת המסד והמיגרציות פעם אחת בתהליך הראשי, לפני ה-fork של ה-workers"""
+    config = load_config()
+    DatabaseService(config['DB_PATH'])
+    # ה-workers יורשים את הסביבה ומדלגים על ה-DDL
+    os.environ['DB_AUTO_INIT'] = '0'
@@ -0,0 +1,114 @@
+# ============================================================================
+# hashing_service.py - הצפנת ואימות סיסמאות מחוץ ל-thread של הבקשה
+# ============================================================================
+
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Dict, Optional
+
+import bcrypt
+
+
+class HashingQueueFull(Exception):
+    """יותר מדי פעולות הצפנה ממתינות - הבקשה נדחית מיד במקום להמתין"""
+
+
+def _hash_password(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check_password(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """הרצת bcrypt במאגר תהליכים חסום עם מדדי זמנים
+
+    workers=0 מריץ את bcrypt ישירות ב-thread הקורא (ללא מאגר).
+    max_pending מגביל את מספר הפעולות שממתינות או רצות בו-זמנית - המקום
+    מתפנה רק כשהפעולה הסתיימה במאגר, גם אם הקורא הפסיק להמתין לה.
+    אחרי timeout שניות הקורא מקבל concurrent.futures.TimeoutError.
+    """
+
+    def __init__(self, workers: int = 2, rounds: int = 12, max_pending: int = 16,
+                 timeout: float = 3.0):
+        self.workers = workers
+        self.rounds = rounds
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pid = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._metrics = {
+            op: {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+            for op in ('hash', 'check')
+        }
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # מאגר נפרד לכל worker - לא משתמשים במאגר שעבר בירושה אחרי fork
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, op: str, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingQueueFull(f"{self.max_pending} hashing operations already pending")
+
+        started = time.perf_counter()
+        if self.workers <= 0:
+            try:
+                result = fn(*args)
+            finally:
+                self._slots.release()
+        else:
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except Exception:
+                self._slots.release()
+                raise
+            future.add_done_callback(lambda _: self._slots.release())
+            try:
+                result = future.result(timeout=self.timeout)
+            except FuturesTimeoutError:
+                with self._lock:
+                    self.timeouts += 1
+                raise
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            metric = self._metrics[op]
+            metric['count'] += 1
+            metric['total_seconds'] += elapsed
+            metric['max_seconds'] = max(metric['max_seconds'], elapsed)
+        return result
+
+    def hash(self, password: str) -> str:
+        """הצפנת סיסמה חדשה"""
+        return self._run('hash', _hash_password, password.encode(), self.rounds).decode()
+
+    def check(self, password: str, hashed: str) -> bool:
+        """אימות סיסמה מול hash שמור"""
+        return self._run('check', _check_password, password.encode(), hashed.encode())
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """מדדי זמנים לכל סוג פעולה"""
+        with self._lock:
+            stats = {op: dict(metric) for op, metric in self._metrics.items()}
+            stats['rejected'] = self.rejected
+            stats['timeouts'] = self.timeouts
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
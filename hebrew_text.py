@@ -0,0 +1,61 @@
+# ============================================================================
+# hebrew_text.py - נרמול טקסט עברי לחיפוש ולהשוואת שמות מזיהוי דיבור
+# ============================================================================
+
+import re
+from difflib import SequenceMatcher
+from typing import Optional, Tuple
+
+# ניקוד וטעמים (U+0591-U+05C7, בלי המקף העברי U+05BE) וגרש/גרשיים/גרש לטיני
+_NIQQUD = re.compile('[\u0591-\u05BD\u05BF-\u05C7\u05F3\u05F4\'"`]')
+_SEPARATORS = re.compile(r"[\W_]+")
+
+_FINAL_LETTERS = str.maketrans('ךםןףץ', 'כמנפצ')
+
+# אותיות שנשמעות דומה - ממופות לנציג אחד; אותיות "שקטות"/אמות קריאה נמחקות
+_PHONETIC = str.maketrans({
+    'ח': 'ק', 'כ': 'ק',
+    'ט': 'ת',
+    'ש': 'ס',
+    'א': None, 'ה': None, 'ע': None, 'ו': None, 'י': None,
+})
+
+
+def normalize_hebrew(text: str) -> str:
+    """הסרת ניקוד, המרת אותיות סופיות, אותיות קטנות ורווח יחיד בין מילים"""
+    if not text:
+        return ''
+    text = _NIQQUD.sub('', text)
+    text = text.translate(_FINAL_LETTERS).lower()
+    return ' '.join(_SEPARATORS.split(text)).strip()
+
+
+def phonetic_key(word: str) -> str:
+    """מפתח פונטי למילה מנורמלת - שתי כתיבות שנשמעות דומה מקבלות אותו מפתח"""
+    key = word.translate(_PHONETIC)
+    # אותיות כפולות ברצף (למשל אחרי מיפוי) נספרות פעם אחת
+    return re.sub(r'(.)\1+', r'\1', key) or word[:1]
+
+
+def phonetic_keys(text: str) -> str:
+    """מפתחות פונטיים לכל מילה בטקסט"""
+    return ' '.join(phonetic_key(word) for word in normalize_hebrew(text).split())
+
+
+def contact_search_fields(name: Optional[str], company_name: Optional[str]) -> Tuple[str, str, str]:
+    """עמודות החיפוש של איש קשר (search_name, search_company, search_phonetic) - מחושבות
+    בכתיבה, כך שה-triggers של contacts_fts נשארים SQL נקי"""
+    return (normalize_hebrew(name), normalize_hebrew(company_name),
+            phonetic_keys(f"{name or ''} {company_name or ''}"))
+
+
+def similarity(spoken: str, stored: str) -> float:
+    """ציון דמיון 0-1 בין שם שנאמר לשם שמור (אורתוגרפי + פונטי)"""
+    a, b = normalize_hebrew(spoken), normalize_hebrew(stored)
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    spelled = SequenceMatcher(None, a, b).ratio()
+    sounded = SequenceMatcher(None, phonetic_keys(a), phonetic_keys(b)).ratio()
+    return max(spelled, 0.9 * sounded)
@@ -0,0 +1,98 @@
+# ============================================================================
+# ivr_flow.py - מנוע אשפים (wizards) טבלאי לתפריטי IVR
+# ============================================================================
+
+from typing import Callable, Dict, List, Optional
+
+
+class FlowStep:
+    """שלב באשף - שם הפרמטר שה-PBX מחזיר, התגובה שמבקשת אותו ומה קורה אחריו
+
+    prompt - שם התגובה בקטלוג שמבקשת את הערך
+    validator - פונקציה שמחזירה ValidationResult (לא תקין -> invalid_prompt)
+    transform - המרת הערך לפני השמירה
+    next_step - השלב הבא אחרי ערך תקין
+    action - במקום next_step: action(state, value, ctx) שמחזירה שם תגובה
+    enter - enter(state, ctx) בכניסה לשלב: יכולה לשמור ערכים להצגה ולהחזיר
+            שם תגובה חלופית (None - ה-prompt הרגיל)
+    """
+
+    def __init__(self, name: str, prompt: str, validator: Callable = None,
+                 invalid_prompt: str = None, transform: Callable = None,
+                 next_step: str = None, action: Callable = None, enter: Callable = None):
+        self.name = name
+        self.prompt = prompt
+        self.validator = validator
+        self.invalid_prompt = invalid_prompt
+        self.transform = transform
+        self.next_step = next_step
+        self.action = action
+        self.enter = enter
+
+
+class Flow:
+    """אשף מבוסס טבלה - כל webhook עולה עבודה קבועה
+
+    השלב הצפוי נשמר במצב השיחה (session['flows'][name]), כך שהפרמטר הנכנס
+    ממופה לשלב בחיפוש יחיד במילון, בלי לעבור על כל הפרמטרים.
+    """
+
+    def __init__(self, name: str, steps: List[FlowStep], responses, first_step: str = None):
+        self.name = name
+        self.responses = responses
+        self._steps: Dict[str, FlowStep] = {step.name: step for step in steps}
+        self.first_step = first_step or steps[0].name
+
+    def state(self, session: Dict) -> Dict:
+        """מצב האשף בתוך מצב השיחה"""
+        return session.setdefault('flows', {}).setdefault(self.name, {'step': None, 'values': {}})
+
+    def reset(self, state: Dict, step: str = None):
+        """חזרה לתחילת האשף (או לשלב מסוים)"""
+        state['step'] = step
+        state['values'] = {}
+
+    def _match(self, args, state: Dict) -> Optional[FlowStep]:
+        expected = state.get('step')
+        if expected is not None and expected in args:
+            return self._steps[expected]
+        # אין מצב שמור (שיחה חדשה/שחזור) - הפרמטר האחרון שה-PBX שלח
+        last_key = next(reversed(args.keys()), None) if args else None
+        return self._steps.get(last_key)
+
+    def handle(self, args, session: Dict, **ctx):
+        """עיבוד webhook אחד והחזרת התגובה הבאה"""
+        state = self.state(session)
+        step = self._match(args, state)
+
+        if step is None:
+            self.reset(state, self.first_step)
+            return self._enter(self._steps[self.first_step], state, ctx)
+
+        values = args.getlist(step.name) if hasattr(args, 'getlist') else [args[step.name]]
+        value = values[-1] if values else ''
+        if not value and step.action is None:
+            state['step'] = step.name
+            return self._render(step.prompt, state, ctx)
+
+        if step.validator is not None:
+            result = step.validator(value)
+            if not result.is_valid:
+                state['step'] = step.name
+                return self._render(step.invalid_prompt or step.prompt, state, ctx)
+
+        state['values'][step.name] = step.transform(value) if step.transform else value
+        if step.action is not None:
+            return self._render(step.action(state, value, ctx), state, ctx)
+
+        state['step'] = step.next_step
+        return self._enter(self._steps[step.next_step], state, ctx)
+
+    def _enter(self, step: FlowStep, state: Dict, ctx: Dict):
+        response_name = step.enter(state, ctx) if step.enter is not None else None
+        return self._render(response_name or step.prompt, state, ctx)
+
+    def _render(self, response_name: str, state: Dict, ctx: Dict):
+        fields = dict(state['values'])
+        fields.update(ctx)
+        return self.responses.response(response_name, **fields)
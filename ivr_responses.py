@@ -0,0 +1,410 @@
+# ============================================================================
+# ivr_responses.py - קטלוג תגובות IVR מקודדות מראש
+# ============================================================================
+
+import re
+from typing import Dict, List, Set, Tuple
+
+from prompts import PromptCatalog
+from ttl_cache import TTLCache
+
+# שדה דינמי בתוך ערך מחרוזת: "@@phone@@"
+_FIELD = re.compile(rb'@@(\w+)@@')
+
+IVR_RESPONSES: Dict[str, Dict] = {
+    # --- התחברות ---
+    'no_customer_login': {
+        "type": "simpleMenu",
+        "name": "no_customer_login",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "",
+        "setMusic": "no",
+        "extensionChange": "..",
+        "files": [{"text": "אינכם רשומים למערכת. הינכם מועברים להרשמה"}]
+    },
+    'login_password': {
+        "type": "getDTMF",
+        "name": "password",
+        "max": 10,
+        "min": 4,
+        "timeout": 5,
+        "confirmType": "no",
+        "files": [{"text": "לכניסה למערכת נא הקש את הסיסמה"}]
+    },
+    'login_busy': {
+        "type": "getDTMF",
+        "name": "password",
+        "max": 10,
+        "min": 4,
+        "timeout": 5,
+        "confirmType": "no",
+        "files": [{"text": "המערכת עמוסה כרגע. לכניסה למערכת נא הקש את הסיסמה"}]
+    },
+    'login_success': {
+        "type": "extensionChange",
+        "extensionIdChange": "1668"
+    },
+    'error_password': {
+        "type": "simpleMenu",
+        "name": "error_password",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "",
+        "setMusic": "no",
+        "extensionChange": "",
+        "files": [{"text": "יותר מדי נסיונות שגויים. נסו שוב מאוחר יותר"}]
+    },
+    'subscription_expired': {
+        "type": "simpleMenu",
+        "name": "subscription_expired",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "",
+        "setMusic": "no",
+        "extensionChange": "",
+        "files": [{"text": "המנוי שלכם הסתיים. לחידוש המנוי פנו למשרד"}]
+    },
+    'login_wrong_password': {
+        "type": "getDTMF",
+        "name": "password",
+        "max": 10,
+        "min": 4,
+        "timeout": 5,
+        "confirmType": "no",
+        "files": [{"text": "הסיסמה שגויה. לכניסה למערכת נא הקש את הסיסמה"}]
+    },
+
+    # --- הרשמה ---
+    'sign_name': {
+        "type": "stt",
+        "name": "name",
+        "max": 4,
+        "min": 2,
+        "fileName": "name_@@phone@@",
+        "files": [{"text": "אמרו בקול ברור את שם בעל העסק"}]
+    },
+    'sign_tz': {
+        "type": "getDTMF",
+        "name": "tz",
+        "max": 9,
+        "min": 9,
+        "timeout": 5,
+        "confirmType": "no",
+        "files": [{"text": "נא הקש את מספר תעודת הזהות של בעל העסק"}]
+    },
+    'sign_tz_invalid': {
+        "type": "getDTMF",
+        "name": "tz",
+        "max": 9,
+        "min": 9,
+        "timeout": 5,
+        "confirmType": "no",
+        "files": [{"text": "מספר תעודת הזהות שהוקש אינו תקין. נא הקש את תעודת הזהות של בעל העסק"}]
+    },
+    'sign_compeny_name': {
+        "type": "stt",
+        "name": "compeny_name",
+        "max": 4,
+        "min": 1,
+        "fileName": "compeny_name_@@phone@@",
+        "files": [{"text": "אמרו בקול ברור את שם העסק"}]
+    },
+    'sign_open_compeny': {
+        "type": "getDTMF",
+        "name": "open_compeny",
+        "max": 4,
+        "min": 4,
+        "timeout": 5,
+        "confirmType": "digits",
+        "files": [{"text": "נא הקש בארבע ספרות את שנת פתיחת העסק"}]
+    },
+    'sign_open_compeny_invalid': {
+        "type": "getDTMF",
+        "name": "open_compeny",
+        "max": 4,
+        "min": 4,
+        "timeout": 5,
+        "confirmType": "digits",
+        "files": [{"text": "השנה שנבחרה לא תקינה. נא להקיש בארבע ספרות את שנת פתיחת העסק"}]
+    },
+    'sign_category': {
+        "type": "stt",
+        "name": "category",
+        "max": 4,
+        "min": 2,
+        "fileName": "compeny_name_@@phone@@",
+        "files": [{"text": "אמרו בקול ברור את תחום העיסוק"}]
+    },
+    'sign_password': {
+        "type": "getDTMF",
+        "name": "password",
+        "max": 8,
+        "min": 4,
+        "timeout": 5,
+        "confirmType": "digits",
+        "files": [{"text": "נא בחר סיסמה להתחברות למערכת. הסיסמה צריכה להיות באורך של ארבע עד שמונה ספרות"}]
+    },
+    'fix_sign': {
+        "type": "simpleMenu",
+        "name": "fix_sign",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "0",
+        "setMusic": "no",
+        "extensionChange": "1664",
+        "files": [{"text": "ההרשמה הושלמה בהצלחה! הנכם מועברים לתפריט הראשי"}]
+    },
+    'error_sign': {
+        "type": "simpleMenu",
+        "name": "error_sign",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "",
+        "setMusic": "no",
+        "extensionChange": "1663",
+        "files": [{"text": "שגיאה בתהליך ההרשמה"}]
+    },
+    'sign_to_login': {
+        "type": "extensionChange",
+        "extensionIdChange": "1663"
+    },
+
+    # --- הפקת קבלה ---
+    'recpt_contact_name': {
+        "type": "stt",
+        "name": "contact_name",
+        "max": 4,
+        "min": 1,
+        "fileName": "contact_name @@phone@@",
+        "files": [{"text": "אמרו את שם איש הקשר שעבורו תופק הקבלה"}]
+    },
+    # השם שנאמר דומה לכמה אנשי קשר - המתקשר בוחר
+    'recpt_choose_contact': {
+        "type": "simpleMenu",
+        "name": "choose_contact",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "1,2,3,9",
+        "setMusic": "no",
+        "extensionChange": "",
+        "files": [{"text": "@@choices@@ליצירת איש קשר חדש בשם @@contact_name@@ הקישו תשע"}]
+    },
+    'recpt_amout': {
+        "type": "getDTMF",
+        "name": "amout",
+        "max": 5,
+        "min": 1,
+        "timeout": 5,
+        "confirmType": "number",
+        "files": [{"text": "נא הקש את סכום הקבלה, לנקודה עשרונית לחץ כוכבית"}]
+    },
+    'recpt_amout_invalid': {
+        "type": "getDTMF",
+        "name": "amout",
+        "max": 5,
+        "min": 1,
+        "timeout": 5,
+        "confirmType": "number",
+        "files": [{"text": "הסכום שהוקש אינו תקין. נא הקש את סכום הקבלה, לנקודה עשרונית לחץ כוכבית"}]
+    },
+    'recpt_detailes': {
+        "type": "stt",
+        "name": "detailes",
+        "max": 4,
+        "min": 1,
+        "fileName": "detailes @@phone@@",
+        "files": [{"text": "אמרו את תיאור השירות או המוצר"}]
+    },
+    'show_recpt_detailes': {
+        "type": "simpleMenu",
+        "name": "show_recpt_detailes",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "1,2",
+        "setMusic": "no",
+        "extensionChange": "",
+        "files": [{"text": "ביקשתם להפיק קבלה עבור @@contact_label@@, בסכום של @@amout@@. "
+                           "תיאור: @@detailes@@. לאישור הקישו אחת, לתיקון הקישו שתים"}]
+    },
+    'fix_create_recpt': {
+        "type": "simpleMenu",
+        "name": "fix_create_recpt",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "0",
+        "setMusic": "no",
+        "extensionChange": "",
+        "files": [{"text": "הקבלה נקלטה ותופק בדקות הקרובות. לחץ אפס לחזרה לתפריט הראשי"}]
+    },
+    # אין חיבור למערכת החשבוניות בשרת הזה - הקבלה נשמרת בלבד
+    'fix_create_recpt_saved': {
+        "type": "simpleMenu",
+        "name": "fix_create_recpt",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "0",
+        "setMusic": "no",
+        "extensionChange": "",
+        "files": [{"text": "הקבלה נשמרה וממתינה להפקה. לחץ אפס לחזרה לתפריט הראשי"}]
+    },
+    'recpt_restart': {
+        "type": "extensionChange",
+        "extensionIdChange": "create_recpt"
+    },
+    'recpt_to_menu': {
+        "type": "extensionChange",
+        "extensionIdChange": "1665"
+    },
+    # ביטול קבלה
+    'cancel_recpt_confirm': {
+        "type": "simpleMenu",
+        "name": "cancel_recpt_confirm",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "1,2",
+        "setMusic": "no",
+        "extensionChange": "",
+        "files": [{"text": "הקבלה האחרונה הופקה עבור @@contact_name@@, בסכום של @@amount@@ שקלים. "
+                           "לביטול הקבלה הקישו אחת, לחזרה לתפריט הראשי הקישו שתים"}]
+    },
+    'cancel_recpt_none': {
+        "type": "simpleMenu",
+        "name": "cancel_recpt_none",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "0",
+        "setMusic": "no",
+        "extensionChange": "",
+        "files": [{"text": "לא נמצאה קבלה לביטול. לחץ אפס לחזרה לתפריט הראשי"}]
+    },
+    'cancel_recpt_done': {
+        "type": "simpleMenu",
+        "name": "cancel_recpt_done",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "0",
+        "setMusic": "no",
+        "extensionChange": "",
+        "files": [{"text": "הקבלה בוטלה. לחץ אפס לחזרה לתפריט הראשי"}]
+    },
+    'cancel_recpt_refused': {
+        "type": "simpleMenu",
+        "name": "cancel_recpt_refused",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "0",
+        "setMusic": "no",
+        "extensionChange": "",
+        "files": [{"text": "הקבלה האחרונה, עבור @@contact_name@@ בסכום של @@amount@@ שקלים, כבר נשלחה "
+                           "להפקה במערכת החשבוניות ולא ניתן לבטל אותה מהטלפון. לביטול פנו למשרד. "
+                           "לחץ אפס לחזרה לתפריט הראשי"}]
+    },
+    # זכויות
+    'rights_summary': {
+        "type": "simpleMenu",
+        "name": "rights_summary",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "0",
+        "setMusic": "no",
+        "extensionChange": "",
+        "files": [{"text": "@@rules_note@@בשנת המס @@tax_year@@ מגיעות לכם @@credit_points@@ נקודות זיכוי עבור הילדים, "
+                           "בשווי של כ-@@credit_points_value@@ שקלים בשנה. "
+                           "קצבת הילדים החודשית היא @@child_allowance_monthly@@ שקלים. "
+                           "@@tax_coordination@@לחץ אפס לחזרה לתפריט הראשי"}]
+    },
+    # דוח חודשי
+    'statement_summary': {
+        "type": "simpleMenu",
+        "name": "statement_summary",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "0",
+        "setMusic": "no",
+        "extensionChange": "",
+        "files": [{"text": "בחודש @@month@@ הופקו @@receipts_count@@ קבלות בסך @@total_amount@@ שקלים "
+                           "עבור @@contacts_count@@ אנשי קשר. @@top_contact@@"
+                           "לחץ אפס לחזרה לתפריט הראשי"}]
+    },
+    'statement_none': {
+        "type": "simpleMenu",
+        "name": "statement_none",
+        "times": 1,
+        "timeout": 5,
+        "enabledKeys": "0",
+        "setMusic": "no",
+        "extensionChange": "",
+        "files": [{"text": "הדוח החודשי עדיין לא הופק. לחץ אפס לחזרה לתפריט הראשי"}]
+    },
+}
+
+
+class ResponseCatalog:
+    """תגובות JSON שמקודדות לבתים פעם אחת בעליית השרת
+
+    הקידוד נעשה דרך ספק ה-JSON של האפליקציה, כך שהבתים זהים למה ש-jsonify
+    היה מחזיר. שדות דינמיים ("@@phone@@") משובצים ישירות לתוך הבתים.
+
+    עם prompts, הודעה קבועה שיש לה הקלטה נשלחת כ-{"fileId": ...} במקום טקסט ל-TTS.
+    תגובה שהטקסט המוקרא בה דינמי נשלחת כטקסט, והרינדורים האחרונים שלה נשמרים
+    במטמון LRU (render_cache_size).
+    """
+
+    def __init__(self, app, payloads: Dict[str, Dict] = None, prompts: PromptCatalog = None,
+                 render_cache_size: int = 1024):
+        self.app = app
+        self.prompts = prompts
+        # שם -> (חלקים קבועים, שמות שדות) ; תגובה סטטית היא חלק יחיד ללא שדות
+        self._encoded: Dict[str, Tuple[List[bytes], List[str]]] = {}
+        # תגובות עם שדות בטקסט המוקרא - (שם, ערכי השדות) -> בתים
+        self._spoken_fields: Set[str] = set()
+        self._rendered = TTLCache(render_cache_size, float('inf'), refresh_on_get=False)
+        for name, payload in (payloads or {}).items():
+            self.register(name, payload)
+
+    def register(self, name: str, payload: Dict):
+        """קידוד תגובה לבתים ופירוקה סביב השדות הדינמיים"""
+        if self.prompts is not None:
+            payload = self.prompts.apply(name, payload)
+        if any('@@' in entry.get('text', '') for entry in payload.get('files', [])):
+            self._spoken_fields.add(name)
+        body = self.app.json.response(payload).get_data()
+        parts = _FIELD.split(body)
+        # split מחזיר [קבוע, שדה, קבוע, שדה, ..., קבוע]
+        self._encoded[name] = (parts[0::2], [field.decode() for field in parts[1::2]])
+
+    def _encode_value(self, value) -> bytes:
+        # הערך משובץ בתוך מחרוזת JSON קיימת - מקודדים בלי המרכאות
+        return self.app.json.dumps(str(value))[1:-1].encode()
+
+    def render(self, name: str, /, **fields) -> bytes:
+        """בתי התגובה עם השדות הדינמיים"""
+        chunks, field_names = self._encoded[name]
+        if not field_names:
+            return chunks[0]
+
+        key = None
+        if name in self._spoken_fields:
+            key = (name,) + tuple(str(fields[field]) for field in field_names)
+            body = self._rendered.get(key)
+            if body is not None:
+                return body
+
+        out = [chunks[0]]
+        for field, chunk in zip(field_names, chunks[1:]):
+            out.append(self._encode_value(fields[field]))
+            out.append(chunk)
+        body = b''.join(out)
+        if key is not None:
+            self._rendered.set(key, body)
+        return body
+
+    def stats(self) -> Dict[str, float]:
+        """מוני מטמון הרינדורים של התגובות הדינמיות"""
+        return self._rendered.stats()
+
+    def response(self, name: str, /, **fields):
+        """אובייקט Response מוכן להחזרה מה-handler"""
+        return self.app.response_class(self.render(name, **fields),
+                                       mimetype=self.app.json.mimetype)
@@ -0,0 +1,268 @@
+# ============================================================================
+# manage.py - פקודות תחזוקה למסד הנתונים
+# ============================================================================
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+from contact_transfer import import_contacts, export_contacts
+from database_service import DatabaseService
+from ivr_responses import IVR_RESPONSES
+from migrations import get_schema_version
+from prompts import PromptCatalog
+from query_plans import check_query_plans, scratch_hot_statements
+from rights_engine import RightsEngine
+from statements import StatementGenerator, previous_month
+
+
+def cmd_migrate(args) -> int:
+    """הרצת מיגרציות על מסד קיים"""
+    db = DatabaseService(args.db)
+    with db.get_connection() as conn:
+        print(f"schema version: {get_schema_version(conn)}")
+    return 0
+
+
+def cmd_check_plans(args) -> int:
+    """בדיקה שאף שאילתה חמה לא חזרה לסריקה מלאה"""
+    # ה-SQL נאסף על מסד זמני (חלק מהמתודות כותבות), והתוכניות נבדקות על המסד של --db
+    statements = scratch_hot_statements()
+    db = DatabaseService(args.db)
+    with db.get_connection() as conn:
+        regressions = check_query_plans(conn, statements)
+    for name, detail in regressions:
+        print(f"{name}: {detail}")
+    if regressions:
+        return 1
+    print("all hot queries use indexes")
+    return 0
+
+
+def cmd_verify_summaries(args) -> int:
+    """השוואת טבלת סיכומי הקבלות לחישוב מלא (ובנייה מחדש עם --rebuild)"""
+    db = DatabaseService(args.db)
+    drift = db.verify_receipt_summaries(rebuild=args.rebuild)
+    for row in drift:
+        print(f"contact {row['contact_id']}: "
+              f"count {row['summary_count']} != {row['actual_count']}, "
+              f"amount {row['summary_amount']} != {row['actual_amount']}, "
+              f"last {row['summary_last']} != {row['actual_last']}")
+    if not drift:
+        print("receipt summaries are consistent")
+        return 0
+    if args.rebuild:
+        print(f"rebuilt summaries ({len(drift)} contacts drifted)")
+        return 0
+    return 1
+
+
+def cmd_compute_rights(args) -> int:
+    """חישוב הזכויות מחדש לכל הלקוחות לשנת מס (במאגר תהליכים)"""
+    engine = RightsEngine(DatabaseService(args.db, pooled=True))
+
+    def progress(done):
+        print(f"\r{done} customers", end='', file=sys.stderr)
+
+    done = engine.recompute_all(args.year, workers=args.workers, batch_size=args.batch_size,
+                                progress=progress)
+    print(file=sys.stderr)
+    print(f"computed rights for {done} customers ({args.year})")
+    return 0
+
+
+def cmd_statements(args) -> int:
+    """הפקת הדוחות החודשיים לכל הלקוחות הפעילים (ברירת מחדל - החודש הקודם)"""
+    generator = StatementGenerator(DatabaseService(args.db, pooled=True), args.dir)
+    month = args.month or previous_month()
+
+    def progress(done):
+        print(f"\r{done} customers", end='', file=sys.stderr)
+
+    result = generator.generate_month(month, workers=args.workers, batch_size=args.batch_size,
+                                      progress=progress)
+    print(file=sys.stderr)
+    print(f"{month}: {result['written']} statements written, {result['unchanged']} unchanged")
+    return 0
+
+
+def cmd_seed(args) -> int:
+    """יצירת לקוח לדוגמה (פעם אחת - לא נוגע בלקוח קיים)"""
+    db = DatabaseService(args.db)
+    if db.get_customer_by_phone(args.phone):
+        print(f"customer {args.phone} already exists")
+        return 0
+    customer_id = db.create_customer(args.phone, args.password, args.name, args.tz)
+    print(f"created customer {args.phone} (id {customer_id})")
+    return 0
+
+
+def _customer_id(db: DatabaseService, phone: str) -> int:
+    customer = db.get_customer_by_phone(phone)
+    if not customer:
+        raise SystemExit(f"no customer with phone {phone}")
+    return customer['id']
+
+
+def _format(path: str, fmt: str) -> str:
+    if fmt:
+        return fmt
+    return 'jsonl' if path and path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def cmd_import_contacts(args) -> int:
+    """ייבוא אנשי קשר מקובץ CSV/JSONL"""
+    db = DatabaseService(args.db, pooled=True)
+    customer_id = _customer_id(db, args.phone)
+
+    def progress(report):
+        print(f"\r{report.processed} rows, {report.imported} imported, "
+              f"{len(report.errors)} rejected", end='', file=sys.stderr)
+
+    with open(args.file, encoding='utf-8-sig', newline='') as stream:
+        report = import_contacts(db, customer_id, stream, _format(args.file, args.format),
+                                 chunk_size=args.chunk_size, progress=progress)
+    progress(report)
+    print(file=sys.stderr)
+
+    if args.errors:
+        with open(args.errors, 'w', encoding='utf-8', newline='') as stream:
+            report.write_errors(stream)
+    return 0 if not report.errors else 2
+
+
+def cmd_export_contacts(args) -> int:
+    """ייצוא אנשי קשר לקובץ CSV/JSONL (או ל-stdout)"""
+    db = DatabaseService(args.db, pooled=True)
+    customer_id = _customer_id(db, args.phone)
+    fmt = _format(args.output, args.format)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as stream:
+            count = export_contacts(db, customer_id, stream, fmt)
+    else:
+        count = export_contacts(db, customer_id, sys.stdout, fmt)
+    print(f"{count} contacts exported", file=sys.stderr)
+    return 0
+
+
+def cmd_receipt_numbers(args) -> int:
+    """פערים במספור הקבלות - מספרים שהוקצו ולא שימשו לקבלה"""
+    db = DatabaseService(args.db)
+    gaps = db.find_receipt_number_gaps()
+    for gap in gaps:
+        print(f"customer {gap['customer_id']}: {gap['first_number']}-{gap['last_number']}")
+    if gaps and args.reclaim:
+        # גם בלוקים של workers פעילים נראים כפער - להריץ רק כשהשרת למטה
+        db.release_receipt_numbers([(g['customer_id'], g['first_number'], g['last_number'])
+                                    for g in gaps])
+        print(f"{len(gaps)} ranges returned for reuse")
+        return 0
+    return 1 if gaps else 0
+
+
+def cmd_expire_subscriptions(args) -> int:
+    """השבתת מנויים שפגו ותזכורות חידוש למנויים שמסתיימים בקרוב (cron, או --every ברקע)"""
+    db = DatabaseService(args.db)
+    while True:
+        today = date.today()
+        expired = db.expire_subscriptions(db.day_number(today), args.batch_size)
+        queued = db.queue_renewal_reminders(db.day_number(today),
+                                            db.day_number(today + timedelta(days=args.remind_days)),
+                                            args.batch_size)
+        print(f"{today.isoformat()}: {expired} subscriptions expired, {queued} renewal reminders queued")
+        if not args.every:
+            return 0
+        time.sleep(args.every)
+
+
+def cmd_prompts(args) -> int:
+    """רשימת ההודעות הקבועות (מזהה, hash, טקסט) להקלטה - שמירת הקובץ בשם <file_id>.wav
+    בתיקיית השמע ובמרכזייה מחליפה את ה-TTS בהקלטה"""
+    manifest = PromptCatalog(IVR_RESPONSES, args.audio_dir).manifest(missing_only=args.missing)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(manifest, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    print(f"{len(manifest)} prompts, {sum(1 for p in manifest if not p['has_audio'])} without audio",
+          file=sys.stderr)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="PBX system maintenance commands")
+    parser.add_argument('--db', default=os.environ.get("DB_PATH", "pbx_system.db"))
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('migrate', help='apply pending schema migrations').set_defaults(func=cmd_migrate)
+    commands.add_parser('check-plans', help='EXPLAIN QUERY PLAN regression check').set_defaults(
+        func=cmd_check_plans)
+
+    seeder = commands.add_parser('seed', help='create the sample customer if it does not exist')
+    seeder.add_argument('--phone', default='0533154518')
+    seeder.add_argument('--password', default='1234')
+    seeder.add_argument('--name', default='שלום')
+    seeder.add_argument('--tz', default='211979521')
+    seeder.set_defaults(func=cmd_seed)
+
+    verifier = commands.add_parser('verify-summaries',
+                                   help='check per-contact receipt summaries against receipts')
+    verifier.add_argument('--rebuild', action='store_true', help='rebuild the summary table on drift')
+    verifier.set_defaults(func=cmd_verify_summaries)
+
+    rights = commands.add_parser('compute-rights', help='recompute every customer for a tax year')
+    rights.add_argument('year', type=int)
+    rights.add_argument('--workers', type=int)
+    rights.add_argument('--batch-size', type=int, default=500)
+    rights.set_defaults(func=cmd_compute_rights)
+
+    statements = commands.add_parser('statements', help='generate monthly receipt statements')
+    statements.add_argument('month', nargs='?', help='YYYY-MM (default: previous month)')
+    statements.add_argument('--dir', default=os.environ.get('STATEMENTS_DIR', 'statements'))
+    statements.add_argument('--workers', type=int)
+    statements.add_argument('--batch-size', type=int, default=200)
+    statements.set_defaults(func=cmd_statements)
+
+    importer = commands.add_parser('import-contacts', help='bulk import contacts from CSV/JSONL')
+    importer.add_argument('phone', help='customer phone number')
+    importer.add_argument('file')
+    importer.add_argument('--format', choices=('csv', 'jsonl'))
+    importer.add_argument('--chunk-size', type=int, default=500)
+    importer.add_argument('--errors', help='write a per-row error report (CSV) to this file')
+    importer.set_defaults(func=cmd_import_contacts)
+
+    exporter = commands.add_parser('export-contacts', help='stream contacts to CSV/JSONL')
+    exporter.add_argument('phone', help='customer phone number')
+    exporter.add_argument('--output')
+    exporter.add_argument('--format', choices=('csv', 'jsonl'))
+    exporter.set_defaults(func=cmd_export_contacts)
+
+    numbers = commands.add_parser('receipt-numbers', help='report gaps in receipt numbering')
+    numbers.add_argument('--reclaim', action='store_true',
+                         help='return the gaps for reuse (only while no worker is running)')
+    numbers.set_defaults(func=cmd_receipt_numbers)
+
+    expiry = commands.add_parser('expire-subscriptions',
+                                 help='deactivate expired subscriptions and queue renewal reminders')
+    expiry.add_argument('--remind-days', type=int, default=14)
+    expiry.add_argument('--batch-size', type=int, default=500)
+    expiry.add_argument('--every', type=float, help='repeat every N seconds instead of running once')
+    expiry.set_defaults(func=cmd_expire_subscriptions)
+
+    prompts = commands.add_parser('prompts', help='list static prompts and their audio file ids')
+    prompts.add_argument('--audio-dir', default=os.environ.get('PROMPT_AUDIO_DIR', 'prompt_audio'))
+    prompts.add_argument('--missing', action='store_true', help='only prompts without audio')
+    prompts.add_argument('--output')
+    prompts.set_defaults(func=cmd_prompts)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# ============================================================================
+# metrics.py - מדדי ביצועים בפורמט Prometheus
+# ============================================================================
+
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# גבולות ברירת מחדל בשניות - מ-0.1ms (שאילתה) ועד 10 שניות (webhook תקוע)
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Histogram:
+    """היסטוגרמה עם גבולות קבועים לכל צירוף תוויות"""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # תוויות -> [מונה לכל גבול + inf, סכום]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = [(labels, list(counts), total)
+                        for labels, (counts, total) in self._series.items()]
+        for label_values, counts, total in sorted(snapshot):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = _format_labels(self.labels, label_values, 'le="%s"' % bound)
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            plain = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{plain} {total}')
+            lines.append(f'{self.name}_count{plain} {cumulative}')
+        return lines
+
+
+class Gauge:
+    """מדד שערכו נקרא בזמן הגירוד (scrape) מפונקציה"""
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} gauge',
+                f'{self.name} {float(self.read())}']
+
+
+class MetricsRegistry:
+    """אוסף המדדים שמוצגים ב-/metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> Gauge:
+        metric = Gauge(name, help_text, read)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class QueryTimer:
+    """אוסף זמני שאילתות SQL - מחובר ל-DatabaseService כ-query_observer"""
+
+    def __init__(self, histogram: Histogram, max_label_length: int = 120):
+        self.histogram = histogram
+        self.max_label_length = max_label_length
+        # SQL -> תווית מנורמלת (השאילתות קבועות, לכן המילון קטן)
+        self._labels: Dict[str, str] = {}
+
+    def __call__(self, sql: str, seconds: float):
+        label = self._labels.get(sql)
+        if label is None:
+            label = self._labels[sql] = ' '.join(sql.split())[:self.max_label_length]
+        self.histogram.observe(seconds, label)
@@ -0,0 +1,384 @@
+# ============================================================================
+# migrations.py - גרסאות סכמה ומיגרציות מסודרות
+# ============================================================================
+
+import sqlite3
+from collections import namedtuple
+from typing import List
+
+from hebrew_text import contact_search_fields
+
+# steps - רשימת פקודות SQL או פונקציות שמקבלות חיבור
+Migration = namedtuple('Migration', ['version', 'description', 'steps'])
+
+
+def _backfill_contact_search(conn: sqlite3.Connection):
+    """מילוי עמודות החיפוש של אנשי הקשר הקיימים (החישוב ב-Python)"""
+    rows = conn.execute('SELECT id, name, company_name FROM contacts').fetchall()
+    conn.executemany('''
+        UPDATE contacts SET search_name = ?, search_company = ?, search_phonetic = ? WHERE id = ?
+    ''', [contact_search_fields(row[1], row[2]) + (row[0],) for row in rows])
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'indexes for hot contact/receipt/children queries', [
+        # get_customer_contacts / search_contacts_by_name / with_receipts_count
+        'CREATE INDEX IF NOT EXISTS idx_contacts_customer_active_name '
+        'ON contacts (customer_id, is_active, name)',
+        # get_contact_by_name
+        'CREATE INDEX IF NOT EXISTS idx_contacts_name_active ON contacts (name, is_active)',
+        # get_receipts_by_contact(_detailed) ו-JOIN של סיכומי הקבלות
+        'CREATE INDEX IF NOT EXISTS idx_receipts_contact_created '
+        'ON receipts (contact_id, created_at)',
+        # get_customer_children / get_children_ages (אינדקס מכסה)
+        'CREATE INDEX IF NOT EXISTS idx_children_customer_active_birth '
+        'ON children (customer_id, is_active, birth_year, name)',
+    ]),
+    Migration(2, 'receipt issuance queue columns', [
+        'ALTER TABLE receipts ADD COLUMN attempts INTEGER DEFAULT 0',
+        'ALTER TABLE receipts ADD COLUMN next_attempt_at DATETIME',
+        'ALTER TABLE receipts ADD COLUMN claimed_at DATETIME',
+        'ALTER TABLE receipts ADD COLUMN last_error TEXT',
+        # שליפת הקבלות הממתינות להפקה
+        'CREATE INDEX IF NOT EXISTS idx_receipts_status_next '
+        'ON receipts (status, next_attempt_at)',
+    ]),
+    # he_normalize / he_phonetic נרשמות על כל חיבור ב-DatabaseService._prepare_connection.
+    # ה-triggers כאן מוחלפים במיגרציה 10 ב-SQL נקי (עמודות חיפוש שמחושבות בכתיבה)
+    Migration(3, 'full-text contact search with Hebrew normalization', [
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5 (
+            owner, name, company_name, phonetic,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_insert AFTER INSERT ON contacts BEGIN
+            INSERT INTO contacts_fts (rowid, owner, name, company_name, phonetic)
+            VALUES (new.id, 'c' || new.customer_id, he_normalize(new.name),
+                    he_normalize(new.company_name),
+                    he_phonetic(new.name || ' ' || COALESCE(new.company_name, '')));
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_update
+        AFTER UPDATE OF customer_id, name, company_name ON contacts BEGIN
+            DELETE FROM contacts_fts WHERE rowid = old.id;
+            INSERT INTO contacts_fts (rowid, owner, name, company_name, phonetic)
+            VALUES (new.id, 'c' || new.customer_id, he_normalize(new.name),
+                    he_normalize(new.company_name),
+                    he_phonetic(new.name || ' ' || COALESCE(new.company_name, '')));
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_delete AFTER DELETE ON contacts BEGIN
+            DELETE FROM contacts_fts WHERE rowid = old.id;
+        END
+        ''',
+        # מילוי האינדקס עבור אנשי קשר קיימים
+        '''
+        INSERT INTO contacts_fts (rowid, owner, name, company_name, phonetic)
+        SELECT id, 'c' || customer_id, he_normalize(name), he_normalize(company_name),
+               he_phonetic(name || ' ' || COALESCE(company_name, ''))
+        FROM contacts
+        ''',
+    ]),
+    # קבלה בסטטוס 'void' (בוטלה) לא נספרת בסיכום
+    Migration(4, 'incrementally maintained per-contact receipt summary', [
+        '''
+        CREATE TABLE IF NOT EXISTS contact_receipt_summary (
+            contact_id INTEGER PRIMARY KEY,
+            receipts_count INTEGER NOT NULL DEFAULT 0,
+            total_amount INTEGER NOT NULL DEFAULT 0,
+            last_receipt_at DATETIME
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS receipt_summary_insert AFTER INSERT ON receipts
+        WHEN new.contact_id IS NOT NULL AND new.status IS NOT 'void' BEGIN
+            INSERT INTO contact_receipt_summary (contact_id, receipts_count, total_amount, last_receipt_at)
+            VALUES (new.contact_id, 1, new.amount, new.created_at)
+            ON CONFLICT (contact_id) DO UPDATE SET
+                receipts_count = receipts_count + 1,
+                total_amount = total_amount + excluded.total_amount,
+                last_receipt_at = CASE
+                    WHEN last_receipt_at IS NULL OR excluded.last_receipt_at > last_receipt_at
+                    THEN excluded.last_receipt_at ELSE last_receipt_at END;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS receipt_summary_delete AFTER DELETE ON receipts
+        WHEN old.contact_id IS NOT NULL AND old.status IS NOT 'void' BEGIN
+            UPDATE contact_receipt_summary SET
+                receipts_count = receipts_count - 1,
+                total_amount = total_amount - old.amount,
+                last_receipt_at = (SELECT MAX(created_at) FROM receipts
+                                   WHERE contact_id = old.contact_id AND status IS NOT 'void')
+            WHERE contact_id = old.contact_id;
+        END
+        ''',
+        # עדכון (כולל ביטול) - הורדת הערך הישן והוספת החדש
+        '''
+        CREATE TRIGGER IF NOT EXISTS receipt_summary_update
+        AFTER UPDATE OF contact_id, amount, status, created_at ON receipts BEGIN
+            UPDATE contact_receipt_summary SET
+                receipts_count = receipts_count - 1,
+                total_amount = total_amount - old.amount,
+                last_receipt_at = (SELECT MAX(created_at) FROM receipts
+                                   WHERE contact_id = old.contact_id AND status IS NOT 'void')
+            WHERE contact_id = old.contact_id AND old.status IS NOT 'void';
+
+            INSERT INTO contact_receipt_summary (contact_id, receipts_count, total_amount, last_receipt_at)
+            SELECT new.contact_id, 1, new.amount, new.created_at
+            WHERE new.contact_id IS NOT NULL AND new.status IS NOT 'void'
+            ON CONFLICT (contact_id) DO UPDATE SET
+                receipts_count = receipts_count + 1,
+                total_amount = total_amount + excluded.total_amount,
+                last_receipt_at = CASE
+                    WHEN last_receipt_at IS NULL OR excluded.last_receipt_at > last_receipt_at
+                    THEN excluded.last_receipt_at ELSE last_receipt_at END;
+        END
+        ''',
+        '''
+        INSERT INTO contact_receipt_summary (contact_id, receipts_count, total_amount, last_receipt_at)
+        SELECT contact_id, COUNT(*), SUM(amount), MAX(created_at)
+        FROM receipts
+        WHERE contact_id IS NOT NULL AND status IS NOT 'void'
+        GROUP BY contact_id
+        ''',
+        # הקבלה האחרונה של לקוח (ביטול קבלה) ושאילתות לפי לקוח ותאריך
+        'CREATE INDEX IF NOT EXISTS idx_receipts_customer_created '
+        'ON receipts (customer_id, created_at)',
+    ]),
+    # תוצאות חישוב זכויות לכל לקוח ושנת מס; שינוי בילדים או במקומות העבודה מוחק אותן
+    Migration(5, 'memoized rights calculations', [
+        '''
+        CREATE TABLE IF NOT EXISTS customer_rights (
+            customer_id INTEGER NOT NULL,
+            tax_year INTEGER NOT NULL,
+            rules_version TEXT NOT NULL,
+            result TEXT NOT NULL,
+            computed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (customer_id, tax_year)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS rights_child_insert AFTER INSERT ON children BEGIN
+            DELETE FROM customer_rights WHERE customer_id = new.customer_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS rights_child_update
+        AFTER UPDATE OF customer_id, name, birth_year, is_active ON children BEGIN
+            DELETE FROM customer_rights WHERE customer_id IN (old.customer_id, new.customer_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS rights_child_delete AFTER DELETE ON children BEGIN
+            DELETE FROM customer_rights WHERE customer_id = old.customer_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS rights_customer_update
+        AFTER UPDATE OF spouse1_workplaces, spouse2_workplaces ON customers BEGIN
+            DELETE FROM customer_rights WHERE customer_id = new.id;
+        END
+        ''',
+    ]),
+    # מספור קבלות רץ לכל לקוח - מונה אטומי ב-receipt_sequences, ומספרים ששוחררו
+    # (בלוק שלא נוצל עד סוף ה-worker, קבלה שנכשלה) חוזרים לשימוש מ-receipt_number_ranges
+    Migration(6, 'per-customer receipt number sequences', [
+        'ALTER TABLE receipts ADD COLUMN receipt_number INTEGER',
+        # הגנה אחרונה מפני מספר כפול
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_receipts_customer_number '
+        'ON receipts (customer_id, receipt_number) WHERE receipt_number IS NOT NULL',
+        '''
+        CREATE TABLE IF NOT EXISTS receipt_sequences (
+            customer_id INTEGER PRIMARY KEY,
+            next_number INTEGER NOT NULL,
+            -- המספר הראשון שהוקצה מהמונה (בדיקת פערים מתחילה ממנו)
+            first_number INTEGER NOT NULL DEFAULT 1
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS receipt_number_ranges (
+            customer_id INTEGER NOT NULL,
+            first_number INTEGER NOT NULL,
+            last_number INTEGER NOT NULL,
+            PRIMARY KEY (customer_id, first_number)
+        ) WITHOUT ROWID
+        ''',
+        # ממשיכים מהמספרים שכבר הופקו (מספרי מסמך מספריים במערכת החשבוניות)
+        '''
+        INSERT INTO receipt_sequences (customer_id, next_number, first_number)
+        SELECT customer_id, MAX(CAST(icount_doc_num AS INTEGER)) + 1,
+               MAX(CAST(icount_doc_num AS INTEGER)) + 1
+        FROM receipts
+        WHERE icount_doc_num GLOB '[0-9]*' AND icount_doc_num NOT GLOB '*[^0-9]*'
+        GROUP BY customer_id
+        ''',
+    ]),
+    # דוח חודשי לכל לקוח - הקובץ נכתב פעם אחת, והסיכום נקרא מכאן ב-IVR
+    Migration(7, 'monthly customer statements', [
+        '''
+        CREATE TABLE IF NOT EXISTS monthly_statements (
+            customer_id INTEGER NOT NULL,
+            month TEXT NOT NULL, -- YYYY-MM
+            receipts_count INTEGER NOT NULL,
+            total_amount INTEGER NOT NULL,
+            contacts_count INTEGER NOT NULL,
+            summary TEXT NOT NULL, -- JSON: אנשי הקשר המובילים
+            file_path TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            generated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (customer_id, month)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    # תאריך סיום המנוי כמספר YYYYMMDD (ממוין ומאונדקס), מתוחזק בטריגרים מ-subscription_end_date.
+    # subscription_active מתאפס ב-sweep (manage.py expire-subscriptions) וחוזר ל-1 כשהמנוי מוארך;
+    # is_active (חשבון פעיל) לא משתנה כאן
+    Migration(8, 'indexed subscription expiry and renewal reminders', [
+        'ALTER TABLE customers ADD COLUMN subscription_end_day INTEGER',
+        'ALTER TABLE customers ADD COLUMN subscription_active INTEGER NOT NULL DEFAULT 1',
+        '''
+        UPDATE customers
+        SET subscription_end_day = CAST(strftime('%Y%m%d', subscription_end_date) AS INTEGER)
+        ''',
+        # ה-sweep ושליפת המנויים שעומדים לפוג
+        'CREATE INDEX IF NOT EXISTS idx_customers_subscription_end_day '
+        'ON customers (subscription_active, subscription_end_day)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS customers_end_day_insert AFTER INSERT ON customers BEGIN
+            UPDATE customers
+            SET subscription_end_day = CAST(strftime('%Y%m%d', new.subscription_end_date) AS INTEGER)
+            WHERE id = new.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS customers_end_day_update
+        AFTER UPDATE OF subscription_end_date ON customers BEGIN
+            UPDATE customers
+            SET subscription_end_day = CAST(strftime('%Y%m%d', new.subscription_end_date) AS INTEGER),
+                subscription_active = CASE
+                    WHEN CAST(strftime('%Y%m%d', new.subscription_end_date) AS INTEGER)
+                         >= CAST(strftime('%Y%m%d', 'now', 'localtime') AS INTEGER)
+                    THEN 1 ELSE subscription_active END
+            WHERE id = new.id;
+        END
+        ''',
+        # תור תזכורות - אחת לכל תקופת מנוי וסוג ('expiring' / 'expired')
+        '''
+        CREATE TABLE IF NOT EXISTS subscription_reminders (
+            customer_id INTEGER NOT NULL,
+            end_day INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            sent_at DATETIME,
+            PRIMARY KEY (customer_id, end_day, kind)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_subscription_reminders_pending '
+        'ON subscription_reminders (created_at) WHERE sent_at IS NULL',
+    ]),
+    # יומן הטלפונים ששורת הלקוח שלהם השתנתה (מכל תהליך) - generation עולה בכל כתיבה.
+    # CustomerCache.sync מסיר מהמטמון רק את הטלפונים שהשתנו מאז הבדיקה הקודמת, והיומן
+    # שומר את 10000 השינויים האחרונים (מטמון שפספס יותר מזה מתרוקן כולו)
+    Migration(9, 'changed-phones log for the customer cache', [
+        '''
+        CREATE TABLE IF NOT EXISTS customer_changes (
+            generation INTEGER PRIMARY KEY AUTOINCREMENT,
+            phone_number TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS customer_changes_prune AFTER INSERT ON customer_changes BEGIN
+            DELETE FROM customer_changes WHERE generation <= new.generation - 10000;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS customers_changes_insert AFTER INSERT ON customers BEGIN
+            INSERT INTO customer_changes (phone_number) VALUES (new.phone_number);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS customers_changes_update AFTER UPDATE ON customers BEGIN
+            INSERT INTO customer_changes (phone_number) VALUES (new.phone_number);
+            INSERT INTO customer_changes (phone_number)
+            SELECT old.phone_number WHERE old.phone_number IS NOT new.phone_number;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS customers_changes_delete AFTER DELETE ON customers BEGIN
+            INSERT INTO customer_changes (phone_number) VALUES (old.phone_number);
+        END
+        ''',
+    ]),
+    # ה-triggers של מיגרציה 3 קראו לפונקציות Python (he_normalize / he_phonetic), כך שחיבור
+    # בלי הרישום (sqlite3 CLI, גיבוי ושחזור) לא יכול היה לכתוב ל-contacts. הערכים המנורמלים
+    # נשמרים עכשיו בעמודות שה-DatabaseService ממלא (hebrew_text.contact_search_fields).
+    # כתיבה מבחוץ שלא ממלאת אותן נכנסת לאינדקס עם השם כמו שהוא ובלי מפתח פונטי
+    Migration(10, 'pure SQL contact search triggers', [
+        'ALTER TABLE contacts ADD COLUMN search_name TEXT',
+        'ALTER TABLE contacts ADD COLUMN search_company TEXT',
+        'ALTER TABLE contacts ADD COLUMN search_phonetic TEXT',
+        'DROP TRIGGER IF EXISTS contacts_fts_insert',
+        'DROP TRIGGER IF EXISTS contacts_fts_update',
+        _backfill_contact_search,
+        '''
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_insert AFTER INSERT ON contacts BEGIN
+            INSERT INTO contacts_fts (rowid, owner, name, company_name, phonetic)
+            VALUES (new.id, 'c' || new.customer_id, COALESCE(new.search_name, new.name),
+                    COALESCE(new.search_company, new.company_name, ''),
+                    COALESCE(new.search_phonetic, ''));
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_update
+        AFTER UPDATE OF customer_id, name, company_name, search_name, search_company, search_phonetic
+        ON contacts BEGIN
+            DELETE FROM contacts_fts WHERE rowid = old.id;
+            INSERT INTO contacts_fts (rowid, owner, name, company_name, phonetic)
+            VALUES (new.id, 'c' || new.customer_id, COALESCE(new.search_name, new.name),
+                    COALESCE(new.search_company, new.company_name, ''),
+                    COALESCE(new.search_phonetic, ''));
+        END
+        ''',
+    ]),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """גרסת הסכמה השמורה במסד (PRAGMA user_version)"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def apply_migrations(conn: sqlite3.Connection) -> List[int]:
+    """הרצת כל המיגרציות שטרם הורצו, כל אחת בטרנזקציה משלה
+
+    BEGIN IMMEDIATE ממתין לכותבים אחרים, כך שאפשר להריץ מול מסד פעיל.
+    מחזיר את רשימת הגרסאות שהורצו.
+    """
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version <= get_schema_version(conn):
+            continue
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # בדיקה חוזרת - ייתכן שתהליך אחר הריץ את המיגרציה בזמן ההמתנה
+            if migration.version <= get_schema_version(conn):
+                conn.rollback()
+                continue
+            for step in migration.steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f'PRAGMA user_version = {int(migration.version)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(migration.version)
+    return applied
@@ -0,0 +1,105 @@
+# ============================================================================
+# prompts.py - קטלוג ההודעות הקוליות: מזהה קבוע, hash של התוכן וקבצי שמע מוקלטים
+# ============================================================================
+
+import copy
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional, Set
+
+# שדה דינמי בטקסט ההודעה: "@@tax_year@@"
+_FIELD = re.compile(r'@@(\w+)@@')
+
+# תיקיית קבצי השמע - שם קובץ הוא file_id של ההודעה (למשל login_password-3f2a9c01b7d4.wav)
+PROMPT_AUDIO_DIR = 'prompt_audio'
+AUDIO_EXTENSIONS = ('.wav', '.mp3')
+
+
+def prompt_hash(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+class Prompt:
+    """הודעה אחת מתוך "files" של תגובה
+
+    prompt_id קבוע (שם התגובה ומיקום ההודעה בה) ו-file_id כולל את ה-hash של
+    הטקסט, כך ששינוי נוסח לא משמיע הקלטה ישנה - ההודעה חוזרת לטקסט עד שמוקלטת מחדש.
+    """
+
+    def __init__(self, prompt_id: str, text: str):
+        self.prompt_id = prompt_id
+        self.text = text
+        self.hash = prompt_hash(text)
+        self.fields: List[str] = _FIELD.findall(text)
+
+    @property
+    def file_id(self) -> str:
+        return f"{self.prompt_id}-{self.hash}"
+
+    @property
+    def dynamic(self) -> bool:
+        return bool(self.fields)
+
+
+class PromptCatalog:
+    """כל ההודעות של קטלוג התגובות, והחלפת הודעות קבועות בקובץ שמע כשקיים
+
+    הודעה דינמית (עם שדות) נשלחת תמיד כטקסט ל-TTS של המרכזייה.
+    """
+
+    def __init__(self, payloads: Dict[str, Dict], audio_dir: Optional[str] = PROMPT_AUDIO_DIR):
+        self.audio_dir = audio_dir
+        self.prompts: Dict[str, Prompt] = {}
+        for name, payload in payloads.items():
+            for index, entry in enumerate(payload.get('files', [])):
+                if 'text' in entry:
+                    prompt = Prompt(self._prompt_id(name, index), entry['text'])
+                    self.prompts[prompt.prompt_id] = prompt
+        self._audio: Set[str] = set()
+        self.reload()
+
+    @staticmethod
+    def _prompt_id(name: str, index: int) -> str:
+        return name if index == 0 else f"{name}.{index}"
+
+    def reload(self):
+        """סריקת תיקיית השמע (בעליית השרת, ואחרי העלאת הקלטות חדשות)"""
+        audio = set()
+        if self.audio_dir and os.path.isdir(self.audio_dir):
+            for filename in os.listdir(self.audio_dir):
+                stem, ext = os.path.splitext(filename)
+                if ext.lower() in AUDIO_EXTENSIONS:
+                    audio.add(stem)
+        self._audio = audio
+
+    def has_audio(self, prompt: Prompt) -> bool:
+        return not prompt.dynamic and prompt.file_id in self._audio
+
+    def apply(self, name: str, payload: Dict) -> Dict:
+        """התגובה עם {"fileId": ...} במקום {"text": ...} לכל הודעה קבועה שהוקלטה"""
+        files = payload.get('files')
+        if not files:
+            return payload
+        prompts = [self.prompts.get(self._prompt_id(name, index)) if 'text' in entry else None
+                   for index, entry in enumerate(files)]
+        if not any(prompt is not None and self.has_audio(prompt) for prompt in prompts):
+            return payload
+
+        payload = copy.deepcopy(payload)
+        for index, prompt in enumerate(prompts):
+            if prompt is not None and self.has_audio(prompt):
+                payload['files'][index] = {"fileId": prompt.file_id}
+        return payload
+
+    def manifest(self, missing_only: bool = False) -> List[Dict]:
+        """רשימת ההודעות הקבועות להקלטה/העלאה למרכזייה"""
+        return [{'prompt_id': prompt.prompt_id, 'file_id': prompt.file_id, 'hash': prompt.hash,
+                 'text': prompt.text, 'has_audio': self.has_audio(prompt)}
+                for prompt in self.prompts.values()
+                if not prompt.dynamic and not (missing_only and self.has_audio(prompt))]
+
+    def stats(self) -> Dict[str, int]:
+        static = [prompt for prompt in self.prompts.values() if not prompt.dynamic]
+        return {'prompts': len(self.prompts), 'static': len(static),
+                'with_audio': sum(1 for prompt in static if self.has_audio(prompt))}
@@ -0,0 +1,107 @@
+# ============================================================================
+# query_plans.py - EXPLAIN QUERY PLAN לשאילתות החמות, כפי ש-DatabaseService מריץ אותן
+# ============================================================================
+
+import os
+import sqlite3
+import tempfile
+from typing import Callable, Dict, List, Tuple
+
+from database_service import DatabaseService
+
+# מתודות חמות -> קריאה לדוגמה (db, ids מ-_seed_sample). ה-SQL נאסף מה-query_observer
+# בזמן הקריאה, כך שהבדיקה רצה על השאילתות האמיתיות ולא על עותק שלהן
+HOT_CALLS: Dict[str, Callable[[DatabaseService, Dict], object]] = {
+    'get_customer_by_phone': lambda db, s: db.get_customer_by_phone(s['phone']),
+    'get_customer_changes': lambda db, s: db.get_customer_changes(0),
+    'get_customer_contacts': lambda db, s: db.get_customer_contacts(s['customer_id']),
+    'get_contact_by_name': lambda db, s: (db.get_contact_by_name('משה כהן'),
+                                          db.get_contact_by_name('משה כהן', s['customer_id'])),
+    'find_contacts_fuzzy': lambda db, s: db.find_contacts_fuzzy(s['customer_id'], 'משה כהן'),
+    'search_contacts_by_name': lambda db, s: db.search_contacts_by_name(s['customer_id'], 'משה'),
+    'get_receipts_by_contact': lambda db, s: db.get_receipts_by_contact(s['contact_id']),
+    'get_children_ages': lambda db, s: db.get_children_ages(s['customer_id']),
+    'get_customer_contacts_with_receipts_count':
+        lambda db, s: db.get_customer_contacts_with_receipts_count(s['customer_id']),
+    'get_top_contacts': lambda db, s: db.get_top_contacts(s['customer_id']),
+    'get_last_receipt': lambda db, s: db.get_last_receipt(s['customer_id']),
+    'get_customer_contacts_page': lambda db, s: (
+        db.get_customer_contacts_page(s['customer_id']),
+        db.get_customer_contacts_page(s['customer_id'], after=['', 0])),
+    'get_receipts_by_contact_page': lambda db, s: (
+        db.get_receipts_by_contact_page(s['contact_id']),
+        db.get_receipts_by_contact_page(s['contact_id'], after=['9999', 1 << 62])),
+    'get_rights_inputs': lambda db, s: db.get_rights_inputs(s['customer_id']),
+    'get_monthly_statement': lambda db, s: db.get_monthly_statement(s['customer_id'], '2025-01'),
+    'claim_pending_receipts': lambda db, s: db.claim_pending_receipts(20),
+    'expire_subscriptions': lambda db, s: db.expire_subscriptions(),
+    'queue_renewal_reminders': lambda db, s: db.queue_renewal_reminders(20250101, 20991231),
+}
+
+# פקודות שאין להן תוכנית שאילתה
+_NOT_EXPLAINABLE = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE', 'PRAGMA')
+
+
+class StatementRecorder:
+    """query_observer שאוסף את פקודות ה-SQL שרצו"""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    def __call__(self, sql: str, seconds: float):
+        self.statements.append(sql)
+
+
+def _seed_sample(db: DatabaseService) -> Dict:
+    """לקוח אחד עם איש קשר, ילד וקבלה - מספיק כדי שכל מתודה תריץ את השאילתות שלה"""
+    phone = '0500000000'
+    customer_id = db.create_customer(phone, '1234', 'לקוח', '000000018')
+    contact_id = db.create_contact(customer_id, 'משה כהן', company_name='נגרות')
+    db.create_child(customer_id, 'ילד', 2015)
+    db.create_receipt_for_contact(customer_id, contact_id, 1000, 'דוגמה')
+    return {'phone': phone, 'customer_id': customer_id, 'contact_id': contact_id}
+
+
+def capture_hot_statements(db: DatabaseService, recorder: StatementRecorder) -> Dict[str, List[str]]:
+    """הרצת כל מתודה חמה על db (שנבנה עם recorder כ-query_observer) ואיסוף ה-SQL שלה
+
+    db צריך להיות מסד זמני - חלק מהמתודות כותבות.
+    """
+    sample = _seed_sample(db)
+    captured = {}
+    for name, call in HOT_CALLS.items():
+        recorder.statements.clear()
+        call(db, sample)
+        captured[name] = [sql for sql in recorder.statements
+                          if not sql.lstrip().upper().startswith(_NOT_EXPLAINABLE)]
+    return captured
+
+
+def scratch_hot_statements() -> Dict[str, List[str]]:
+    """ה-SQL של המתודות החמות, נאסף על מסד זמני עם הסכמה של המיגרציות"""
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = StatementRecorder()
+        db = DatabaseService(os.path.join(directory, 'plans.db'), query_observer=recorder)
+        return capture_hot_statements(db, recorder)
+
+
+def check_query_plans(conn: sqlite3.Connection,
+                      statements: Dict[str, List[str]]) -> List[Tuple[str, str]]:
+    """EXPLAIN QUERY PLAN ל-SQL שנאסף - מחזיר (מתודה, שלב) לכל סריקת טבלה מלאה
+
+    הפרמטרים מוחלפים ב-NULL; התוכנית תלויה בסכמה ובסטטיסטיקות של conn ולא בערכים.
+    """
+    regressions = []
+    for name, sqls in statements.items():
+        for sql in sqls:
+            # סריקה של תת-שאילתה (co-routine / materialize) או של SELECT בלי FROM אינה סריקת טבלה
+            subqueries = set()
+            for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', (None,) * sql.count('?')):
+                detail = row[3]
+                if detail.startswith(('CO-ROUTINE ', 'MATERIALIZE ')):
+                    subqueries.add(detail.split()[1])
+                elif (detail.startswith('SCAN') and 'INDEX' not in detail
+                        and detail != 'SCAN CONSTANT ROW'
+                        and detail.split()[1] not in subqueries):
+                    regressions.append((name, detail))
+    return regressions
@@ -0,0 +1,134 @@
+# ============================================================================
+# rate_limiter.py - הגבלת ניסיונות התחברות משותפת לכל השיחות וה-workers
+# ============================================================================
+
+import threading
+import time
+from typing import Callable, Dict
+
+from connection_pool import ConnectionPool
+
+
+class LoginRateLimiter:
+    """token bucket לכל מפתח (למשל טלפון) עם נעילה אחרי רצף כישלונות
+
+    המצב נשמר בטבלת login_throttle במסד, כך שניתוק וחיוג מחדש או פנייה ל-worker
+    אחר לא מאפסים אותו. הבדיקה נעשית לפני ה-bcrypt - ניסיון חסום לא עולה CPU.
+
+    capacity - מספר הניסיונות ברצף; אסימון חוזר כל refill_every שניות
+    lockout_after - כישלונות רצופים עד לנעילה של lockout_seconds שניות
+    """
+
+    def __init__(self, db_path: str, capacity: int = 5, refill_every: float = 60.0,
+                 lockout_after: int = 10, lockout_seconds: float = 900.0, purge_every: int = 500,
+                 clock: Callable[[], float] = time.time):
+        self.capacity = capacity
+        self.refill_every = refill_every
+        self.lockout_after = lockout_after
+        self.lockout_seconds = lockout_seconds
+        self.purge_every = purge_every
+        self._clock = clock
+        self.pool = ConnectionPool(db_path)
+        self._lock = threading.Lock()
+        self._calls = 0
+        self.allowed = 0
+        self.throttled = 0
+        self.lockouts = 0
+        self._init_table()
+
+    def _init_table(self):
+        with self.pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS login_throttle (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    failures INTEGER NOT NULL DEFAULT 0,
+                    locked_until REAL NOT NULL DEFAULT 0
+                ) WITHOUT ROWID
+            """)
+            conn.commit()
+
+    def acquire(self, key: str) -> float:
+        """ניסיון התחברות - 0 אם מותר (נצרך אסימון), אחרת שניות עד שיתאפשר"""
+        now = self._clock()
+        with self.pool.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT tokens, updated_at, locked_until FROM login_throttle '
+                               'WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                tokens = float(self.capacity)
+            elif row['locked_until'] > now:
+                conn.rollback()
+                return self._rejected(row['locked_until'] - now)
+            else:
+                tokens = min(self.capacity,
+                             row['tokens'] + (now - row['updated_at']) / self.refill_every)
+
+            if tokens < 1:
+                conn.rollback()
+                return self._rejected((1 - tokens) * self.refill_every)
+            conn.execute('''
+                INSERT INTO login_throttle (key, tokens, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens,
+                                                updated_at = excluded.updated_at
+            ''', (key, tokens - 1, now))
+            conn.commit()
+
+        with self._lock:
+            self.allowed += 1
+            self._calls += 1
+            purge = self._calls % self.purge_every == 0
+        if purge:
+            self.purge()
+        return 0.0
+
+    def _rejected(self, wait: float) -> float:
+        with self._lock:
+            self.throttled += 1
+        return max(wait, 0.001)
+
+    def refund(self, key: str):
+        """החזרת האסימון של ניסיון שלא נבדק (המערכת הייתה עמוסה) - לא נספר כניסיון"""
+        with self.pool.connection() as conn:
+            conn.execute('UPDATE login_throttle SET tokens = MIN(?, tokens + 1) WHERE key = ?',
+                         (self.capacity, key))
+            conn.commit()
+
+    def record_failure(self, key: str) -> bool:
+        """סיסמה שגויה - מחזיר True אם המפתח ננעל עכשיו"""
+        now = self._clock()
+        with self.pool.connection() as conn:
+            row = conn.execute('''
+                UPDATE login_throttle SET
+                    failures = CASE WHEN failures + 1 >= ? THEN 0 ELSE failures + 1 END,
+                    locked_until = CASE WHEN failures + 1 >= ? THEN ? ELSE locked_until END
+                WHERE key = ?
+                RETURNING locked_until
+            ''', (self.lockout_after, self.lockout_after, now + self.lockout_seconds,
+                  key)).fetchone()
+            conn.commit()
+        locked = row is not None and row['locked_until'] > now
+        if locked:
+            with self._lock:
+                self.lockouts += 1
+        return locked
+
+    def reset(self, key: str):
+        """התחברות מוצלחת - מחיקת הכישלונות והאסימונים שנצרכו"""
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM login_throttle WHERE key = ?', (key,))
+            conn.commit()
+
+    def purge(self):
+        """מחיקת מפתחות שהדלי שלהם התמלא והנעילה פגה (אין להם מצב לשמור)"""
+        now = self._clock()
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM login_throttle WHERE locked_until < ? AND updated_at < ?',
+                         (now, now - self.capacity * self.refill_every))
+            conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'allowed': self.allowed, 'throttled': self.throttled,
+                    'lockouts': self.lockouts}
@@ -0,0 +1,111 @@
+# ============================================================================
+# receipt_numbers.py - הקצאת מספרי קבלה רצים לכל לקוח, בטוחה מול threads ו-workers
+# ============================================================================
+
+import atexit
+import os
+import threading
+from typing import Dict, List, Optional
+
+from database_service import DatabaseService
+
+
+class ReceiptNumberAllocator:
+    """מספרי קבלה רצים לכל לקוח - בלי כפילויות, ובלי פערים לא מבוקרים
+
+    block_size=1 - המספר נלקח מהמונה באותה טרנזקציה של יצירת הקבלה, כך שאין
+    פערים בכלל (ביטול הטרנזקציה מחזיר גם את המונה).
+    block_size>1 - כל worker שומר בלוק מספרים לכל לקוח ומקצה ממנו בלי פנייה למונה.
+    מספר של קבלה שנכשלה, והמספרים שנשארו בבלוקים בסיום התהליך, משוחררים ל-
+    receipt_number_ranges ומוקצים שוב לפני מספרים חדשים. worker שקרס משאיר פער -
+    find_receipt_number_gaps / manage.py receipt-numbers מאתרים ומחזירים אותו.
+    בין workers המספרים אינם בהכרח לפי סדר זמן היצירה.
+    """
+
+    def __init__(self, db: DatabaseService, block_size: int = 1):
+        self.db = db
+        self.block_size = max(1, block_size)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        # לקוח -> בלוקים [הבא, אחרון] ממוינים, הנמוך ראשון
+        self._blocks: Dict[int, List[List[int]]] = {}
+        self.allocated = 0
+        self.reservations = 0
+        self.released = 0
+        if self.block_size > 1:
+            atexit.register(self.release_all)
+
+    def _local_blocks(self) -> Dict[int, List[List[int]]]:
+        # אחרי fork הבלוקים שייכים לתהליך האב
+        if self._pid != os.getpid():
+            self._blocks = {}
+            self._pid = os.getpid()
+        return self._blocks
+
+    def _take(self, customer_id: int) -> Optional[int]:
+        blocks = self._local_blocks().get(customer_id)
+        if not blocks:
+            return None
+        block = blocks[0]
+        number = block[0]
+        block[0] += 1
+        if block[0] > block[1]:
+            blocks.pop(0)
+        self.allocated += 1
+        return number
+
+    def allocate(self, customer_id: int) -> int:
+        """המספר הבא של הלקוח מהבלוק של התהליך (שמירת בלוק חדש כשהוא נגמר)"""
+        with self._lock:
+            number = self._take(customer_id)
+        if number is not None:
+            return number
+
+        first, last = self.db.reserve_receipt_numbers(customer_id, self.block_size)
+        with self._lock:
+            self.reservations += 1
+            blocks = self._local_blocks().setdefault(customer_id, [])
+            blocks.append([first, last])
+            blocks.sort()
+            return self._take(customer_id)
+
+    def release(self, customer_id: int, number: int):
+        """מספר שהוקצה ולא שימש (יצירת הקבלה נכשלה)"""
+        self.db.release_receipt_numbers([(customer_id, number, number)])
+        with self._lock:
+            self.released += 1
+
+    def release_all(self):
+        """החזרת כל המספרים שנשארו בבלוקים (בסיום התהליך)"""
+        with self._lock:
+            ranges = [(customer_id, first, last)
+                      for customer_id, blocks in self._local_blocks().items()
+                      for first, last in blocks]
+            self._blocks = {}
+        if ranges:
+            self.db.release_receipt_numbers(ranges)
+            with self._lock:
+                self.released += sum(last - first + 1 for _, first, last in ranges)
+
+    def create_receipt(self, customer_id: int, contact_id: int, amount: int,
+                       description: str = None, call_id: str = None) -> int:
+        """יצירת קבלה עם המספר הבא של הלקוח - מחזיר את מזהה הקבלה"""
+        if self.block_size == 1:
+            receipt_id = self.db.create_receipt_for_contact(customer_id, contact_id, amount,
+                                                            description, call_id)
+            with self._lock:
+                self.allocated += 1
+            return receipt_id
+
+        number = self.allocate(customer_id)
+        try:
+            return self.db.create_receipt_for_contact(customer_id, contact_id, amount,
+                                                      description, call_id, receipt_number=number)
+        except Exception:
+            self.release(customer_id, number)
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'allocated': self.allocated, 'reservations': self.reservations,
+                    'released': self.released}
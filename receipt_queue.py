@@ -0,0 +1,159 @@
+# ============================================================================
+# receipt_queue.py - תור הפקת קבלות ברקע מול מערכת חשבוניות חיצונית
+# ============================================================================
+
+import json
+import logging
+import random
+import threading
+import urllib.error
+import urllib.request
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from database_service import DatabaseService
+
+
+class InvoicingError(Exception):
+    """כישלון בפנייה למערכת החשבוניות (כל ה-batch ינוסה שוב)"""
+
+
+class InvoicingClient(ABC):
+    """ממשק ללקוח מערכת חשבוניות
+
+    issue_batch מקבלת שורות קבלה ומחזירה תוצאה לכל קבלה:
+    {'receipt_id', 'ok', 'doc_id', 'doc_num', 'response', 'error'}
+    כישלון של כל ה-batch (רשת, תשובה לא תקינה) - InvoicingError.
+    """
+
+    @abstractmethod
+    def issue_batch(self, receipts: List[Dict]) -> List[Dict]:
+        ...
+
+
+class HttpInvoicingClient(InvoicingClient):
+    """לקוח HTTP/JSON - שולח את כל ה-batch בבקשה אחת"""
+
+    def __init__(self, url: str, api_key: str = None, timeout: float = 15.0):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def issue_batch(self, receipts: List[Dict]) -> List[Dict]:
+        documents = [{
+            'receipt_id': r['id'],
+            'customer': {'name': r.get('customer_name'), 'tz': r.get('customer_tz'),
+                         'phone': r.get('customer_phone')},
+            'client': {'name': r.get('contact_name'), 'tz': r.get('contact_tz'),
+                       'email': r.get('contact_email'), 'company': r.get('company_name'),
+                       'address': r.get('contact_address')},
+            'amount_agorot': r['amount'],
+            'description': r.get('description'),
+            # מספר הקבלה הרץ של הלקוח (או מספר שכבר נקבע במערכת החשבוניות)
+            'doc_num': r.get('icount_doc_num') or r.get('receipt_number'),
+        } for r in receipts]
+
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(
+            self.url, data=json.dumps({'documents': documents}, ensure_ascii=False).encode(),
+            headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = json.loads(response.read().decode())
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise InvoicingError(str(e)) from e
+
+        results = body.get('results') if isinstance(body, dict) else None
+        if not isinstance(results, list) or not all(
+                isinstance(result, dict) and 'receipt_id' in result for result in results):
+            raise InvoicingError(f"unexpected invoicing response: {str(body)[:200]}")
+        return results
+
+
+class ReceiptIssuer:
+    """worker ברקע ששולח קבלות ממתינות להפקה ב-batches
+
+    התור הוא טבלת receipts עצמה (status = pending/processing/issued/failed),
+    כך שהוא שורד הפעלה מחדש ומשותף בין workers - הלקיחה (claim) אטומית.
+    """
+
+    def __init__(self, db: DatabaseService, client: InvoicingClient, batch_size: int = 20,
+                 max_attempts: int = 5, base_delay: float = 5.0, max_delay: float = 600.0,
+                 poll_interval: float = 5.0):
+        self.db = db
+        self.client = client
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def retry_delay(self, attempts: int) -> float:
+        """המתנה אקספוננציאלית עם jitter לפני הניסיון הבא"""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempts))
+        return delay * random.uniform(0.5, 1.0)
+
+    def run_once(self) -> int:
+        """הפקת batch אחד - מחזיר את מספר הקבלות שטופלו"""
+        receipts = self.db.claim_pending_receipts(self.batch_size)
+        if not receipts:
+            return 0
+
+        try:
+            results = {r['receipt_id']: r for r in self.client.issue_batch(receipts)}
+        except InvoicingError as e:
+            logging.warning(f"invoicing batch failed: {e}")
+            results = {r['id']: {'receipt_id': r['id'], 'ok': False, 'error': str(e)}
+                       for r in receipts}
+
+        issued, failed = [], []
+        for receipt in receipts:
+            result = results.get(receipt['id']) or {
+                'receipt_id': receipt['id'], 'ok': False, 'error': 'missing from response'}
+            if result.get('ok'):
+                issued.append(result)
+                continue
+            attempts = (receipt.get('attempts') or 0) + 1
+            failed.append({
+                'receipt_id': receipt['id'],
+                'claimed_at': receipt['claimed_at'],
+                'error': result.get('error'),
+                'retry_in': self.retry_delay(attempts) if attempts < self.max_attempts else None,
+            })
+
+        if issued:
+            self.db.mark_receipts_issued(issued)
+        if failed:
+            self.db.mark_receipts_failed(failed)
+        return len(receipts)
+
+    def notify(self):
+        """העירו את ה-worker - נוספה קבלה חדשה"""
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                while self.run_once() and not self._stopping.is_set():
+                    pass
+            except Exception:
+                logging.exception("receipt issuer iteration failed")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='receipt-issuer', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,184 @@
+# ============================================================================
+# rights_engine.py - חישוב זכויות והטבות (נקודות זיכוי, קצבת ילדים, תיאום מס)
+# ============================================================================
+
+import hashlib
+import json
+import os
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from database_service import DatabaseService
+
+# טבלאות הכללים לפי שנת מס - יש לעדכן מהפרסומים הרשמיים בתחילת כל שנה
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rights_rules.json')
+
+
+class YearRules:
+    """כללי שנת מס אחת, מאונדקסים לחיפוש ישיר לפי גיל הילד ומספרו הסידורי"""
+
+    def __init__(self, year: int, table: Dict):
+        self.year = year
+        # שינוי בטבלה מבטל תוצאות שנשמרו עם הגרסה הקודמת
+        self.version = hashlib.sha1(json.dumps(table, sort_keys=True).encode()).hexdigest()[:12]
+        self.credit_point_value = table['credit_point_value']
+        self.tax_coordination_workplaces = table['tax_coordination_workplaces']
+
+        # גיל -> נקודות זיכוי (0 מעבר לגיל האחרון בטבלה)
+        max_age = max(rule['max_age'] for rule in table['child_credit_points'])
+        points = [0.0] * (max_age + 1)
+        for rule in table['child_credit_points']:
+            for age in range(rule['min_age'], rule['max_age'] + 1):
+                points[age] = rule['points']
+        self.points_by_age = tuple(points)
+
+        # מספר סידורי של ילד -> קצבה חודשית (המדרגה האחרונה חלה על כל השאר)
+        self.allowance_max_age = table['child_allowance_max_age']
+        steps = sorted(table['child_allowance'], key=lambda rule: rule['from_child'])
+        self._allowance_from = [rule['from_child'] for rule in steps]
+        self._allowance_monthly = [rule['monthly'] for rule in steps]
+
+    def credit_points(self, age: int) -> float:
+        return self.points_by_age[age] if 0 <= age < len(self.points_by_age) else 0.0
+
+    def allowance(self, ordinal: int) -> int:
+        index = bisect_right(self._allowance_from, ordinal) - 1
+        return self._allowance_monthly[index] if index >= 0 else 0
+
+
+class RuleBook:
+    """כל טבלאות הכללים - נטענות פעם אחת לתהליך"""
+
+    def __init__(self, tables: Dict[int, Dict]):
+        self._years = sorted(tables)
+        self._rules = {year: YearRules(year, tables[year]) for year in self._years}
+
+    @property
+    def years(self) -> List[int]:
+        return list(self._years)
+
+    def for_year(self, tax_year: int) -> YearRules:
+        """כללי השנה - או של השנה האחרונה שפורסמה לפניה"""
+        index = bisect_right(self._years, tax_year) - 1
+        if index < 0:
+            raise ValueError(f"No rights rules for tax year {tax_year}")
+        return self._rules[self._years[index]]
+
+
+@lru_cache(maxsize=None)
+def load_rules(path: str = RULES_PATH) -> RuleBook:
+    with open(path, encoding='utf-8') as f:
+        tables = json.load(f)
+    return RuleBook({int(year): table for year, table in tables.items()})
+
+
+def compute_rights(rules: YearRules, tax_year: int, inputs: Dict) -> Dict:
+    """חישוב הזכויות מנתוני הלקוח (פונקציה טהורה - רצה גם בתהליכי ה-batch)"""
+    children = []
+    allowance = 0
+    ordinal = 0
+    # ילדים לפי סדר לידה - הבכור הוא הילד הראשון לקצבה
+    for child in inputs['children']:
+        age = tax_year - child['birth_year']
+        if age < 0:
+            continue
+        points = rules.credit_points(age)
+        children.append({'name': child['name'], 'birth_year': child['birth_year'],
+                         'age': age, 'credit_points': points})
+        if age <= rules.allowance_max_age:
+            ordinal += 1
+            allowance += rules.allowance(ordinal)
+
+    credit_points = sum(child['credit_points'] for child in children)
+    workplaces = (inputs.get('spouse1_workplaces') or 0, inputs.get('spouse2_workplaces') or 0)
+    return {
+        'tax_year': tax_year,
+        'rules_year': rules.year,
+        'children': children,
+        'credit_points': credit_points,
+        'credit_points_value': round(credit_points * rules.credit_point_value),
+        'child_allowance_monthly': allowance,
+        # יותר ממקום עבודה אחד - כנראה נוכה מס ביתר וכדאי תיאום מס / החזר מס
+        'tax_coordination': any(count >= rules.tax_coordination_workplaces for count in workplaces),
+    }
+
+
+def _compute_batch(job: Tuple[str, int, List[Dict]]) -> List[Tuple[int, int, str, str]]:
+    """משימה לתהליך ב-pool - מחזירה שורות מוכנות ל-save_customer_rights"""
+    path, tax_year, batch = job
+    rules = load_rules(path).for_year(tax_year)
+    return [(inputs['id'], tax_year, rules.version,
+             json.dumps(compute_rights(rules, tax_year, inputs), ensure_ascii=False))
+            for inputs in batch]
+
+
+class RightsEngine:
+    """חישוב זכויות עם שמירת התוצאה לכל לקוח ושנת מס
+
+    התוצאות נשמרות ב-customer_rights (משותפת לכל ה-workers). טריגרים על children
+    ו-customers מוחקים אותן כשהנתונים משתנים, ושינוי בטבלת הכללים מזוהה לפי rules_version.
+    """
+
+    def __init__(self, db: DatabaseService, rules_path: str = RULES_PATH):
+        self.db = db
+        self.rules_path = rules_path
+        self.rules = load_rules(rules_path)
+        self.hits = 0
+        self.misses = 0
+
+    def calculate(self, customer_id: int, tax_year: int) -> Optional[Dict]:
+        """הזכויות של הלקוח בשנת המס (None - לקוח לא קיים)"""
+        rules = self.rules.for_year(tax_year)
+        saved = self.db.get_customer_rights(customer_id, tax_year)
+        if saved is not None and saved['rules_version'] == rules.version:
+            self.hits += 1
+            return json.loads(saved['result'])
+
+        self.misses += 1
+        inputs = self.db.get_rights_inputs(customer_id)
+        if inputs is None:
+            return None
+        result = compute_rights(rules, tax_year, inputs)
+        self.db.save_customer_rights([(customer_id, tax_year, rules.version,
+                                       json.dumps(result, ensure_ascii=False))])
+        return result
+
+    def recompute_all(self, tax_year: int, workers: int = None, batch_size: int = 500,
+                      progress: Callable[[int], None] = None) -> int:
+        """חישוב מחדש לכל הלקוחות (שנת מס חדשה) - החישוב במאגר תהליכים, הכתיבה כאן"""
+        self.rules.for_year(tax_year)
+        done = 0
+
+        def jobs():
+            batch = []
+            for inputs in self.db.iter_rights_inputs(batch_size):
+                batch.append(inputs)
+                if len(batch) >= batch_size:
+                    yield self.rules_path, tax_year, batch
+                    batch = []
+            if batch:
+                yield self.rules_path, tax_year, batch
+
+        def save(future):
+            nonlocal done
+            done += self.db.save_customer_rights(future.result())
+            if progress is not None:
+                progress(done)
+
+        # מספר חסום של batches בדרך, כדי לא לטעון את כל הלקוחות לזיכרון
+        workers = workers or os.cpu_count() or 1
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for job in jobs():
+                pending.append(pool.submit(_compute_batch, job))
+                if len(pending) >= 2 * workers:
+                    save(pending.popleft())
+            while pending:
+                save(pending.popleft())
+        return done
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
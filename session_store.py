@@ -0,0 +1,228 @@
+# ============================================================================
+# session_store.py - אחסון מצב שיחות (במקום המילון הגלובלי call_data)
+# ============================================================================
+
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+from connection_pool import ConnectionPool
+from ttl_cache import TTLCache
+
+
+class SessionStore(ABC):
+    """ממשק בסיסי לאחסון מצב שיחה לפי PBXcallId"""
+
+    def __init__(self):
+        self._expire_listeners: List[Callable[[str, float], None]] = []
+        self._purger: Optional[threading.Thread] = None
+
+    def on_expire(self, listener: Callable[[str, float], None]):
+        """רישום מאזין לשיחות שמצבן נזרק - listener(call_id, last_seen)"""
+        self._expire_listeners.append(listener)
+
+    def _notify_expired(self, call_id: str, last_seen: float):
+        for listener in self._expire_listeners:
+            listener(call_id, last_seen)
+
+    @abstractmethod
+    def load(self, call_id: str) -> Dict:
+        """טעינת מצב השיחה (מילון ריק לשיחה חדשה)"""
+
+    @abstractmethod
+    def save(self, call_id: str, data: Dict):
+        """שמירת מצב השיחה"""
+
+    @abstractmethod
+    def delete(self, call_id: str):
+        """מחיקת מצב השיחה"""
+
+    @abstractmethod
+    def purge(self):
+        """ניקוי שיחות שפג תוקפן (המאזינים של on_expire מקבלים כל שיחה)"""
+
+    def start_purging(self, interval: float):
+        """thread רקע שמריץ purge כל interval שניות - כך סיום שיחה נרשם גם בלי
+        בקשות נוספות (פעם אחת לכל תהליך)"""
+        if self._purger is not None and self._purger.is_alive():
+            return
+        self._purger = threading.Thread(target=self._purge_loop, args=(interval,),
+                                        name='session-purge', daemon=True)
+        self._purger.start()
+
+    def _purge_loop(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.purge()
+            except Exception:
+                logging.exception("session purge failed")
+
+    @abstractmethod
+    def active_count(self) -> int:
+        """מספר השיחות הפעילות"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, float]:
+        """מוני פגיעות/החטאות/פינויים"""
+
+
+class MemorySessionStore(SessionStore):
+    """אחסון בזיכרון התהליך - LRU חסום עם פקיעה אחרי זמן חוסר פעילות"""
+
+    def __init__(self, max_sessions: int = 10000, idle_ttl: float = 1800,
+                 clock: Callable[[], float] = time.time):
+        super().__init__()
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        self._cache = TTLCache(max_sessions, idle_ttl, refresh_on_get=True,
+                               on_evict=self._evicted, clock=clock)
+
+    def _evicted(self, call_id: str, data: Dict, reason: str):
+        # שיחה שפג תוקפה הייתה פעילה לאחרונה לפני idle_ttl שניות
+        now = self._clock()
+        self._notify_expired(call_id, now - self.idle_ttl if reason == 'expired' else now)
+
+    def load(self, call_id: str) -> Dict:
+        data = self._cache.get(call_id)
+        if data is None:
+            data = {}
+            self._cache.set(call_id, data)
+        return data
+
+    def save(self, call_id: str, data: Dict):
+        self._cache.set(call_id, data)
+
+    def delete(self, call_id: str):
+        self._cache.pop(call_id)
+
+    def purge(self):
+        self._cache.purge_expired()
+
+    def active_count(self) -> int:
+        self.purge()
+        return len(self._cache)
+
+    def stats(self) -> Dict[str, float]:
+        return self._cache.stats()
+
+
+class SQLiteSessionStore(SessionStore):
+    """אחסון משותף ב-SQLite - כל ה-workers רואים את אותה שיחה
+
+    השורות שפג תוקפן וחריגה ממספר השיחות המרבי מנוקות כל purge_every שמירות.
+    המונים נספרים לכל תהליך בנפרד.
+    """
+
+    def __init__(self, db_path: str, max_sessions: int = 10000, idle_ttl: float = 1800,
+                 purge_every: int = 200, clock: Callable[[], float] = time.time):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.purge_every = purge_every
+        self._clock = clock
+        self.pool = ConnectionPool(db_path)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._init_table()
+
+    def _init_table(self):
+        with self.pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS call_sessions (
+                    call_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_call_sessions_updated_at '
+                         'ON call_sessions (updated_at)')
+            conn.commit()
+
+    def load(self, call_id: str) -> Dict:
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                'SELECT data FROM call_sessions WHERE call_id = ? AND updated_at >= ?',
+                (call_id, self._clock() - self.idle_ttl)
+            ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return {}
+            self.hits += 1
+        return json.loads(row['data'])
+
+    def save(self, call_id: str, data: Dict):
+        with self.pool.connection() as conn:
+            conn.execute('''
+                INSERT INTO call_sessions (call_id, data, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(call_id) DO UPDATE SET data = excluded.data,
+                                                   updated_at = excluded.updated_at
+            ''', (call_id, json.dumps(data, ensure_ascii=False), self._clock()))
+            conn.commit()
+
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % self.purge_every == 0
+        if purge:
+            self.purge()
+
+    def delete(self, call_id: str):
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM call_sessions WHERE call_id = ?', (call_id,))
+            conn.commit()
+
+    def purge(self):
+        """ניקוי שיחות שפג תוקפן ושיחות עודפות (הישנות ביותר)"""
+        with self.pool.connection() as conn:
+            expired = conn.execute(
+                'DELETE FROM call_sessions WHERE updated_at < ? RETURNING call_id, updated_at',
+                (self._clock() - self.idle_ttl,)).fetchall()
+            overflow = conn.execute('''
+                DELETE FROM call_sessions WHERE call_id IN (
+                    SELECT call_id FROM call_sessions
+                    ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+                )
+                RETURNING call_id, updated_at
+            ''', (self.max_sessions,)).fetchall()
+            conn.commit()
+        with self._lock:
+            self.expirations += len(expired)
+            self.evictions += len(overflow)
+        # רק התהליך שמחק את השורה מדווח עליה
+        for row in expired + overflow:
+            self._notify_expired(row['call_id'], row['updated_at'])
+
+    def active_count(self) -> int:
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT COUNT(*) FROM call_sessions WHERE updated_at >= ?',
+                               (self._clock() - self.idle_ttl,)).fetchone()
+        return row[0]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'size': self.active_count(),
+            'max_size': self.max_sessions,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+def create_session_store(backend: str, db_path: str, **kwargs) -> SessionStore:
+    """יצירת מאגר שיחות לפי סוג ('memory' / 'sqlite')"""
+    if backend == 'memory':
+        return MemorySessionStore(**kwargs)
+    if backend == 'sqlite':
+        return SQLiteSessionStore(db_path, **kwargs)
+    raise ValueError(f"Unknown session backend: {backend}")
@@ -0,0 +1,144 @@
+# ============================================================================
+# statements.py - דוחות קבלות חודשיים לכל הלקוחות (הפקה במאגר תהליכים)
+# ============================================================================
+
+import hashlib
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from database_service import DatabaseService
+
+# תיקיית הקבצים - statements/<YYYY-MM>/<customer_id>.txt
+STATEMENTS_DIR = 'statements'
+TOP_CONTACTS = 3
+
+
+def previous_month(today: date = None) -> str:
+    """החודש הקודם (YYYY-MM) - החודש האחרון שנסגר"""
+    today = today or date.today()
+    return (today.replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+
+
+def _money(agorot: int) -> str:
+    return f'{agorot / 100:,.2f} ש"ח'
+
+
+def render_statement(customer: Dict, month: str) -> str:
+    """טקסט הדוח החודשי של לקוח (פונקציה טהורה - רצה בתהליכי ה-pool)"""
+    year, month_number = month.split('-')
+    lines = [f"דוח קבלות חודשי - {month_number}/{year}",
+             f"לקוח: {customer['name'] or ''} ({customer['phone_number']})"]
+    if customer.get('compny_name'):
+        lines.append(f"עסק: {customer['compny_name']}")
+    lines.append('')
+
+    receipts_count = 0
+    total_amount = 0
+    for contact in customer['contacts']:
+        lines.append(f"{contact['name'] or 'ללא איש קשר'} | {contact['receipts_count']} קבלות | "
+                     f"{_money(contact['total_amount'])}")
+        for receipt in sorted(contact['receipts'], key=lambda r: (r['date'], r['number'] or 0)):
+            number = f"#{receipt['number']}" if receipt['number'] is not None else '-'
+            lines.append(f"  {number} {receipt['date']} {_money(receipt['amount'])} "
+                         f"{receipt['description'] or ''}".rstrip())
+        lines.append('')
+        receipts_count += contact['receipts_count']
+        total_amount += contact['total_amount']
+
+    if not customer['contacts']:
+        lines.append("לא הופקו קבלות בחודש זה")
+        lines.append('')
+    lines.append(f"סה\"כ: {receipts_count} קבלות, {_money(total_amount)}")
+    return '\n'.join(lines) + '\n'
+
+
+def _write_once(path: str, content: bytes):
+    """כתיבה אטומית - קורא לא רואה קובץ חלקי"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+
+def _render_batch(job: Tuple[str, str, List[Dict]]) -> Tuple[List[Tuple], int]:
+    """משימה לתהליך ב-pool - כותב את הדוחות שהשתנו ומחזיר שורות ל-save_monthly_statements"""
+    statements_dir, month, batch = job
+    rows = []
+    unchanged = 0
+    for customer in batch:
+        content = render_statement(customer, month).encode('utf-8')
+        content_hash = hashlib.sha1(content).hexdigest()
+        path = os.path.join(statements_dir, month, f"{customer['id']}.txt")
+        # הדוח כבר נכתב עם אותו תוכן - לא כותבים שוב
+        if content_hash == customer['content_hash'] and os.path.exists(path):
+            unchanged += 1
+            continue
+        _write_once(path, content)
+
+        contacts = customer['contacts']
+        summary = [{'name': contact['name'], 'receipts_count': contact['receipts_count'],
+                    'total_amount': contact['total_amount']} for contact in contacts[:TOP_CONTACTS]]
+        rows.append((customer['id'], month,
+                     sum(contact['receipts_count'] for contact in contacts),
+                     sum(contact['total_amount'] for contact in contacts),
+                     len(contacts), json.dumps(summary, ensure_ascii=False), path, content_hash))
+    return rows, unchanged
+
+
+class StatementGenerator:
+    """הפקת הדוחות החודשיים - שאילתה מקובצת לכל עמוד לקוחות, רינדור וכתיבה במאגר תהליכים"""
+
+    def __init__(self, db: DatabaseService, statements_dir: str = STATEMENTS_DIR):
+        self.db = db
+        self.statements_dir = statements_dir
+
+    def generate_month(self, month: str, workers: int = None, batch_size: int = 200,
+                       progress: Callable[[int], None] = None) -> Dict[str, int]:
+        """דוח לכל לקוח פעיל לחודש (YYYY-MM) - מחזיר כמה נכתבו וכמה לא השתנו"""
+        written = 0
+        unchanged = 0
+
+        def jobs():
+            batch = []
+            for customer in self.db.iter_statement_inputs(month, batch_size):
+                batch.append(customer)
+                if len(batch) >= batch_size:
+                    yield self.statements_dir, month, batch
+                    batch = []
+            if batch:
+                yield self.statements_dir, month, batch
+
+        def save(future):
+            nonlocal written, unchanged
+            rows, skipped = future.result()
+            if rows:
+                self.db.save_monthly_statements(rows)
+            written += len(rows)
+            unchanged += skipped
+            if progress is not None:
+                progress(written + unchanged)
+
+        # מספר חסום של batches בדרך, כדי לא לטעון את כל הלקוחות לזיכרון
+        workers = workers or os.cpu_count() or 1
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for job in jobs():
+                pending.append(pool.submit(_render_batch, job))
+                if len(pending) >= 2 * workers:
+                    save(pending.popleft())
+            while pending:
+                save(pending.popleft())
+        return {'written': written, 'unchanged': unchanged}
+
+    def summary(self, customer_id: int, month: str) -> Optional[Dict]:
+        """הסיכום השמור של הדוח (None - הדוח לא הופק)"""
+        statement = self.db.get_monthly_statement(customer_id, month)
+        if statement is None:
+            return None
+        statement['summary'] = json.loads(statement['summary'])
+        return statement
@@ -0,0 +1,73 @@
+# ============================================================================
+# stub_invoicing_server.py - שרת חשבוניות מקומי לפיתוח ובדיקות
+# ============================================================================
+#
+# python stub_invoicing_server.py --port 8099 --fail-rate 0.2
+# INVOICING_URL=http://127.0.0.1:8099/documents python app.py
+
+import argparse
+import itertools
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubInvoicingHandler(BaseHTTPRequestHandler):
+    """מקבל batch של מסמכים ומחזיר מספר מסמך לכל אחד (או כישלון אקראי / של קבלות מסוימות)"""
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        documents = json.loads(self.rfile.read(length).decode())['documents']
+
+        results = []
+        for document in documents:
+            if (document['receipt_id'] in self.server.fail_receipts
+                    or random.random() < self.server.fail_rate):
+                results.append({'receipt_id': document['receipt_id'], 'ok': False,
+                                'error': 'stub: simulated failure'})
+                continue
+            with self.server.lock:
+                doc_id = next(self.server.doc_ids)
+            doc_num = document.get('doc_num') or str(doc_id)
+            results.append({'receipt_id': document['receipt_id'], 'ok': True,
+                            'doc_id': f"stub-{doc_id}", 'doc_num': doc_num,
+                            'response': {'doc_id': f"stub-{doc_id}", 'doc_num': doc_num}})
+            self.server.issued.append(document)
+
+        reply = {'error': 'stub: malformed reply'} if self.server.malformed else {'results': results}
+        body = json.dumps(reply, ensure_ascii=False).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(port: int = 0, fail_rate: float = 0.0) -> ThreadingHTTPServer:
+    """שרת סטאב (port=0 - פורט פנוי אקראי, זמין ב-server.server_port)
+
+    לבדיקות: server.fail_receipts - מזהי קבלות שתמיד נכשלות,
+    server.malformed - תשובה בלי results.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubInvoicingHandler)
+    server.fail_rate = fail_rate
+    server.fail_receipts = set()
+    server.malformed = False
+    server.lock = threading.Lock()
+    server.doc_ids = itertools.count(1000)
+    server.issued = []
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stub invoicing API")
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    server = make_server(args.port, args.fail_rate)
+    print(f"stub invoicing server on http://127.0.0.1:{server.server_port}/documents")
+    server.serve_forever()
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+# המודולים יושבים בשורש הריפו (ללא חבילה)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import load_config  # noqa: E402
+from database_service import DatabaseService  # noqa: E402
+from hashing_service import PasswordHasher  # noqa: E402
+
+# bcrypt מהיר לבדיקות
+TEST_ROUNDS = 4
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseService(str(tmp_path / 'test.db'), hasher=PasswordHasher(workers=0, rounds=TEST_ROUNDS))
+
+
+@pytest.fixture
+def app(tmp_path):
+    from app import create_app
+    config = load_config({
+        'DB_PATH': str(tmp_path / 'app.db'),
+        'HASH_WORKERS': '0',
+        'BCRYPT_ROUNDS': str(TEST_ROUNDS),
+        'SESSION_BACKEND': 'memory',
+        'STATEMENTS_DIR': str(tmp_path / 'statements'),
+        'PROMPT_AUDIO_DIR': str(tmp_path / 'prompt_audio'),
+    })
+    app = create_app(config)
+    yield app
+    app.extensions['pbx'].call_recorder.stop()
+
+
+@pytest.fixture
+def call(app):
+    """call(route, call_id, phone, **args) -> תגובת ה-IVR כ-JSON"""
+    client = app.test_client()
+
+    def call(route, call_id, phone, **args):
+        response = client.get(route, query_string=dict(args, PBXcallId=call_id, PBXphone=phone))
+        return response.get_json()
+    return call
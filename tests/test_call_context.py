@@ -0,0 +1,63 @@
+# ============================================================================
+# test_call_context.py - פרטי הלקוח לשיחה נטענים רק אחרי התחברות
+# ============================================================================
+
+from call_context import call_context, mark_call_context_changed
+
+PHONE = '0521234567'
+
+
+def test_routes_require_login(app, call):
+    app.extensions['pbx'].db.create_customer(PHONE, '1234', 'לקוח', '000000018')
+    for route in ('/create_recpt', '/cancel_recpt', '/get_detailes', '/rights'):
+        assert call(route, 'never-logged-in', PHONE)['name'] == 'no_customer_login'
+
+
+def test_wrong_password_does_not_log_in(app, call):
+    app.extensions['pbx'].db.create_customer(PHONE, '1234', 'לקוח', '000000018')
+    assert call('/login', 'c1', PHONE, password='9999')['name'] == 'password'
+    assert call('/create_recpt', 'c1', PHONE)['name'] == 'no_customer_login'
+
+
+def test_login_loads_context(app, call):
+    app.extensions['pbx'].db.create_customer(PHONE, '1234', 'לקוח', '000000018')
+    assert call('/login', 'c1', PHONE, password='1234')['type'] == 'extensionChange'
+    assert call('/create_recpt', 'c1', PHONE)['name'] == 'contact_name'
+    # שיחה אחרת מאותו טלפון לא יורשת את ההתחברות
+    assert call('/create_recpt', 'c2', PHONE)['name'] == 'no_customer_login'
+
+
+def _logged_in(db, session):
+    customer_id = db.create_customer(PHONE, '1234', 'לקוח', '000000018')
+    session.update(authenticated=True, customer_id=customer_id)
+    return customer_id
+
+
+def test_no_context_without_login(db):
+    db.create_customer(PHONE, '1234', 'לקוח', '000000018')
+    assert call_context({}, db, PHONE) is None
+
+
+def test_stale_context_reloads_by_customer_id(db):
+    session = {}
+    customer_id = _logged_in(db, session)
+    context = call_context(session, db, PHONE)
+    assert context['customer']['id'] == customer_id
+
+    db.create_contact(customer_id, 'משה כהן')
+    mark_call_context_changed(session)
+    assert call_context(session, db, PHONE)['customer']['id'] == customer_id
+    # טלפון אחר באותה שיחה - לא אותו לקוח
+    assert call_context(session, db, '0500000000') is None
+    assert 'authenticated' not in session
+
+
+def test_refresh_checks_subscription(db):
+    session = {}
+    customer_id = _logged_in(db, session)
+    call_context(session, db, PHONE)
+    with db.get_connection() as conn:
+        conn.execute('UPDATE customers SET subscription_active = 0 WHERE id = ?', (customer_id,))
+        conn.commit()
+    mark_call_context_changed(session)
+    assert call_context(session, db, PHONE) is None
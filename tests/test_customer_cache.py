@@ -0,0 +1,94 @@
+# ============================================================================
+# test_customer_cache.py - מטמון הלקוחות מול כתיבות מתהליכים אחרים
+# ============================================================================
+
+import pytest
+
+from customer_cache import CustomerCache
+from database_service import DatabaseService
+from hashing_service import PasswordHasher
+
+from conftest import TEST_ROUNDS
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """שני "workers" על אותו מסד: אחד עם מטמון (בלי השהיית בדיקה) ואחד שכותב"""
+    path = str(tmp_path / 'cache.db')
+    hasher = PasswordHasher(workers=0, rounds=TEST_ROUNDS)
+    cache = CustomerCache(check_interval=0)
+    cached = DatabaseService(path, hasher=hasher, customer_cache=cache)
+    writer = DatabaseService(path, hasher=hasher)
+    return cached, writer, cache
+
+
+def _rename(db, phone, name):
+    with db.get_connection() as conn:
+        conn.execute('UPDATE customers SET name = ? WHERE phone_number = ?', (name, phone))
+        conn.commit()
+
+
+def test_unregistered_caller_is_cached_until_signup(workers):
+    cached, writer, cache = workers
+    assert cached.get_customer_by_phone('0521111111') is None
+    assert cached.get_customer_by_phone('0521111111') is None
+    assert cache.stats()['negative_hits'] == 1
+
+    writer.create_customer('0521111111', '1234', 'לקוח', '000000018')
+    assert cached.get_customer_by_phone('0521111111')['name'] == 'לקוח'
+
+
+def test_only_changed_phones_are_invalidated(workers):
+    cached, writer, cache = workers
+    writer.create_customer('0521111111', '1234', 'א', '000000018')
+    writer.create_customer('0522222222', '1234', 'ב', '000000026')
+    cached.get_customer_by_phone('0521111111')
+    cached.get_customer_by_phone('0522222222')
+
+    _rename(writer, '0521111111', 'א2')
+    hits = cache.stats()['hits']
+    assert cached.get_customer_by_phone('0521111111')['name'] == 'א2'
+    assert cached.get_customer_by_phone('0522222222')['name'] == 'ב'
+    stats = cache.stats()
+    assert stats['hits'] == hits + 1
+    assert stats['invalidations'] == 1
+    assert stats['resets'] == 0
+
+
+def test_put_after_newer_sync_is_dropped(workers):
+    cached, writer, cache = workers
+    writer.create_customer('0521111111', '1234', 'א', '000000018')
+    generation = cache.sync(cached.get_customer_changes)
+    stale = dict(cached.get_customer_by_phone('0521111111'))
+    cache.clear()
+
+    # worker אחר משנה את השורה וה-sync של thread אחר מסיר אותה לפני ה-put
+    _rename(writer, '0521111111', 'א2')
+    cache.sync(cached.get_customer_changes)
+    cache.put('0521111111', stale, generation)
+    assert cache.get('0521111111') == (False, None)
+    assert cached.get_customer_by_phone('0521111111')['name'] == 'א2'
+
+
+def test_unknown_changes_clear_the_cache():
+    cache = CustomerCache(check_interval=0)
+    generation = cache.sync(lambda since: (5, None))
+    cache.put('0521111111', {'name': 'א'}, generation)
+    # היומן קוצץ אחרי הדור של המטמון - אי אפשר לדעת מה השתנה
+    cache.sync(lambda since: (20000, None))
+    assert cache.get('0521111111') == (False, None)
+    assert cache.stats()['resets'] == 1
+
+
+def test_changes_log_reports_gaps(db):
+    db.create_customer('0521111111', '1234', 'א', '000000018')
+    latest, phones = db.get_customer_changes(None)
+    assert phones is None
+    assert db.get_customer_changes(latest) == (latest, [])
+    _rename(db, '0521111111', 'א2')
+    assert db.get_customer_changes(latest)[1] == ['0521111111']
+    with db.get_connection() as conn:
+        conn.execute('DELETE FROM customer_changes WHERE generation <= ?', (latest + 1,))
+        conn.commit()
+    _rename(db, '0521111111', 'א3')
+    assert db.get_customer_changes(latest)[1] is None
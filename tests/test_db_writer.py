@@ -0,0 +1,113 @@
+# ============================================================================
+# test_db_writer.py - SingleWriter: group commit, SAVEPOINT לכל כתיבה, עצירה וכתיבה מקוננת
+# ============================================================================
+
+import threading
+
+import pytest
+
+from connection_pool import ConnectionPool
+from db_writer import SingleWriter
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'writer.db'))
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT UNIQUE)')
+        conn.commit()
+    return pool
+
+
+@pytest.fixture
+def writer(pool):
+    writer = SingleWriter(pool)
+    yield writer
+    writer.stop()
+
+
+def insert(name):
+    def write(conn):
+        return conn.execute('INSERT INTO items (name) VALUES (?)', (name,)).lastrowid
+    return write
+
+
+def names(pool):
+    with pool.connection() as conn:
+        return sorted(row['name'] for row in conn.execute('SELECT name FROM items'))
+
+
+def _block(writer):
+    """כתיבה שמחזיקה את ה-thread עד release.set() - הכתיבות הבאות מצטברות בתור"""
+    started, release = threading.Event(), threading.Event()
+
+    def write(conn):
+        started.set()
+        release.wait(5)
+    future = writer.submit(write)
+    assert started.wait(5)
+    return future, release
+
+
+def test_queued_writes_share_one_commit(pool, writer):
+    blocker, release = _block(writer)
+    futures = [writer.submit(insert(f"item{i}")) for i in range(5)]
+    release.set()
+    assert [future.result(5) for future in futures] == [1, 2, 3, 4, 5]
+    blocker.result(5)
+    stats = writer.stats()
+    assert (stats['writes'], stats['commits']) == (6, 2)
+
+
+def test_failing_write_does_not_roll_back_batch_mates(pool, writer):
+    def half_then_fail(conn):
+        conn.execute("INSERT INTO items (name) VALUES ('partial')")
+        conn.execute("INSERT INTO items (name) VALUES ('a')")  # UNIQUE
+
+    blocker, release = _block(writer)
+    first = writer.submit(insert('a'))
+    failing = writer.submit(half_then_fail)
+    last = writer.submit(insert('b'))
+    release.set()
+
+    assert first.result(5) and last.result(5)
+    with pytest.raises(Exception, match='UNIQUE'):
+        failing.result(5)
+    assert names(pool) == ['a', 'b']
+    assert writer.stats()['commits'] == 2
+
+
+def test_nested_write_runs_inline(pool, writer):
+    def outer(conn):
+        conn.execute("INSERT INTO items (name) VALUES ('outer')")
+        # כמו fn שקוראת ל-DatabaseService._execute_write
+        return writer.execute(insert('inner'), timeout=2)
+
+    assert writer.execute(outer, timeout=5) == 2
+    assert names(pool) == ['inner', 'outer']
+
+
+def test_failed_nested_write_only_undoes_itself(pool, writer):
+    def outer(conn):
+        conn.execute("INSERT INTO items (name) VALUES ('outer')")
+        with pytest.raises(Exception, match='UNIQUE'):
+            writer.execute(insert('outer'), timeout=2)
+        return 'done'
+
+    assert writer.execute(outer, timeout=5) == 'done'
+    assert names(pool) == ['outer']
+
+
+def test_stop_resolves_queued_futures_and_restarts(pool, writer):
+    blocker, release = _block(writer)
+    queued = [writer.submit(insert(f"item{i}")) for i in range(3)]
+    stopper = threading.Thread(target=writer.stop)
+    stopper.start()
+    release.set()
+    stopper.join(5)
+    assert all(future.done() for future in queued)
+    assert not writer._thread.is_alive()
+
+    # כתיבה אחרי stop מפעילה את ה-thread מחדש
+    assert writer.execute(insert('after'), timeout=5) == 4
+    assert names(pool) == ['after', 'item0', 'item1', 'item2']
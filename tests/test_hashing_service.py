@@ -0,0 +1,68 @@
+# ============================================================================
+# test_hashing_service.py - מאגר ה-bcrypt: דחייה כשהוא מלא ו-timeout
+# ============================================================================
+
+import threading
+import time
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+import pytest
+
+from config import load_config
+from hashing_service import HashingQueueFull, PasswordHasher
+
+from conftest import TEST_ROUNDS
+
+
+def test_hash_and_check():
+    hasher = PasswordHasher(workers=0, rounds=TEST_ROUNDS)
+    hashed = hasher.hash('1234')
+    assert hasher.check('1234', hashed)
+    assert not hasher.check('4321', hashed)
+
+
+def test_full_queue_rejects_immediately():
+    hasher = PasswordHasher(workers=0, rounds=TEST_ROUNDS, max_pending=1)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+    worker = threading.Thread(target=hasher._run, args=('hash', slow))
+    worker.start()
+    assert started.wait(5)
+    try:
+        with pytest.raises(HashingQueueFull):
+            hasher.hash('1234')
+    finally:
+        release.set()
+        worker.join(5)
+    assert hasher.stats()['rejected'] == 1
+    # המקום התפנה
+    assert hasher.hash('1234')
+
+
+def test_timeout_keeps_slot_until_the_pool_finishes():
+    hasher = PasswordHasher(workers=1, rounds=TEST_ROUNDS, max_pending=1, timeout=0.2)
+    try:
+        with pytest.raises(FuturesTimeoutError):
+            hasher._run('check', time.sleep, 1.0)
+        assert hasher.stats()['timeouts'] == 1
+        # ה-bcrypt הקודם עדיין רץ במאגר - אין מקום
+        with pytest.raises(HashingQueueFull):
+            hasher.hash('1234')
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                assert hasher.hash('1234')
+                break
+            except HashingQueueFull:
+                assert time.monotonic() < deadline
+                time.sleep(0.1)
+    finally:
+        hasher.shutdown()
+
+
+def test_timeout_is_configured_below_webhook_timeout():
+    assert load_config({})['HASH_TIMEOUT'] < 5
+    assert load_config({'HASH_TIMEOUT': '1.5'})['HASH_TIMEOUT'] == 1.5
@@ -0,0 +1,22 @@
+# ============================================================================
+# test_login.py - /login מול הגבלת הניסיונות ומאגר ה-bcrypt
+# ============================================================================
+
+from hashing_service import HashingQueueFull
+
+PHONE = '0521234567'
+BUSY = "המערכת עמוסה כרגע. לכניסה למערכת נא הקש את הסיסמה"
+
+
+def test_busy_hashing_does_not_spend_login_attempts(app, call, monkeypatch):
+    services = app.extensions['pbx']
+    services.db.create_customer(PHONE, '1234', 'לקוח', '000000018')
+
+    def busy(password, hashed):
+        raise HashingQueueFull('busy')
+    monkeypatch.setattr(services.hasher, 'check', busy)
+    for _ in range(services.login_limiter.capacity * 2):
+        assert call('/login', 'c1', PHONE, password='1234')['files'][0]['text'] == BUSY
+
+    monkeypatch.undo()
+    assert call('/login', 'c1', PHONE, password='1234')['type'] == 'extensionChange'
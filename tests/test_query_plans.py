@@ -0,0 +1,37 @@
+# ============================================================================
+# test_query_plans.py - השאילתות החמות לא חוזרות לסריקת טבלה מלאה
+# ============================================================================
+
+import pytest
+
+from database_service import DatabaseService
+from query_plans import HOT_CALLS, StatementRecorder, capture_hot_statements, check_query_plans
+
+
+@pytest.fixture(scope='module')
+def hot(tmp_path_factory):
+    """(db, SQL שנאסף לכל מתודה) על מסד זמני עם הסכמה המלאה"""
+    recorder = StatementRecorder()
+    db = DatabaseService(str(tmp_path_factory.mktemp('plans') / 'plans.db'),
+                         query_observer=recorder)
+    return db, capture_hot_statements(db, recorder)
+
+
+def test_every_hot_method_runs_sql(hot):
+    _, statements = hot
+    assert [name for name in HOT_CALLS if not statements[name]] == []
+
+
+@pytest.mark.parametrize('name', sorted(HOT_CALLS))
+def test_no_full_table_scan(hot, name):
+    db, statements = hot
+    with db.get_connection() as conn:
+        assert check_query_plans(conn, {name: statements[name]}) == []
+
+
+def test_connection_execute_is_traced(tmp_path):
+    recorder = StatementRecorder()
+    db = DatabaseService(str(tmp_path / 'traced.db'), query_observer=recorder)
+    with db.get_connection() as conn:
+        conn.execute('SELECT 1')
+    assert recorder.statements[-1] == 'SELECT 1'
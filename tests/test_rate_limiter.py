@@ -0,0 +1,85 @@
+# ============================================================================
+# test_rate_limiter.py - הגבלת ניסיונות ההתחברות (עם שעון מדומה)
+# ============================================================================
+
+import pytest
+
+from rate_limiter import LoginRateLimiter
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def limiter(tmp_path, clock):
+    return LoginRateLimiter(str(tmp_path / 'throttle.db'), capacity=3, refill_every=60,
+                            lockout_after=4, lockout_seconds=900, clock=clock)
+
+
+def test_burst_then_refill(limiter, clock):
+    assert [limiter.acquire('phone:1') for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire('phone:1') == pytest.approx(60)
+    # מפתח אחר לא מושפע
+    assert limiter.acquire('phone:2') == 0.0
+
+    clock.now += 30
+    assert limiter.acquire('phone:1') == pytest.approx(30)
+    clock.now += 30
+    assert limiter.acquire('phone:1') == 0.0
+    assert limiter.acquire('phone:1') > 0
+    assert limiter.stats()['throttled'] == 3
+
+
+def test_lockout_after_consecutive_failures(limiter, clock):
+    for attempt in range(4):
+        clock.now += 60
+        assert limiter.acquire('phone:1') == 0.0
+        locked = limiter.record_failure('phone:1')
+    assert locked
+    assert limiter.acquire('phone:1') == pytest.approx(900)
+    clock.now += 901
+    assert limiter.acquire('phone:1') == 0.0
+    assert limiter.stats()['lockouts'] == 1
+
+
+def test_reset_clears_tokens_and_failures(limiter):
+    for _ in range(3):
+        limiter.acquire('phone:1')
+        limiter.record_failure('phone:1')
+    limiter.reset('phone:1')
+    assert [limiter.acquire('phone:1') for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert not limiter.record_failure('phone:1')
+
+
+def test_refund_returns_the_token(limiter):
+    for _ in range(3):
+        assert limiter.acquire('phone:1') == 0.0
+        limiter.refund('phone:1')
+    assert limiter.acquire('phone:1') == 0.0
+    # לא מעבר לקיבולת
+    limiter.refund('phone:1')
+    limiter.refund('phone:1')
+    assert [limiter.acquire('phone:1') for _ in range(4)][-1] > 0
+
+
+def test_purge_keeps_locked_and_recent_keys(limiter, clock):
+    limiter.acquire('phone:old')
+    for _ in range(4):
+        limiter.acquire('phone:locked')
+        limiter.record_failure('phone:locked')
+    clock.now += 3 * 60 + 1
+    limiter.acquire('phone:recent')
+    limiter.purge()
+    with limiter.pool.connection() as conn:
+        keys = {row['key'] for row in conn.execute('SELECT key FROM login_throttle')}
+    assert keys == {'phone:locked', 'phone:recent'}
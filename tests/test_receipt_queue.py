@@ -0,0 +1,146 @@
+# ============================================================================
+# test_receipt_queue.py - ReceiptIssuer מול שרת החשבוניות המקומי (stub)
+# ============================================================================
+
+import threading
+
+import pytest
+
+from receipt_queue import HttpInvoicingClient, InvoicingClient, InvoicingError, ReceiptIssuer
+from stub_invoicing_server import make_server
+
+
+@pytest.fixture
+def stub():
+    server = make_server()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(stub):
+    return HttpInvoicingClient(f"http://127.0.0.1:{stub.server_port}/documents", timeout=5)
+
+
+@pytest.fixture
+def receipts(db):
+    """create(n) -> מזהי n קבלות ממתינות של לקוח אחד"""
+    customer_id = db.create_customer('0521234567', '1234', 'לקוח', '000000018')
+    contact_id = db.create_contact(customer_id, 'משה כהן')
+
+    def create(count):
+        return [db.create_receipt_for_contact(customer_id, contact_id, 1000 * (i + 1), 'שירות')
+                for i in range(count)]
+    return create
+
+
+def _row(db, receipt_id):
+    with db.get_connection() as conn:
+        row = conn.execute('''
+            SELECT *, next_attempt_at > CURRENT_TIMESTAMP AS delayed FROM receipts WHERE id = ?
+        ''', (receipt_id,)).fetchone()
+        return dict(row)
+
+
+def _due_now(db, receipt_id):
+    with db.get_connection() as conn:
+        conn.execute('UPDATE receipts SET next_attempt_at = CURRENT_TIMESTAMP WHERE id = ?',
+                     (receipt_id,))
+        conn.commit()
+
+
+def test_batch_is_issued_and_written_back(db, client, receipts):
+    ids = receipts(2)
+    assert ReceiptIssuer(db, client).run_once() == 2
+    for receipt_id in ids:
+        row = _row(db, receipt_id)
+        assert row['status'] == 'issued'
+        assert row['icount_doc_id'].startswith('stub-')
+        # מספר הקבלה הרץ של הלקוח נשלח כמספר המסמך
+        assert row['icount_doc_num'] == str(row['receipt_number'])
+        assert row['attempts'] == 1
+    assert ReceiptIssuer(db, client).run_once() == 0
+
+
+def test_partial_failure_backs_off(db, client, stub, receipts):
+    ok_id, failing_id = receipts(2)
+    stub.fail_receipts.add(failing_id)
+    issuer = ReceiptIssuer(db, client, base_delay=60)
+    assert issuer.run_once() == 2
+
+    assert _row(db, ok_id)['status'] == 'issued'
+    row = _row(db, failing_id)
+    assert row['status'] == 'pending'
+    assert row['attempts'] == 1
+    assert row['last_error'] == 'stub: simulated failure'
+    assert row['delayed']
+    # לא נלקחת שוב לפני next_attempt_at
+    assert issuer.run_once() == 0
+
+    stub.fail_receipts.clear()
+    _due_now(db, failing_id)
+    assert issuer.run_once() == 1
+    assert _row(db, failing_id)['status'] == 'issued'
+
+
+def test_fails_for_good_after_max_attempts(db, client, stub, receipts):
+    (receipt_id,) = receipts(1)
+    stub.fail_receipts.add(receipt_id)
+    issuer = ReceiptIssuer(db, client, max_attempts=2)
+    assert issuer.run_once() == 1
+    assert _row(db, receipt_id)['status'] == 'pending'
+
+    _due_now(db, receipt_id)
+    assert issuer.run_once() == 1
+    row = _row(db, receipt_id)
+    assert row['status'] == 'failed'
+    assert row['attempts'] == 2
+    _due_now(db, receipt_id)
+    assert issuer.run_once() == 0
+
+
+def test_expired_lease_does_not_overwrite_issued_receipt(db, client, receipts):
+    (receipt_id,) = receipts(1)
+    # worker A לוקח את הקבלה ונתקע עד שה-lease פג
+    (stale,) = db.claim_pending_receipts(10)
+    with db.get_connection() as conn:
+        conn.execute("UPDATE receipts SET claimed_at = datetime('now', '-700 seconds') WHERE id = ?",
+                     (receipt_id,))
+        conn.commit()
+
+    # worker B לוקח אותה שוב ומפיק
+    assert ReceiptIssuer(db, client).run_once() == 1
+    issued = _row(db, receipt_id)
+    assert issued['status'] == 'issued'
+
+    # התוצאה המאוחרת של A לא דורסת
+    assert db.mark_receipts_failed([{'receipt_id': receipt_id, 'claimed_at': stale['claimed_at'],
+                                     'error': 'timeout', 'retry_in': 5}]) == 0
+    assert db.mark_receipts_issued([{'receipt_id': receipt_id, 'doc_id': 'late',
+                                     'doc_num': '1', 'response': {}}]) == 0
+    row = _row(db, receipt_id)
+    assert (row['status'], row['icount_doc_id']) == ('issued', issued['icount_doc_id'])
+
+
+def test_malformed_response_is_an_invoicing_error(db, client, stub, receipts):
+    (receipt_id,) = receipts(1)
+    stub.malformed = True
+    with pytest.raises(InvoicingError):
+        client.issue_batch(db.claim_pending_receipts(10))
+    # דרך ה-issuer - כישלון של ה-batch, עם backoff
+    _due_now(db, receipt_id)
+    with db.get_connection() as conn:
+        conn.execute("UPDATE receipts SET status = 'pending' WHERE id = ?", (receipt_id,))
+        conn.commit()
+    assert ReceiptIssuer(db, client).run_once() == 1
+    row = _row(db, receipt_id)
+    assert row['status'] == 'pending'
+    assert row['last_error'].startswith('unexpected invoicing response')
+
+
+def test_client_interface_is_abstract():
+    with pytest.raises(TypeError):
+        InvoicingClient()
@@ -0,0 +1,22 @@
+# ============================================================================
+# test_rights.py - /rights מול פרטי השיחה השמורים
+# ============================================================================
+
+PHONE = '0521234567'
+
+
+def test_rights_summary(app, call):
+    app.extensions['pbx'].db.create_customer(PHONE, '1234', 'לקוח', '000000018')
+    call('/login', 'c1', PHONE, password='1234')
+    assert call('/rights', 'c1', PHONE)['name'] == 'rights_summary'
+
+
+def test_customer_removed_after_login(app, call):
+    db = app.extensions['pbx'].db
+    db.create_customer(PHONE, '1234', 'לקוח', '000000018')
+    call('/login', 'c1', PHONE, password='1234')
+    with db.get_connection() as conn:
+        conn.execute('DELETE FROM customers WHERE phone_number = ?', (PHONE,))
+        conn.commit()
+    assert call('/rights', 'c1', PHONE)['name'] == 'no_customer_login'
+    assert call('/create_recpt', 'c1', PHONE)['name'] == 'no_customer_login'
@@ -0,0 +1,119 @@
+# ============================================================================
+# test_session_store.py - מצב השיחות: פקיעה, פינוי, מאזינים ושיתוף בין workers
+# ============================================================================
+
+import pytest
+
+from session_store import (MemorySessionStore, SessionStore, SQLiteSessionStore,
+                           create_session_store)
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path, clock):
+    if request.param == 'memory':
+        return MemorySessionStore(max_sessions=3, idle_ttl=60, clock=clock)
+    return SQLiteSessionStore(str(tmp_path / 'sessions.db'), max_sessions=3, idle_ttl=60,
+                              clock=clock)
+
+
+def _expired(store):
+    ended = []
+    store.on_expire(lambda call_id, last_seen: ended.append((call_id, last_seen)))
+    return ended
+
+
+def test_save_and_load(store):
+    assert store.load('c1') == {}
+    store.save('c1', {'count': 1, 'name': 'משה'})
+    assert store.load('c1') == {'count': 1, 'name': 'משה'}
+    store.delete('c1')
+    assert store.load('c1') == {}
+
+
+def test_idle_sessions_expire_and_notify(store, clock):
+    ended = _expired(store)
+    store.save('c1', {'step': 1})
+    clock.now += 30
+    store.save('c2', {'step': 1})
+    clock.now += 45
+
+    store.purge()
+    # בזיכרון זמן הפעילות האחרון מוערך לפי רגע הניקוי (עד idle_ttl לפניו)
+    assert [call_id for call_id, _ in ended] == ['c1']
+    assert 1000.0 <= ended[0][1] <= clock.now - 60
+    assert store.active_count() == 1
+    assert store.stats()['expirations'] == 1
+    assert store.load('c1') == {}
+    assert store.load('c2') == {'step': 1}
+
+
+def test_least_recent_sessions_are_evicted(store, clock):
+    ended = _expired(store)
+    for call_id in ('c1', 'c2', 'c3', 'c4'):
+        store.save(call_id, {'call': call_id})
+        clock.now += 1
+    store.purge()
+    assert [call_id for call_id, _ in ended] == ['c1']
+    assert store.stats()['evictions'] == 1
+    assert store.load('c1') == {}
+
+
+def test_sqlite_sessions_are_shared_between_workers(tmp_path, clock):
+    path = str(tmp_path / 'sessions.db')
+    first = SQLiteSessionStore(path, clock=clock)
+    second = SQLiteSessionStore(path, clock=clock)
+    first.save('c1', {'step': 'amout'})
+    assert second.load('c1') == {'step': 'amout'}
+    second.save('c1', {'step': 'detailes'})
+    assert first.load('c1') == {'step': 'detailes'}
+
+    # רק התהליך שמחק את השורה מדווח על סיום השיחה
+    ended_first, ended_second = _expired(first), _expired(second)
+    clock.now += 3600
+    first.purge()
+    second.purge()
+    assert [call_id for call_id, _ in ended_first] == ['c1']
+    assert ended_second == []
+
+
+def test_memory_sessions_are_per_process():
+    assert create_session_store('memory', '').load('c1') == {}
+    first, second = MemorySessionStore(), MemorySessionStore()
+    first.save('c1', {'step': 'amout'})
+    assert second.load('c1') == {}
+
+
+def test_incomplete_backend_fails_on_creation():
+    class NoPurge(SessionStore):
+        def load(self, call_id):
+            return {}
+
+        def save(self, call_id, data):
+            pass
+
+        def delete(self, call_id):
+            pass
+
+        def active_count(self):
+            return 0
+
+        def stats(self):
+            return {}
+
+    with pytest.raises(TypeError):
+        NoPurge()
+    with pytest.raises(ValueError):
+        create_session_store('redis', '')
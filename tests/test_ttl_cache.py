@@ -0,0 +1,104 @@
+# ============================================================================
+# test_ttl_cache.py - LRU חסום עם פקיעה, וערימת מועדי הפקיעה של purge_expired
+# ============================================================================
+
+import pytest
+
+from ttl_cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def _cache(clock, **kwargs):
+    evicted = []
+    cache = TTLCache(kwargs.pop('max_size', 100), kwargs.pop('ttl', 10), clock=clock,
+                     on_evict=lambda key, value, reason: evicted.append((key, reason)), **kwargs)
+    return cache, evicted
+
+
+def test_capacity_evicts_least_recently_used(clock):
+    cache, evicted = _cache(clock, max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert evicted == [('b', 'capacity')]
+    assert 'a' in cache and 'c' in cache
+
+
+def test_get_drops_expired_entry(clock):
+    cache, evicted = _cache(clock, refresh_on_get=False)
+    cache.set('a', 1)
+    clock.now = 10
+    assert cache.get('a') is None
+    assert evicted == [('a', 'expired')]
+
+
+def test_purge_follows_expiry_not_lru_order(clock):
+    # תוקף קבוע לכל רשומה: הרשומה שנגעו בה לאחרונה יכולה לפוג ראשונה
+    cache, evicted = _cache(clock, refresh_on_get=False)
+    cache.set('short', 1, ttl=1)
+    cache.set('long', 2, ttl=100)
+    cache.get('short', count=False)
+    clock.now = 5
+    assert cache.purge_expired() == 1
+    assert evicted == [('short', 'expired')]
+    assert len(cache) == 1
+
+
+def test_purge_reschedules_refreshed_entries(clock):
+    cache, evicted = _cache(clock, refresh_on_get=True)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    clock.now = 8
+    cache.get('a')
+    clock.now = 12
+    assert cache.purge_expired() == 1
+    assert evicted == [('b', 'expired')]
+    clock.now = 17
+    assert cache.purge_expired() == 0
+    clock.now = 18
+    assert cache.purge_expired() == 1
+    assert len(cache) == 0
+
+
+def test_rewritten_and_removed_entries_are_skipped(clock):
+    cache, evicted = _cache(clock, refresh_on_get=False)
+    cache.set('a', 1, ttl=1)
+    cache.set('a', 2, ttl=50)
+    cache.set('b', 3, ttl=1)
+    cache.pop('b')
+    clock.now = 5
+    assert cache.purge_expired() == 0
+    assert cache.get('a') == 2
+    assert evicted == []
+
+
+def test_expiry_heap_stays_bounded(clock):
+    cache, _ = _cache(clock, max_size=10, ttl=1000, refresh_on_get=False)
+    for i in range(10000):
+        cache.set(i % 10, i)
+    assert len(cache._expiry) <= 2 * len(cache) + 64 + 1
+    clock.now = 2000
+    assert cache.purge_expired() == 10
+    assert len(cache) == 0
+
+
+def test_clear_empties_heap(clock):
+    cache, _ = _cache(clock)
+    cache.set('a', 1)
+    cache.clear()
+    clock.now = 100
+    assert cache.purge_expired() == 0
+    assert cache.stats()['size'] == 0
@@ -0,0 +1,55 @@
+# ============================================================================
+# test_validation_service.py - בדיקות ת.ז בקבוצה (numpy ופייתון) מול הבדיקה הבודדת
+# ============================================================================
+
+import random
+
+import pytest
+
+import validation_service
+from validation_service import ID_MESSAGES, VALID, ValidationService
+
+
+def _valid_id(rng: random.Random) -> str:
+    body = [rng.randrange(10) for _ in range(8)]
+    total = sum(d * w - (9 if d * w > 9 else 0)
+                for d, w in zip(body, validation_service._ID_WEIGHTS))
+    return ''.join(map(str, body)) + str(-total % 10)
+
+
+def _ids():
+    rng = random.Random(7)
+    ids = [_valid_id(rng) for _ in range(200)]
+    # ספרת ביקורת שגויה
+    ids += [tz[:8] + str((int(tz[8]) + 1) % 10) for tz in ids[:50]]
+    ids += ['', '12345678', '1234567890', '12345678a', ' 00000001', '000000018',
+            '٠٠٠٠٠٠٠١٨', '000000٠18', '999999998', '000000000']
+    return ids
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def batch_path(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(validation_service, 'np', None)
+    return request.param
+
+
+def test_batch_ids_match_single_validation(batch_path):
+    ids = _ids()
+    codes = ValidationService.validate_israeli_ids(ids)
+    assert len(codes) == len(ids)
+    for tz, code in zip(ids, codes):
+        single = ValidationService.validate_israeli_id(tz)
+        assert (int(code) == VALID) == single.is_valid, tz
+        assert ID_MESSAGES.get(int(code), "") == single.message, tz
+
+
+def test_batch_names_and_emails(batch_path):
+    names = ['משה כהן', 'a', 'x' * 51, 'abc1', '  דנה  ']
+    emails = ['a@b.co', 'no-at', 'a@b', 'x' * 250 + '@b.co']
+    assert [int(c) == VALID for c in ValidationService.validate_names(names)] == [
+        ValidationService.validate_name(n).is_valid for n in names]
+    assert [int(c) == VALID for c in ValidationService.validate_emails(emails)] == [
+        ValidationService.validate_email(e).is_valid for e in emails]
@@ -0,0 +1,150 @@
+# ============================================================================
+# ttl_cache.py - מטמון LRU חסום עם פקיעת תוקף
+# ============================================================================
+
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """מטמון LRU בגודל חסום עם פקיעת תוקף לכל רשומה
+
+    refresh_on_get=True - תוקף לפי זמן חוסר פעילות (כל קריאה מאריכה את התוקף)
+    refresh_on_get=False - תוקף קבוע מרגע הכתיבה
+    on_evict(key, value, reason) נקרא לכל רשומה שנזרקת ('capacity' / 'expired')
+
+    סדר ה-LRU אינו סדר הפקיעה (ttl לכל רשומה, refresh_on_get=False), לכן
+    purge_expired עובר על ערימת מועדי פקיעה נפרדת. רשומה במילון היא
+    [ערך, מועד פקיעה, המועד שלה בערימה]; רשומות ערימה ישנות מדולגות בשליפה.
+    """
+
+    def __init__(self, max_size: int, ttl: float, refresh_on_get: bool = True,
+                 on_evict: Optional[Callable[[Hashable, Any, str], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.refresh_on_get = refresh_on_get
+        self.on_evict = on_evict
+        self._clock = clock
+        self._data: 'OrderedDict[Hashable, list]' = OrderedDict()
+        self._expiry: list = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        """שליפת ערך (None/default אם חסר או שפג תוקפו)"""
+        evicted = None
+        with self._lock:
+            entry = self._data.get(key)
+            now = self._clock()
+            if entry is not None and entry[1] <= now:
+                del self._data[key]
+                self.expirations += 1
+                evicted, entry = (key, entry[0]), None
+
+            if entry is None:
+                if count:
+                    self.misses += 1
+                value = default
+            else:
+                if count:
+                    self.hits += 1
+                self._data.move_to_end(key)
+                if self.refresh_on_get:
+                    entry[1] = now + self.ttl
+                value = entry[0]
+
+        if evicted is not None:
+            self._notify([evicted], 'expired')
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """כתיבת ערך - זורק את הרשומה הישנה ביותר אם המטמון מלא"""
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        evicted = []
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = [value, expires_at, expires_at]
+            self._schedule(key, expires_at)
+            while len(self._data) > self.max_size:
+                old_key, old_entry = self._data.popitem(last=False)
+                self.evictions += 1
+                evicted.append((old_key, old_entry[0]))
+        self._notify(evicted, 'capacity')
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """הסרת ערך ללא קריאה ל-on_evict"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._expiry.clear()
+
+    def purge_expired(self) -> int:
+        """הסרת כל הרשומות שפג תוקפן (לפי ערימת מועדי הפקיעה)"""
+        evicted = []
+        with self._lock:
+            now = self._clock()
+            while self._expiry and self._expiry[0][0] <= now:
+                scheduled, _, key = heapq.heappop(self._expiry)
+                entry = self._data.get(key)
+                if entry is None or entry[2] != scheduled:
+                    # הרשומה נמחקה או נכתבה מחדש מאז
+                    continue
+                if entry[1] > now:
+                    # התוקף הוארך בקריאה - מתזמנים מחדש
+                    entry[2] = entry[1]
+                    self._schedule(key, entry[1])
+                    continue
+                del self._data[key]
+                self.expirations += 1
+                evicted.append((key, entry[0]))
+        self._notify(evicted, 'expired')
+        return len(evicted)
+
+    def _schedule(self, key: Hashable, expires_at: float):
+        """רישום מועד פקיעה בערימה (תחת הנעילה) - בנייה מחדש כשרוב הערימה ישנה"""
+        heapq.heappush(self._expiry, (expires_at, next(self._sequence), key))
+        if len(self._expiry) > 2 * len(self._data) + 64:
+            self._expiry = [(entry[2], next(self._sequence), key)
+                            for key, entry in self._data.items()]
+            heapq.heapify(self._expiry)
+
+    def stats(self) -> Dict[str, float]:
+        """מוני פגיעות/החטאות/פינויים"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+    def _notify(self, evicted, reason: str):
+        if self.on_evict is None:
+            return
+        for key, value in evicted:
+            self.on_evict(key, value, reason)
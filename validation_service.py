@@ -4,8 +4,92 @@
 # ============================================================================
 
 import re
+from array import array
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy אופציונלי - בלעדיו הבדיקות בקבוצה רצות בפייתון
+    np = None
+
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+_NAME_RE = re.compile(r"[א-תa-zA-Z ]+")
+
+# קודי שגיאה בבדיקות בקבוצה (מערך בית אחד לכל ערך)
+VALID = 0
+INVALID_FORMAT = 1
+INVALID_CHECKSUM = 2
+TOO_SHORT = 3
+TOO_LONG = 4
+
+ID_MESSAGES = {INVALID_FORMAT: "ת.ז חייב להכיל 9 ספרות", INVALID_CHECKSUM: "ת.ז לא תקין"}
+NAME_MESSAGES = {TOO_SHORT: "שם קצר מדי", TOO_LONG: "שם ארוך מדי",
+                 INVALID_FORMAT: "שם יכול להכיל רק אותיות ורווחים"}
+EMAIL_MESSAGES = {INVALID_FORMAT: "כתובת מייל לא תקינה"}
+
+# ספרה במקום זוגי (משקל 2) -> סכום ספרות המכפלה, לפי בית ASCII
+_DOUBLED = bytes.maketrans(b'0123456789', bytes([0, 2, 4, 6, 8, 1, 3, 5, 7, 9]))
+_ID_WEIGHTS = (1, 2, 1, 2, 1, 2, 1, 2, 1)
+
+
+def _israeli_id_code(tz: str) -> int:
+    if not tz.isdigit() or len(tz) != 9:
+        return INVALID_FORMAT
+    if not tz.isascii():
+        # ספרות שאינן ASCII (int() מקבל אותן) - החישוב המקורי
+        total = 0
+        for i, digit in enumerate(tz):
+            product = int(digit) * _ID_WEIGHTS[i]
+            total += product if product < 10 else product - 9
+    else:
+        data = tz.encode()
+        total = sum(data[0::2]) - 5 * 48 + sum(data[1::2].translate(_DOUBLED))
+    # כולל ספרת הביקורת (משקל 1) הסכום מתחלק ב-10
+    return VALID if total % 10 == 0 else INVALID_CHECKSUM
+
+
+def _name_code(name: str) -> int:
+    name = name.strip()
+    if len(name) < 2:
+        return TOO_SHORT
+    if len(name) > 50:
+        return TOO_LONG
+    if not _NAME_RE.fullmatch(name):
+        return INVALID_FORMAT
+    return VALID
+
+
+def _email_code(email: str) -> int:
+    if len(email) > 254 or not _EMAIL_RE.fullmatch(email):
+        return INVALID_FORMAT
+    return VALID
+
+
+def _codes(values: Sequence[int]):
+    """מערך קודים קומפקטי - numpy.uint8 אם numpy מותקן, אחרת array('B')"""
+    if np is not None:
+        return np.fromiter(values, dtype=np.uint8, count=len(values))
+    return array('B', values)
+
+
+def _israeli_id_codes_numpy(values: Sequence[str]):
+    codes = np.full(len(values), INVALID_FORMAT, dtype=np.uint8)
+    ascii_ids, positions = [], []
+    for i, tz in enumerate(values):
+        if len(tz) == 9 and tz.isdigit():
+            if tz.isascii():
+                ascii_ids.append(tz)
+                positions.append(i)
+            else:
+                codes[i] = _israeli_id_code(tz)
+    if ascii_ids:
+        digits = np.frombuffer(''.join(ascii_ids).encode(), dtype=np.uint8).reshape(-1, 9) - 48
+        products = digits * np.array(_ID_WEIGHTS, dtype=np.uint8)
+        products -= 9 * (products > 9).astype(np.uint8)
+        totals = products.sum(axis=1)
+        codes[np.array(positions)] = np.where(totals % 10 == 0, VALID, INVALID_CHECKSUM)
+    return codes
 
 class ValidationResult:
     def __init__(self, is_valid: bool, message: str = ""):
@@ -18,37 +102,14 @@ class ValidationService:
     @staticmethod
     def validate_israeli_id(tz: str) -> ValidationResult:
         """בדיקת תקינות ת.ז ישראלי"""
-        if not tz.isdigit() or len(tz) != 9:
-            return ValidationResult(False, "ת.ז חייב להכיל 9 ספרות")
-
-        # בדיקת ספרת ביקורת
-        total = 0
-        for i, digit in enumerate(tz[:8]):
-            weight = 2 if i % 2 == 1 else 1
-            product = int(digit) * weight
-            total += product if product < 10 else product - 9
-
-        check_digit = (10 - (total % 10)) % 10
-        if check_digit != int(tz[8]):
-            return ValidationResult(False, "ת.ז לא תקין")
-
-        return ValidationResult(True)
+        code = _israeli_id_code(tz)
+        return ValidationResult(code == VALID, ID_MESSAGES.get(code, ""))
 
     @staticmethod
     def validate_name(name: str) -> ValidationResult:
         """בדיקת תקינות שם"""
-        name = name.strip()
-
-        if len(name) < 2:
-            return ValidationResult(False, "שם קצר מדי")
-
-        if len(name) > 50:
-            return ValidationResult(False, "שם ארוך מדי")
-
-        if not re.fullmatch(r"[א-תa-zA-Z ]+", name):
-            return ValidationResult(False, "שם יכול להכיל רק אותיות ורווחים")
-
-        return ValidationResult(True)
+        code = _name_code(name)
+        return ValidationResult(code == VALID, NAME_MESSAGES.get(code, ""))
 
     @staticmethod
     def validate_password(password: str) -> ValidationResult:
@@ -85,3 +146,55 @@ class ValidationService:
             return ValidationResult(True)
         except ValueError:
             return ValidationResult(False, "שנת לידה לא תקינה")
+
+    @staticmethod
+    def validate_business_year(year: str) -> ValidationResult:
+        """בדיקת תקינות שנת פתיחת עסק"""
+        try:
+            year_int = int(year)
+            if not (2000 <= year_int <= datetime.now().year):
+                return ValidationResult(False, "שנת פתיחה לא סבירה")
+            return ValidationResult(True)
+        except ValueError:
+            return ValidationResult(False, "שנת פתיחה לא תקינה")
+
+    @staticmethod
+    def validate_decimal_amount(amount: str) -> ValidationResult:
+        """בדיקת תקינות סכום עשרוני שהוקש בטלפון (כוכבית = נקודה עשרונית)"""
+        normalized = amount.replace('*', '.')
+        whole, _, fraction = normalized.partition('.')
+        if not whole.isdigit() or len(fraction) > 2 or (fraction and not fraction.isdigit()):
+            return ValidationResult(False, "סכום לא תקין")
+
+        value = float(normalized)
+        if value <= 0:
+            return ValidationResult(False, "סכום חייב להיות חיובי")
+        if value > 999999:
+            return ValidationResult(False, "סכום גבוה מדי")
+        return ValidationResult(True)
+
+    @staticmethod
+    def validate_email(email: str) -> ValidationResult:
+        """בדיקת תקינות כתובת מייל"""
+        code = _email_code(email)
+        return ValidationResult(code == VALID, EMAIL_MESSAGES.get(code, ""))
+
+    # בדיקות בקבוצה (ייבוא / בדיקה חוזרת של אנשי קשר) - מחזירות מערך קודים
+    # באורך הקלט: VALID או קוד שגיאה, וההודעה המתאימה ב-*_MESSAGES
+
+    @staticmethod
+    def validate_israeli_ids(values: Sequence[str]):
+        """בדיקת ספרת ביקורת לכל ת.ז - וקטורית עם numpy"""
+        if np is not None:
+            return _israeli_id_codes_numpy(values)
+        return _codes([_israeli_id_code(tz) for tz in values])
+
+    @staticmethod
+    def validate_names(values: Sequence[str]):
+        """בדיקת תקינות שמות"""
+        return _codes([_name_code(name) for name in values])
+
+    @staticmethod
+    def validate_emails(values: Sequence[str]):
+        """בדיקת תקינות כתובות מייל"""
+        return _codes([_email_code(email) for email in values])